@@ -1,32 +1,292 @@
+import aiohttp
+import asyncio
+import contextlib
 import discord
-import requests
+import functools
+import io
+import logging
 import os
 import random
-import sqlite3
-
+import time
+import zlib
+
+from inference import InferenceClient, InferenceDispatcher, InferenceError, StreamingUnsupported
+from local_inference import LocalBackend
+from metrics import REGISTRY, LoopLagMonitor, MetricsServer
+from model_router import ModelRouter
+from opening_book import OpeningBook
+from outbound import ANSWER, GAME, OutboundScheduler, replies_with
+from profiler import SamplingProfiler
+from prompts import PromptCompiler
+from rate_limit import AdmissionController, QueueFull, RateLimited
+from resilience import CircuitOpen, ResilientSender
+from activity import ActivityTracker
+from board_render import BoardRenderer
+from chess_engine import PIECE_TO_CODE, Position
+from chess_search import search_best_move
+from commands import CommandRouter
+from conversation import ConversationMemory
+from draughts_search import search_best_path
+from games import DRAUGHTS_START, ChessGame, DraughtsGame, number_moves
+from response_cache import ResponseCache, cache_key
+from semantic_cache import SemanticCache, SentenceEmbedder
+from session_store import GameSessionStore
+from state_store import SQLiteStateStore
+import workers
+
+log = logging.getLogger(__name__)
 
 # Load tokens from environment variables
 DISCORD_BOT_TOKEN = os.getenv('Discord_token')
 HUGGINGFACE_API_TOKEN = os.getenv('HuggingFace')
 
-# Choose model
+# Choose models: quick commands go to the small tier, open questions to the
+# large one; MODEL is also the large tier's fallback and the local model
 MODEL = "google/flan-t5-large"
-# MODEL = "mistralai/Mistral-7B-Instruct"
+MODEL_SMALL = os.getenv('MODEL_SMALL', MODEL)
+MODEL_LARGE = os.getenv('MODEL_LARGE', "mistralai/Mistral-7B-Instruct-v0.2")
+
+# Inference endpoint; point it at a local server for testing
+INFERENCE_API_URL = os.getenv('HF_API_URL', "https://api-inference.huggingface.co/models")
+INFERENCE_MAX_CONNECTIONS = int(os.getenv('HF_MAX_CONNECTIONS', '200'))
+
+# Micro-batching: prompts arriving within the window share one batched request
+INFERENCE_BATCH_WINDOW = float(os.getenv('HF_BATCH_WINDOW', '0.02'))
+INFERENCE_MAX_BATCH = int(os.getenv('HF_MAX_BATCH', '8'))
+
+# Where answers are generated: "hosted" (the inference API) or "local"
+# (MODEL loaded in-process at startup, optionally int8-quantized)
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'hosted')
+
+if INFERENCE_BACKEND == "local":
+    inference_backend = LocalBackend(
+        MODEL,
+        quantize=os.getenv('LOCAL_QUANTIZE', '0') == '1',
+        threads=int(os.getenv('LOCAL_INFERENCE_THREADS', '1'))
+    )
+else:
+    # Shared async client, one pooled keep-alive session for all commands
+    inference_backend = InferenceClient(
+        HUGGINGFACE_API_TOKEN,
+        base_url=INFERENCE_API_URL,
+        max_connections=INFERENCE_MAX_CONNECTIONS
+    )
+
+# Retries with backoff and a circuit breaker per model; while it is open
+# commands answer from stale cache entries where they can
+inference_resilience = ResilientSender(
+    inference_backend.post,
+    failure_threshold=int(os.getenv('HF_BREAKER_THRESHOLD', '5')),
+    reset_timeout=float(os.getenv('HF_BREAKER_RESET', '30')),
+    max_attempts=int(os.getenv('HF_MAX_ATTEMPTS', '4')),
+    max_wait=float(os.getenv('HF_MAX_RETRY_WAIT', '60'))
+)
+
+# Ping an idle hosted model this often (seconds) so it is not unloaded
+KEEP_WARM_INTERVAL = float(os.getenv('HF_KEEP_WARM_INTERVAL', '0' if INFERENCE_BACKEND == 'local' else '600'))
+
+# Per-command model choice with health-based failover between models
+if INFERENCE_BACKEND == "local":
+    # Only MODEL is loaded in-process
+    MODEL_TIERS = {"small": [MODEL], "large": [MODEL]}
+else:
+    MODEL_TIERS = {
+        "small": list(dict.fromkeys([MODEL_SMALL, MODEL])),
+        "large": list(dict.fromkeys([MODEL_LARGE, MODEL]))
+    }
+model_router = ModelRouter(
+    MODEL_TIERS,
+    routes={
+        "task": "small",
+        "subject": "small",
+        "cite": "small",
+        "ai": "large",
+        "homework": "large",
+        "style": "large"
+    },
+    long_prompt=int(os.getenv('ROUTER_LONG_PROMPT', '300')),
+    max_latency=float(os.getenv('ROUTER_MAX_LATENCY', '20')),
+    cooldown=float(os.getenv('ROUTER_COOLDOWN', '120'))
+)
+
+# Merges identical in-flight prompts and batches distinct ones
+inference_dispatcher = InferenceDispatcher(
+    inference_resilience.post,
+    batch_window=INFERENCE_BATCH_WINDOW,
+    max_batch_size=INFERENCE_MAX_BATCH
+)
+
+# Stream long answers into the "thinking" message, editing it at most once
+# per interval to stay well inside Discord's edit rate limits
+INFERENCE_STREAMING = os.getenv('HF_STREAMING', '1') == '1'
+STREAM_EDIT_INTERVAL = float(os.getenv('STREAM_EDIT_INTERVAL', '1.0'))
+
+# Sharding: SHARD_COUNT gateway shards in total, of which this process runs
+# SHARD_IDS (comma-separated, all if unset); launcher.py sets both per process
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0'))
+SHARD_IDS = [int(shard) for shard in os.getenv('SHARD_IDS', '').split(',') if shard.strip()]
+
+# Local metrics endpoint in the Prometheus text format (METRICS_PORT=0
+# turns it off); users in ADMIN_IDS may capture a CPU profile with !profile
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+ADMIN_IDS = {int(user) for user in os.getenv('ADMIN_IDS', '').split(',') if user.strip()}
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', '30'))
+
+# State shared by all bot processes: game sessions, conversations, cached
+# answers and, when this process runs only some of the shards, rate limit buckets
+STATE_DB_PATH = os.getenv('STATE_DB', 'state.db')
+state_store = SQLiteStateStore(STATE_DB_PATH)
+
+# Admission control for inference commands: requests per minute and burst
+# size per user/channel/guild, plus a global cap on concurrent requests
+RATE_LIMIT_USER = float(os.getenv('RATE_LIMIT_USER', '6'))
+RATE_LIMIT_USER_BURST = int(os.getenv('RATE_LIMIT_USER_BURST', '3'))
+RATE_LIMIT_CHANNEL = float(os.getenv('RATE_LIMIT_CHANNEL', '20'))
+RATE_LIMIT_CHANNEL_BURST = int(os.getenv('RATE_LIMIT_CHANNEL_BURST', '10'))
+RATE_LIMIT_GUILD = float(os.getenv('RATE_LIMIT_GUILD', '60'))
+RATE_LIMIT_GUILD_BURST = int(os.getenv('RATE_LIMIT_GUILD_BURST', '30'))
+
+admission = AdmissionController(
+    {
+        "user": (RATE_LIMIT_USER / 60, RATE_LIMIT_USER_BURST),
+        "channel": (RATE_LIMIT_CHANNEL / 60, RATE_LIMIT_CHANNEL_BURST),
+        "guild": (RATE_LIMIT_GUILD / 60, RATE_LIMIT_GUILD_BURST)
+    },
+    max_concurrent=int(os.getenv('INFERENCE_CONCURRENCY', '16')),
+    max_queue=int(os.getenv('INFERENCE_QUEUE', '64')),
+    store=state_store if SHARD_IDS else None
+)
+
+# Outbound messages: REST calls in flight across channels, and how long
+# after our last message a new one is appended to it instead of sent
+outbound = OutboundScheduler(
+    max_in_flight=int(os.getenv('OUTBOUND_CONCURRENCY', '16')),
+    merge_window=float(os.getenv('OUTBOUND_MERGE_WINDOW', '10'))
+)
+
+# Discord REST timing, labelled by route with ids replaced by "{id}"
+DISCORD_REQUEST_SECONDS = REGISTRY.histogram(
+    "chatbuddy_discord_request_seconds", "Discord API request latency", ("method", "route")
+)
+DISCORD_RESPONSES = REGISTRY.counter(
+    "chatbuddy_discord_responses_total", "Discord API responses by status", ("route", "status")
+)
+
+def discord_route(url):
+    return "/".join("{id}" if part.isdigit() else part for part in url.path.split("/"))
+
+async def on_discord_request_start(session, context, params):
+    context.start = time.perf_counter()
+
+async def on_discord_request_end(session, context, params):
+    route = discord_route(params.url)
+    DISCORD_REQUEST_SECONDS.labels(params.method, route).observe(time.perf_counter() - context.start)
+    DISCORD_RESPONSES.labels(route, str(params.response.status)).inc()
+    outbound.observe(params.method, params.url.path, params.response.status, params.response.headers)
+
+async def on_discord_request_exception(session, context, params):
+    DISCORD_RESPONSES.labels(discord_route(params.url), "error").inc()
+
+discord_trace = aiohttp.TraceConfig()
+discord_trace.on_request_start.append(on_discord_request_start)
+discord_trace.on_request_end.append(on_discord_request_end)
+discord_trace.on_request_exception.append(on_discord_request_exception)
 
 # Set up Discord bot with message content intent
 intents = discord.Intents.default()
 intents.messages = True
 intents.message_content = True
-client = discord.Client(intents=intents)
+if SHARD_COUNT:
+    client = discord.AutoShardedClient(
+        intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS or None,
+        http_trace=discord_trace
+    )
+else:
+    client = discord.Client(intents=intents, http_trace=discord_trace)
 
 # Character personality prompt for Hugging Face
 CHARACTER_PERSONA = (
     "You are a helpful and informative AI assistant. Respond in a friendly and concise manner."
 )
 
-# Game states
-chess_games = {}
-draughts_games = {}
+# Input token budgets; longer messages are cut down to fit
+prompt_compiler = PromptCompiler(
+    budgets={MODEL_LARGE: int(os.getenv('PROMPT_TOKEN_BUDGET_LARGE', '1024'))},
+    default_budget=int(os.getenv('PROMPT_TOKEN_BUDGET', '512')),
+    instruct_models=[model for model in model_router.models if "instruct" in model.lower()]
+)
+prompt_compiler.preload([CHARACTER_PERSONA])
+
+# Answer cache, shared by all processes through the state store: per-command
+# TTLs in seconds, creative commands rotate variants
+response_cache = ResponseCache(
+    state_store,
+    max_entries=int(os.getenv('RESPONSE_CACHE_SIZE', '1000')),
+    disk_max_entries=int(os.getenv('RESPONSE_CACHE_DISK_SIZE', '20000')),
+    ttls={
+        "ai": 86400,
+        "homework": 86400,
+        "style": 86400,
+        "cite": 7 * 86400,
+        "task": 3600,
+        "subject": 3600
+    },
+    variants={"task": 5, "subject": 5}
+)
+
+# Per-channel, per-user chat history for !ai and !homework: recent turns
+# verbatim, older ones summarized, bounded in memory and spilled to disk
+conversation_memory = ConversationMemory(
+    state_store,
+    max_turns=int(os.getenv('CONVERSATION_TURNS', '6')),
+    context_budget=int(os.getenv('CONVERSATION_TOKENS', '320')),
+    max_conversations=int(os.getenv('CONVERSATION_LIMIT', '2000')),
+    idle_timeout=float(os.getenv('CONVERSATION_IDLE_TIMEOUT', '1800'))
+)
+
+# Near-duplicate prompt matching in front of the answer cache, enabled by
+# naming a sentence-transformers model in SEMANTIC_MODEL. SEMANTIC_CACHE_PATH
+# keeps the vectors in a memory-mapped file (numpy)
+SEMANTIC_MODEL = os.getenv('SEMANTIC_MODEL')
+SEMANTIC_CACHE_COMMANDS = {"ai", "homework", "style", "cite"} if SEMANTIC_MODEL else set()
+semantic_cache = SemanticCache(
+    SentenceEmbedder(SEMANTIC_MODEL),
+    capacity=int(os.getenv('SEMANTIC_CACHE_SIZE', '10000')),
+    threshold=float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.9')),
+    path=os.getenv('SEMANTIC_CACHE_PATH')
+) if SEMANTIC_MODEL else None
+
+# Write-behind user activity counters, flushed in batches off the event loop.
+# They take over from the user table of the old database module, which the
+# bot no longer writes
+ACTIVITY_DB_PATH = os.getenv('ACTIVITY_DB', 'activity.db')
+activity_tracker = ActivityTracker(
+    ACTIVITY_DB_PATH,
+    flush_interval=float(os.getenv('ACTIVITY_FLUSH_INTERVAL', '10')),
+    flush_every=int(os.getenv('ACTIVITY_FLUSH_EVERY', '500'))
+)
+
+# Seconds the chess AI may think per move (searched in the worker pool)
+CHESS_AI_TIME = float(os.getenv('CHESS_AI_TIME', '1.5'))
+DRAUGHTS_AI_TIME = float(os.getenv('DRAUGHTS_AI_TIME', '1.0'))
+AI_MOVE_SECONDS = REGISTRY.histogram(
+    "chatbuddy_ai_move_seconds", "Time to find the AI's move, worker queueing included", ("game",)
+)
+
+# Chess opening book (built by opening_book.py) answering known positions
+# without a search, and searched positions remembered across all games
+CHESS_BOOK_PATH = os.getenv(
+    'CHESS_BOOK', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening_book.bin')
+)
+opening_book = OpeningBook(CHESS_BOOK_PATH)
+chess_searches = workers.MemoizedSearch(
+    search_best_move, max_entries=int(os.getenv('CHESS_SEARCH_CACHE', '4096'))
+)
+
+# Game session limits; games are created further down via the stores
+GAME_SESSION_LIMIT = int(os.getenv('GAME_SESSION_LIMIT', '1000'))
+GAME_IDLE_TIMEOUT = float(os.getenv('GAME_IDLE_TIMEOUT', '3600'))
 
 # Draughts pieces and board
 DRAUGHTS_PIECES = {
@@ -35,33 +295,24 @@ DRAUGHTS_PIECES = {
     ' ': '  '  # empty square
 }
 
-INITIAL_DRAUGHTS_BOARD = [
-    [' ', 'b', ' ', 'b', ' ', 'b', ' ', 'b'],
-    ['b', ' ', 'b', ' ', 'b', ' ', 'b', ' '],
-    [' ', 'b', ' ', 'b', ' ', 'b', ' ', 'b'],
-    [' ', ' ', ' ', ' ', ' ', ' ', ' ', ' '],
-    [' ', ' ', ' ', ' ', ' ', ' ', ' ', ' '],
-    ['w', ' ', 'w', ' ', 'w', ' ', 'w', ' '],
-    [' ', 'w', ' ', 'w', ' ', 'w', ' ', 'w'],
-    ['w', ' ', 'w', ' ', 'w', ' ', 'w', ' ']
-]
+# Board symbols by the byte value of the draughts cell codes
+DRAUGHTS_SYMBOLS = {ord(code): symbol for code, symbol in DRAUGHTS_PIECES.items()}
 
-def new_draughts_game():
-    return {
-        'board': [row[:] for row in INITIAL_DRAUGHTS_BOARD],
-        'turn': 'w',  # w for white, b for black
-        'status': "White's turn to play",
-        'selected': None,
-        'must_jump': False
-    }
+def render_draughts_row(i, cells):
+    return f"{chr(65+i)} " + "".join(DRAUGHTS_SYMBOLS[cell] for cell in cells) + f" {chr(65+i)}\n"
+
+# Rendered rows keyed on the row's 8 bytes of cell codes
+draughts_renderer = BoardRenderer(
+    "⚫ **Draughts Game:**\n```\n  1 2 3 4 5 6 7 8\n",
+    "  1 2 3 4 5 6 7 8\n```",
+    render_draughts_row
+)
+for i in range(8):
+    draughts_renderer.preload(i, DRAUGHTS_START[i * 8:i * 8 + 8].encode('ascii'))
 
-def render_draughts_board(board):
-    board_display = "⚫ **Draughts Game:**\n```\n  1 2 3 4 5 6 7 8\n"
-    for i, row in enumerate(board):
-        board_display += f"{chr(65+i)} "
-        board_display += "".join(DRAUGHTS_PIECES[cell] for cell in row) + f" {chr(65+i)}\n"
-    board_display += "  1 2 3 4 5 6 7 8\n```"
-    return board_display
+def render_draughts_board(game):
+    cells = game.cells
+    return draughts_renderer.render(game.render_cache, lambda i: bytes(cells[i * 8:i * 8 + 8]))
 
 def parse_draughts_position(position):
     """Convert draughts notation (e.g., 'A3') to board indices (row, col)"""
@@ -75,138 +326,15 @@ def parse_draughts_position(position):
         return (row, col)
     return None
 
-def get_valid_jumps(game, row, col):
-    """Get all valid jump moves for a piece"""
-    jumps = []
-    piece = game['board'][row][col]
-    if not piece or piece == ' ':
-        return jumps
-
-    directions = []
-    if piece.lower() == 'w':
-        directions.extend([(-2, -2), (-2, 2)])  # upward jumps
-    if piece.lower() == 'b':
-        directions.extend([(2, -2), (2, 2)])    # downward jumps
-    if piece.isupper():  # king can move both directions
-        directions = [(-2, -2), (-2, 2), (2, -2), (2, 2)]
-
-    for dr, dc in directions:
-        new_row, new_col = row + dr, col + dc
-        jump_row, jump_col = row + dr//2, col + dc//2
-
-        if (0 <= new_row < 8 and 0 <= new_col < 8 and
-            game['board'][new_row][new_col] == ' ' and
-            game['board'][jump_row][jump_col] != ' ' and
-            game['board'][jump_row][jump_col].lower() != piece.lower()):
-            jumps.append((new_row, new_col))
-
-    return jumps
-
-def validate_draughts_move(game, from_pos, to_pos):
-    """Validate draughts move"""
-    from_row, from_col = from_pos
-    to_row, to_col = to_pos
-
-    # Basic validation
-    piece = game['board'][from_row][from_col]
-    if not piece or piece == ' ':
-        return False, "No piece at source position."
-    if piece.lower() != game['turn']:
-        return False, f"It's {'White' if game['turn'] == 'w' else 'Black'}'s turn."
-    if game['board'][to_row][to_col] != ' ':
-        return False, "Destination square is not empty."
-
-    # Check for mandatory jumps
-    has_jumps = False
-    for r in range(8):
-        for c in range(8):
-            if (game['board'][r][c].lower() == game['turn'] and
-                get_valid_jumps(game, r, c)):
-                has_jumps = True
-                break
-        if has_jumps:
-            break
-
-    # If there are jumps available, only allow jump moves
-    if has_jumps:
-        valid_jumps = get_valid_jumps(game, from_row, from_col)
-        if (to_row, to_col) in valid_jumps:
-            return True, ""
-        return False, "Must make a jump move when available."
-
-    # Regular move validation
-    row_diff = to_row - from_row
-    col_diff = abs(to_col - from_col)
-
-    if piece.isupper():  # King piece
-        if abs(row_diff) == 1 and col_diff == 1:
-            return True, ""
-    else:  # Regular piece
-        if piece == 'w' and row_diff == -1 and col_diff == 1:
-            return True, ""
-        if piece == 'b' and row_diff == 1 and col_diff == 1:
-            return True, ""
-
-    return False, "Invalid move for this piece."
-
-def get_ai_draughts_move(game):
-    """Generate a simple AI move for draughts"""
-    valid_moves = []
-
-    # Collect all valid moves for AI pieces
-    for row in range(8):
-        for col in range(8):
-            piece = game['board'][row][col]
-            if piece.lower() == game['turn']:
-                # Check all possible jumps first
-                jumps = get_valid_jumps(game, row, col)
-                if jumps:
-                    for jump in jumps:
-                        valid_moves.append(((row, col), jump))
-                else:
-                    # Check regular moves
-                    for dr, dc in [(1, -1), (1, 1)] if piece == 'b' else [(-1, -1), (-1, 1)]:
-                        new_row, new_col = row + dr, col + dc
-                        if 0 <= new_row < 8 and 0 <= new_col < 8:
-                            if game['board'][new_row][new_col] == ' ':
-                                valid_moves.append(((row, col), (new_row, new_col)))
-
-    # Return random valid move
-    return random.choice(valid_moves) if valid_moves else None
-
-def make_draughts_move(game, from_pos, to_pos):
-    """Execute a draughts move"""
-    from_row, from_col = from_pos
-    to_row, to_col = to_pos
-    piece = game['board'][from_row][from_col]
-
-    # Move the piece
-    game['board'][to_row][to_col] = piece
-    game['board'][from_row][from_col] = ' '
-
-    # Handle jumps
-    if abs(to_row - from_row) == 2:
-        jumped_row = (from_row + to_row) // 2
-        jumped_col = (from_col + to_col) // 2
-        game['board'][jumped_row][jumped_col] = ' '
-
-    # King promotion
-    if piece == 'w' and to_row == 0:
-        game['board'][to_row][to_col] = 'W'
-    elif piece == 'b' and to_row == 7:
-        game['board'][to_row][to_col] = 'B'
-
-    # Check for additional jumps
-    if abs(to_row - from_row) == 2 and get_valid_jumps(game, to_row, to_col):
-        game['selected'] = (to_row, to_col)
-        game['must_jump'] = True
-        game['status'] = f"{'White' if game['turn'] == 'w' else 'Black'} must continue jumping"
-    else:
-        # Switch turns
-        game['turn'] = 'b' if game['turn'] == 'w' else 'w'
-        game['status'] = f"{'White' if game['turn'] == 'w' else 'Black'}'s turn to play"
-        game['selected'] = None
-        game['must_jump'] = False
+async def get_ai_draughts_move(game):
+    """Search for the AI's whole turn in the worker pool; returns the squares visited"""
+    cells = game.cells.decode('ascii')
+    only_from = game.selected if game.must_jump else None
+    with AI_MOVE_SECONDS.labels("draughts").time():
+        path = await workers.run_in_worker(
+            search_best_path, cells, game.turn, DRAUGHTS_AI_TIME, only_from
+        )
+    return path or None
 
 # Chess pieces
 PIECES = {
@@ -214,36 +342,28 @@ PIECES = {
     'br': '♜', 'bn': '♞', 'bb': '♝', 'bq': '♛', 'bk': '♚', 'bp': '♟'
 }
 
-# Initial board setup
-INITIAL_BOARD = [
-    ['br', 'bn', 'bb', 'bq', 'bk', 'bb', 'bn', 'br'],
-    ['bp', 'bp', 'bp', 'bp', 'bp', 'bp', 'bp', 'bp'],
-    ['', '', '', '', '', '', '', ''],
-    ['', '', '', '', '', '', '', ''],
-    ['', '', '', '', '', '', '', ''],
-    ['', '', '', '', '', '', '', ''],
-    ['wp', 'wp', 'wp', 'wp', 'wp', 'wp', 'wp', 'wp'],
-    ['wr', 'wn', 'wb', 'wq', 'wk', 'wb', 'wn', 'wr']
-]
-
-def new_chess_game():
-    return {
-        'board': [row[:] for row in INITIAL_BOARD],
-        'turn': 'w',  # w for white, b for black
-        'selected': None,
-        'status': "White's turn to play"
-    }
-
 def get_piece_symbol(piece_code):
     return PIECES.get(piece_code, ' ')
 
-def render_board(board):
-    board_display = "♟️ **Chess Game:**\n```\n  a b c d e f g h\n"
-    for i, row in enumerate(board):
-        board_display += f"{8-i} "
-        board_display += " ".join(get_piece_symbol(cell) for cell in row) + f" {8-i}\n"
-    board_display += "  a b c d e f g h\n```"
-    return board_display
+def render_chess_row(i, cells):
+    return f"{8-i} " + " ".join(CHESS_SYMBOLS[cell] for cell in cells) + f" {8-i}\n"
+
+def render_board(game):
+    board = game.position.board
+    return chess_renderer.render(game.render_cache, lambda i: board[i * 16:i * 16 + 8].tobytes())
+
+# Board symbols by the byte value of the engine's signed piece codes
+CHESS_SYMBOLS = {piece & 0xFF: get_piece_symbol(code) for piece, code in PIECE_TO_CODE.items()}
+
+# Rendered rows keyed on the row's 8 bytes in the engine's 0x88 board
+chess_renderer = BoardRenderer(
+    "♟️ **Chess Game:**\n```\n  a b c d e f g h\n",
+    "  a b c d e f g h\n```",
+    render_chess_row
+)
+_initial_position = Position.from_fen()
+for i in range(8):
+    chess_renderer.preload(i, _initial_position.board[i * 16:i * 16 + 8].tobytes())
 
 def parse_position(position):
     """Convert chess notation (e.g., 'e2') to board indices (row, col)"""
@@ -257,643 +377,906 @@ def parse_position(position):
         return (row, col)
     return None
 
-def validate_move(game, from_pos, to_pos):
-    """Basic move validation"""
-    from_row, from_col = from_pos
-    to_row, to_col = to_pos
+async def get_ai_chess_move(game):
+    """The AI's encoded chess move from the opening book, else searched in the worker pool"""
+    position = game.position
+    seen = game.recent_hashes()
+    move = opening_book.choose(position)
+    if move is not None:
+        position.make(move)
+        repeats = position.hash in seen
+        position.unmake()
+        if not repeats:
+            return move
+
+    # A search that may run into a repetition is only shared by games with the same history
+    key = (position.hash, seen) if seen else position.hash
+    with AI_MOVE_SECONDS.labels("chess").time():
+        return await chess_searches.run(key, position.fen(), CHESS_AI_TIME, seen)
+
+# Game states, bounded in memory and persisted across restarts
+chess_games = GameSessionStore(
+    state_store, "chess", ChessGame.to_state, ChessGame.from_state,
+    max_sessions=GAME_SESSION_LIMIT, idle_timeout=GAME_IDLE_TIMEOUT
+)
+draughts_games = GameSessionStore(
+    state_store, "draughts", DraughtsGame.to_state, DraughtsGame.from_state,
+    max_sessions=GAME_SESSION_LIMIT, idle_timeout=GAME_IDLE_TIMEOUT
+)
 
-    # Check if source has a piece
-    piece = game['board'][from_row][from_col]
-    if not piece:
-        return False, "No piece at source position."
-
-    # Check if it's the right player's turn
-    if piece[0] != game['turn']:
-        return False, f"It's {'White' if game['turn'] == 'w' else 'Black'}'s turn."
-
-    # Check if destination has friendly piece
-    dest_piece = game['board'][to_row][to_col]
-    if dest_piece and dest_piece[0] == game['turn']:
-        return False, "Cannot capture your own piece."
-
-    # Implement basic movement rules for each piece
-    piece_type = piece[1]
-
-    # Pawn movement
-    if piece_type == 'p':
-        # Direction depends on color
-        direction = -1 if piece[0] == 'w' else 1
-
-        # Forward move
-        if from_col == to_col and not dest_piece:
-            # Single square forward
-            if to_row == from_row + direction:
-                return True, ""
-
-            # Double square forward from starting position
-            if ((piece[0] == 'w' and from_row == 6 and to_row == 4) or 
-                (piece[0] == 'b' and from_row == 1 and to_row == 3)):
-                # Check if the path is clear
-                if not game['board'][from_row + direction][from_col]:
-                    return True, ""
-
-        # Capture move (diagonal)
-        elif abs(from_col - to_col) == 1 and to_row == from_row + direction:
-            if dest_piece and dest_piece[0] != piece[0]:
-                return True, ""
-
-    # Knight movement
-    elif piece_type == 'n':
-        row_diff = abs(from_row - to_row)
-        col_diff = abs(from_col - to_col)
-        if (row_diff == 2 and col_diff == 1) or (row_diff == 1 and col_diff == 2):
-            return True, ""
-
-    # Bishop movement
-    elif piece_type == 'b':
-        row_diff = abs(from_row - to_row)
-        col_diff = abs(from_col - to_col)
-        if row_diff == col_diff:
-            # Check if path is clear
-            row_step = 1 if to_row > from_row else -1
-            col_step = 1 if to_col > from_col else -1
-
-            r, c = from_row + row_step, from_col + col_step
-            while r != to_row:
-                if game['board'][r][c]:
-                    return False, "Path is not clear."
-                r += row_step
-                c += col_step
-
-            return True, ""
-
-    # Rook movement
-    elif piece_type == 'r':
-        if from_row == to_row or from_col == to_col:
-            # Check if path is clear
-            if from_row == to_row:  # Horizontal movement
-                start, end = min(from_col, to_col), max(from_col, to_col)
-                for c in range(start + 1, end):
-                    if game['board'][from_row][c]:
-                        return False, "Path is not clear."
-            else:  # Vertical movement
-                start, end = min(from_row, to_row), max(from_row, to_row)
-                for r in range(start + 1, end):
-                    if game['board'][r][from_col]:
-                        return False, "Path is not clear."
-
-            return True, ""
-
-    # Queen movement (combination of bishop and rook)
-    elif piece_type == 'q':
-        row_diff = abs(from_row - to_row)
-        col_diff = abs(from_col - to_col)
-
-        # Diagonal movement
-        if row_diff == col_diff:
-            row_step = 1 if to_row > from_row else -1
-            col_step = 1 if to_col > from_col else -1
-
-            r, c = from_row + row_step, from_col + col_step
-            while r != to_row:
-                if game['board'][r][c]:
-                    return False, "Path is not clear."
-                r += row_step
-                c += col_step
-
-            return True, ""
-
-        # Straight movement
-        elif from_row == to_row or from_col == to_col:
-            if from_row == to_row:  # Horizontal movement
-                start, end = min(from_col, to_col), max(from_col, to_col)
-                for c in range(start + 1, end):
-                    if game['board'][from_row][c]:
-                        return False, "Path is not clear."
-            else:  # Vertical movement
-                start, end = min(from_row, to_row), max(from_row, to_row)
-                for r in range(start + 1, end):
-                    if game['board'][r][from_col]:
-                        return False, "Path is not clear."
-
-            return True, ""
-
-    # King movement
-    elif piece_type == 'k':
-        row_diff = abs(from_row - to_row)
-        col_diff = abs(from_col - to_col)
-
-        # Kings move one square in any direction
-        if row_diff <= 1 and col_diff <= 1:
-            return True, ""
-
-    return False, "Invalid move for this piece."
-
-def get_ai_chess_move(game):
-    """Generate a simple AI move for chess"""
-    valid_moves = []
-
-    # Collect all valid moves for AI pieces
-    for from_row in range(8):
-        for from_col in range(8):
-            piece = game['board'][from_row][from_col]
-            if piece and piece[0] == game['turn']:
-                for to_row in range(8):
-                    for to_col in range(8):
-                        if validate_move(game, (from_row, from_col), (to_row, to_col))[0]:
-                            valid_moves.append(((from_row, from_col), (to_row, to_col)))
-
-    # Return random valid move
-    return random.choice(valid_moves) if valid_moves else None
-
-def make_move(game, from_pos, to_pos):
-    from_row, from_col = from_pos
-    to_row, to_col = to_pos
-
-    # Move the piece
-    game['board'][to_row][to_col] = game['board'][from_row][from_col]
-    game['board'][from_row][from_col] = ''
-
-    # Switch turns
-    game['turn'] = 'b' if game['turn'] == 'w' else 'w'
-    game['status'] = f"{'White' if game['turn'] == 'w' else 'Black'}'s turn to play"
-    game['selected'] = None
+# Game stores and board renderers by game name
+GAME_KINDS = {
+    "chess": (chess_games, render_board),
+    "draughts": (draughts_games, render_draughts_board)
+}
+# AI move searches and how their reply is played, by game name
+AI_MOVES = {
+    "chess": (get_ai_chess_move, ChessGame.make_move),
+    "draughts": (get_ai_draughts_move, DraughtsGame.make_path)
+}
+MOVE_COMMANDS = {"chess": "!move", "draughts": "!dmove"}
 
-# Function to query Hugging Face API
-def query_huggingface(message):
+# Channels whose AI reply is being searched, by game
+ai_thinking = {"chess": set(), "draughts": set()}
+
+async def play_ai_move(message, kind):
+    """Find and play the AI's reply in the channel's game.
+
+    The game is looked up again once the search is done: a game that was
+    reset or moved on meanwhile is left alone, one that was evicted and
+    loaded back still gets the move. If no move comes back, the game
+    stays on the AI's turn and the player's next move command retries.
+    """
+    store, render = GAME_KINDS[kind]
+    channel_id = str(message.channel.id)
+    if channel_id in ai_thinking[kind]:
+        return
+    ai_thinking[kind].add(channel_id)
     try:
-        headers = {
-            "Authorization": f"Bearer {HUGGINGFACE_API_TOKEN}"
-        }
-        payload = {
-            "inputs": f"{CHARACTER_PERSONA}\nUser: {message}\nAI:",
-            "parameters": {
-                "max_new_tokens": 150,
-                "temperature": 0.7,
-                "top_p": 0.9,
-                "repetition_penalty": 1.1
-            }
-        }
+        game = await store.get(channel_id)
+        if game is None or not game.ai_to_move:
+            return
+        searched = game.key
+        find_move, play_move = AI_MOVES[kind]
+        try:
+            reply = await find_move(game)
+        except Exception:
+            log.exception("The %s AI failed to move in channel %s", kind, channel_id)
+            reply = None
 
-        response = requests.post(
-            f"https://api-inference.huggingface.co/models/{MODEL}",
-            headers=headers,
-            json=payload,
-            timeout=30
-        )
+        game = await store.get(channel_id)
+        if game is None or game.key != searched:
+            return
+        if reply is None:
+            await outbound.send(message.channel, f"❌ The AI couldn't pick a move. Type `{MOVE_COMMANDS[kind]}` to let it try again.")
+            return
+        play_move(game, reply)
+        store.mark_dirty(channel_id)
+        status_message = f"\n**Status:** {game.status}"
+        await outbound.send(message.channel, "🤖 AI move:" + render(game) + status_message)
+    finally:
+        ai_thinking[kind].discard(channel_id)
+
+# Figures the components already keep, copied into the metrics on each scrape
+CACHE_EVENTS = REGISTRY.counter("chatbuddy_cache_events_total", "Cache lookups by outcome", ("cache", "event"))
+CACHE_HIT_RATIO = REGISTRY.gauge("chatbuddy_cache_hit_ratio", "Share of lookups answered", ("cache",))
+ADMISSIONS = REGISTRY.counter("chatbuddy_admissions_total", "Admission decisions", ("outcome",))
+INFERENCE_SLOTS = REGISTRY.gauge("chatbuddy_inference_slots", "Admission slots by state", ("state",))
+DISPATCHER_EVENTS = REGISTRY.counter("chatbuddy_dispatcher_total", "Coalesced prompts and batches sent", ("event",))
+BREAKER_OPEN = REGISTRY.gauge("chatbuddy_breaker_open", "1 while a model's circuit breaker is not closed", ("model",))
+SESSIONS = REGISTRY.gauge("chatbuddy_sessions", "Sessions held in memory", ("kind",))
+OUTBOUND_EVENTS = REGISTRY.counter("chatbuddy_outbound_total", "Outbound sends, edits and merges", ("event",))
+OUTBOUND_QUEUED = REGISTRY.gauge("chatbuddy_outbound_queued", "Sends and edits waiting for their channel")
+GATEWAY_LATENCY = REGISTRY.gauge("chatbuddy_gateway_latency_seconds", "Discord heartbeat latency")
+
+@REGISTRY.collector
+def collect_stats():
+    for event, count in response_cache.stats.items():
+        CACHE_EVENTS.labels("response", event).set(count)
+    if semantic_cache is not None:
+        for event, count in semantic_cache.stats.items():
+            CACHE_EVENTS.labels("semantic", event).set(count)
+        CACHE_HIT_RATIO.labels("semantic").set(semantic_cache.hit_rate())
+    for event, count in opening_book.stats.items():
+        CACHE_EVENTS.labels("opening_book", event).set(count)
+    for event, count in chess_searches.stats.items():
+        CACHE_EVENTS.labels("chess_search", event).set(count)
+    CACHE_HIT_RATIO.labels("response").set(response_cache.hit_rate())
+    for outcome, count in admission.stats.items():
+        ADMISSIONS.labels(outcome).set(count)
+    INFERENCE_SLOTS.labels("active").set(admission.active)
+    INFERENCE_SLOTS.labels("queued").set(admission.queued)
+    DISPATCHER_EVENTS.labels("coalesced").set(inference_dispatcher.coalesced)
+    DISPATCHER_EVENTS.labels("batches").set(inference_dispatcher.batches_sent)
+    for model, breaker in inference_resilience.breakers.items():
+        BREAKER_OPEN.labels(model).set(0 if breaker.closed else 1)
+    SESSIONS.labels("chess").set(len(chess_games))
+    SESSIONS.labels("draughts").set(len(draughts_games))
+    SESSIONS.labels("conversation").set(len(conversation_memory.sessions))
+    for event, count in outbound.stats.items():
+        OUTBOUND_EVENTS.labels(event).set(count)
+    OUTBOUND_QUEUED.set(outbound.queued)
+    latency = getattr(client, "latency", float("nan"))
+    if latency == latency and latency != float("inf"):
+        GATEWAY_LATENCY.set(latency)
+
+loop_lag = LoopLagMonitor()
+metrics_server = MetricsServer(host=METRICS_HOST, port=METRICS_PORT)
+# Samples the event loop thread (the main thread) for !profile
+profiler = SamplingProfiler()
+
+GENERATION_PARAMETERS = {
+    "max_new_tokens": 150,
+    "temperature": 0.7,
+    "top_p": 0.9,
+    "repetition_penalty": 1.1
+}
 
-        if response.status_code == 200:
-        result = response.json()
-        if isinstance(result, list) and "generated_text" in result[0]:
-            generated = result[0]["generated_text"]
-            reply = generated.replace(message, "").strip()
-            return reply if reply else "🤔 I couldn't come up with a response this time!"
-        elif isinstance(result, dict) and "generated_text" in result:
-            return result["generated_text"]
-        elif isinstance(result, dict) and "error" in result:
-            return "🕒 The model is still warming up, please try again shortly."
-        else:
-            return str(result)
+# Models whose endpoint answered a streaming request with a plain response
+non_streaming_models = set()
+
+async def stale_or(model, message, persona, error_text):
+    """An expired cached answer for the prompt if there is one, else the error"""
+    stale = await response_cache.get_stale(model, persona, message)
+    return stale if stale is not None else error_text
+
+def semantic_namespace(command, persona):
+    return f"{command}:{zlib.crc32(persona.encode('utf-8')):08x}"
+
+async def cached_answer(model, persona, message, command):
+    """An exact or near-duplicate cached answer for the prompt, or None"""
+    answer = await response_cache.get(model, persona, message, command)
+    if answer is not None or command not in SEMANTIC_CACHE_COMMANDS:
+        return answer
+    vector = await semantic_cache.embed(message)
+    return await semantic_cache.lookup(
+        semantic_namespace(command, persona), vector,
+        functools.partial(response_cache.get_by_key, command=command)
+    )
+
+async def remember_answer(model, persona, message, answer, command):
+    await response_cache.put(model, persona, message, answer, command)
+    if command in SEMANTIC_CACHE_COMMANDS:
+        vector = await semantic_cache.embed(message)
+        semantic_cache.add(semantic_namespace(command, persona), vector, cache_key(model, persona, message))
+
+# Function to query Hugging Face API
+async def query_huggingface(message, command=None, persona=CHARACTER_PERSONA, model=None,
+                            history="", use_cache=True):
+    model = model or model_router.choose(command, message)
+    # Answers that depend on earlier conversation are not cached
+    use_cache = use_cache and not history
+    if use_cache:
+        cached = await cached_answer(model, persona, message, command)
+        if cached is not None:
+            return cached
+
+    inputs = prompt_compiler.build(model, persona, message, history)
+    started = time.monotonic()
+    try:
+        response = await inference_dispatcher.submit(model, inputs, GENERATION_PARAMETERS)
+    except CircuitOpen:
+        model_router.record(model, 0.0, False)
+        return await stale_or(model, message, persona, "🔌 The AI service is having trouble, please try again in a minute.")
+    except InferenceError:
+        model_router.record(model, time.monotonic() - started, False)
+        return await stale_or(model, message, persona, "❌ Error: Could not reach the AI service, please try again later.")
+    model_router.record(model, time.monotonic() - started, response.status == 200)
+
+    if response.status != 200:
+        return await stale_or(model, message, persona, f"❌ Error: API call failed with status code {response.status}")
+
+    result = response.data
+    reply = None
+    if isinstance(result, list) and "generated_text" in result[0]:
+        reply = prompt_compiler.clean_output(result[0]["generated_text"], inputs)
+        if not reply:
+            return "🤔 I couldn't come up with a response this time!"
+    elif isinstance(result, dict) and "generated_text" in result:
+        reply = result["generated_text"]
+    elif isinstance(result, dict) and "error" in result:
+        return await stale_or(model, message, persona, "🕒 The model is still warming up, please try again shortly.")
     else:
-        return f"❌ Error: API call failed with status code {response.status_code}"
+        return str(result)
+
+    if not history:
+        await remember_answer(model, persona, message, reply, command)
+    return reply
+
+async def stream_to_message(reply, model, message, command, persona, history):
+    """Stream a generation into ``reply``; None if nothing could be streamed"""
+    inputs = prompt_compiler.build(model, persona, message, history)
+    breaker = inference_resilience.breaker(model)
+    text = ""
+    last_edit = 0.0
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    events = inference_backend.stream(model, {"inputs": inputs, "parameters": GENERATION_PARAMETERS})
+    try:
+        # Closed on the way out so an error event releases the connection
+        async with contextlib.aclosing(events):
+            async for event in events:
+                if "error" in event:
+                    raise InferenceError(event["error"])
+                token = event.get("token") or {}
+                if token.get("special"):
+                    continue
+                text += token.get("text", "")
+                now = loop.time()
+                if text.strip() and now - last_edit >= STREAM_EDIT_INTERVAL:
+                    last_edit = now
+                    outbound.edit_nowait(reply, text + " ▌")
+    except StreamingUnsupported as e:
+        # The one-shot request that follows reports to the breaker
+        if e.status == 200:
+            non_streaming_models.add(model)
+        return None
+    except InferenceError:
+        breaker.record_failure()
+        model_router.record(model, loop.time() - started, False)
+        if not text.strip():
+            return None
+        # Keep what already reached the user, but do not cache a cut-off answer
+        return text.strip() + " …"
+
+    breaker.record_success()
+    model_router.record(model, loop.time() - started, True)
+    text = text.strip()
+    if not text:
+        return "🤔 I couldn't come up with a response this time!"
+    if not history:
+        await remember_answer(model, persona, message, text, command)
+    return text
+
+async def stream_huggingface(reply, message, command=None, persona=CHARACTER_PERSONA, history=""):
+    """Answer ``message`` by editing ``reply`` as tokens arrive.
+
+    Falls back to a one-shot query_huggingface call when streaming is
+    disabled or the endpoint cannot stream. Returns the final answer.
+    """
+    model = model_router.choose(command, message)
+    response = None
+    if not history:
+        response = await cached_answer(model, persona, message, command)
+    if (response is None and INFERENCE_STREAMING and model not in non_streaming_models
+            and inference_resilience.breaker(model).closed):
+        response = await stream_to_message(reply, model, message, command, persona, history)
+    if response is None:
+        response = await query_huggingface(message, command, persona, model=model,
+                                           history=history, use_cache=False)
+    await outbound.edit(reply, response)
+    return response
+
+# Replies that report a problem rather than answer; kept out of conversation memory
+FAILURE_PREFIXES = ("❌", "🕒", "🔌", "🤔")
 
-from database import Database
-from ai_personas import get_persona_prompt
-import re
+async def converse(message, user_input, command):
+    """Answer a chat command with the user's recent conversation as context"""
+    key = f"{message.channel.id}:{message.author.id}"
+    history = await conversation_memory.context(key)
+    thinking = await outbound.send(message.channel, random.choice(THINKING_LINES), merge=False)
+    response = await stream_huggingface(thinking, user_input, command=command, history=history)
+    if not response.startswith(FAILURE_PREFIXES):
+        await conversation_memory.record(key, user_input, response)
 
-# Initialize database
-db = Database()
+from ai_personas import get_persona_prompt, PERSONAS
+
+# Persona prompts by style, looked up and compiled once
+STYLE_PERSONAS = {style: get_persona_prompt(style) for style in PERSONAS}
+prompt_compiler.preload(STYLE_PERSONAS.values())
 
 # Bot startup message
 @client.event
 async def on_ready():
     print(f"🤖 ChatBuddy is online as {client.user} and ready to assist!")
+    # Start loading cold models before the first user asks
+    await asyncio.gather(*(inference_resilience.warm_up(model) for model in model_router.models))
 
 async def find_citation(topic):
     prompt = f"Find and provide an academic citation related to: {topic}"
-    response = query_huggingface(prompt)
+    response = await query_huggingface(prompt, command="cite")
     return response
 
 async def get_styled_response(message, style):
-    persona_prompt = get_persona_prompt(style)
-    full_prompt = f"{persona_prompt}\nUser question: {message}"
-    return query_huggingface(full_prompt)
+    return await query_huggingface(message, command="style", persona=STYLE_PERSONAS[style])
+
+THINKING_LINES = [
+    "🤖 Thinking really hard...",
+    "🔍 Looking that up in my brain-database...",
+    "💡 One moment while I craft a smart answer...",
+    "✨ Summoning the AI powers..."
+]
+
+JOKES = [
+    "Why did the computer get cold? Because it left its Windows open! 🧊",
+    "I'm reading a book on anti-gravity. It's impossible to put down! 😄",
+    "Why did the robot go on vacation? It needed to recharge! 🔋",
+]
+
+# Command registry; handlers below register themselves by name
+router = CommandRouter()
+
+def admitted(priority=0):
+    """Run an inference command through admission control.
+
+    Lower priorities are served first when requests have to queue.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(message, args):
+            keys = {
+                "user": message.author.id,
+                "channel": message.channel.id,
+                "guild": message.guild.id if message.guild else None
+            }
+
+            async def on_queued(position):
+                await outbound.send(message.channel, f"⏳ Lots of questions right now, you're #{position} in line...")
+
+            try:
+                await admission.admit(keys, priority, on_queued)
+            except RateLimited as e:
+                await outbound.send(message.channel, f"⏳ Slow down a little! Try again in {max(1, round(e.retry_after))}s.")
+                return
+            except QueueFull:
+                await outbound.send(message.channel, "⏳ I'm too busy right now, please try again in a minute.")
+                return
+            try:
+                await handler(message, args)
+            finally:
+                admission.release()
+        return wrapper
+    return decorator
 
 # Handle incoming messages
 @client.event
 async def on_message(message):
     if message.author == client.user:
         return
+    outbound.note_message(message.channel.id)
 
     # Track user
-    db.add_user(str(message.author.id), str(message.author))
-    db.update_user_activity(str(message.author.id))
+    activity_tracker.record(str(message.author.id), str(message.author))
 
-    user_message = message.content.lower()
+    await router.dispatch(message)
 
-    # Handle empty messages
-    if not user_message.strip():
-        await message.channel.send("❌ Please provide a message with your command!")
+# Handle citation requests
+@router.command("!cite")
+@replies_with(ANSWER)
+@admitted(priority=1)
+async def cite_command(message, topic):
+    if not topic:
+        await outbound.send(message.channel, "❌ Please provide a topic to find citations for!")
+        return
+    try:
+        response = await find_citation(topic)
+        await outbound.send(message.channel, f"📚 **Citation for '{topic}':**\n{response}")
+    except Exception as e:
+        await outbound.send(message.channel, "❌ Sorry, I couldn't fetch a citation right now. Please try again later.")
+
+# Handle style-specific responses
+@router.command("!style", parser=lambda raw: raw.split(maxsplit=1))
+@replies_with(ANSWER)
+@admitted(priority=0)
+async def style_command(message, parts):
+    if len(parts) < 2:
+        styles = ", ".join(PERSONAS.keys())
+        await outbound.send(message.channel, f"❌ Please use format: !style <style> <question>\nAvailable styles: {styles}")
         return
-        
-    # Handle citation requests
-    elif user_message.startswith("!cite"):
-        topic = message.content[6:].strip()
-        if not topic:
-            await message.channel.send("❌ Please provide a topic to find citations for!")
-            return
-        try:
-            response = await find_citation(topic)
-            await message.channel.send(f"📚 **Citation for '{topic}':**\n{response}")
-        except Exception as e:
-            await message.channel.send("❌ Sorry, I couldn't fetch a citation right now. Please try again later.")
-            
-    # Handle style-specific responses
-    elif user_message.startswith("!style"):
-        parts = message.content.split(maxsplit=2)
-        if len(parts) < 3:
-            styles = ", ".join(PERSONAS.keys())
-            await message.channel.send(f"❌ Please use format: !style <style> <question>\nAvailable styles: {styles}")
-            return
-            
-        style = parts[1].lower()
-        question = parts[2]
-        
-        if style not in PERSONAS:
-            styles = ", ".join(PERSONAS.keys())
-            await message.channel.send(f"❌ Invalid style. Available styles: {styles}")
-            return
-            
-        try:
-            response = await get_styled_response(question, style)
-            await message.channel.send(f"🎭 **{style.title()} style answer:**\n{response}")
-        except Exception as e:
-            await message.channel.send("❌ Sorry, I couldn't process your request right now. Please try again later.")
-    channel_id = str(message.channel.id)
 
-    if user_message.startswith("!help"):
-        help_text = (
-            "📚 **ChatBuddy Commands:**\n"
-            "`!ai <your question>` – Ask me anything, I'll try to help!\n"
-            "`!style <style> <question>` – Get answers in different styles (kid, teacher, poet, historian, scientist, chef, detective)\n"
-            "`!cite <topic>` – Find academic citations for any topic\n"
-            "`!joke` – Want a laugh? I got you.\n"
-            "`!task` – Get an AI-generated task!\n"
-            "`!homework` – Get an AI-generated study question!\n"
-            "`!subject <subject>` – Get AI-powered questions about a specific subject!\n"
-            "`!game` – Show available games and how to play them!\n"
-            "`!help` – Show this help message.\n\n"
-            "**Examples:**\n"
-            "`!style kid What is gravity?` – Get a kid-friendly explanation\n"
-            "`!cite quantum physics` – Find citations about quantum physics\n"
-            "`!book` – Get link to e-derslik portal\n"
-        )
-        await message.channel.send(help_text)
+    style = parts[0].lower()
+    question = parts[1]
+
+    if style not in PERSONAS:
+        styles = ", ".join(PERSONAS.keys())
+        await outbound.send(message.channel, f"❌ Invalid style. Available styles: {styles}")
         return
 
-    elif user_message.startswith("!joke"):
-        jokes = [
-            "Why did the computer get cold? Because it left its Windows open! 🧊",
-            "I'm reading a book on anti-gravity. It's impossible to put down! 😄",
-            "Why did the robot go on vacation? It needed to recharge! 🔋",
-        ]
-        await message.channel.send(random.choice(jokes))
+    try:
+        response = await get_styled_response(question, style)
+        await outbound.send(message.channel, f"🎭 **{style.title()} style answer:**\n{response}")
+    except Exception as e:
+        await outbound.send(message.channel, "❌ Sorry, I couldn't process your request right now. Please try again later.")
+
+@router.command("!help")
+async def help_command(message, args):
+    help_text = (
+        "📚 **ChatBuddy Commands:**\n"
+        "`!ai <your question>` – Ask me anything, I'll try to help!\n"
+        "`!forget` – Clear what I remember of our conversation here.\n"
+        "`!style <style> <question>` – Get answers in different styles (kid, teacher, poet, historian, scientist, chef, detective)\n"
+        "`!cite <topic>` – Find academic citations for any topic\n"
+        "`!joke` – Want a laugh? I got you.\n"
+        "`!task` – Get an AI-generated task!\n"
+        "`!homework` – Get an AI-generated study question!\n"
+        "`!subject <subject>` – Get AI-powered questions about a specific subject!\n"
+        "`!game` – Show available games and how to play them!\n"
+        "`!help` – Show this help message.\n\n"
+        "**Examples:**\n"
+        "`!style kid What is gravity?` – Get a kid-friendly explanation\n"
+        "`!cite quantum physics` – Find citations about quantum physics\n"
+        "`!book` – Get link to e-derslik portal\n"
+    )
+    await outbound.send(message.channel, help_text)
+
+@router.command("!joke")
+async def joke_command(message, args):
+    await outbound.send(message.channel, random.choice(JOKES))
+
+@router.command("!ai")
+@replies_with(ANSWER)
+@admitted(priority=0)
+async def ai_command(message, user_input):
+    if not user_input:
+        await outbound.send(message.channel, "✏️ Please type your question after `!ai`.")
         return
 
-    elif user_message.startswith("!ai"):
-        user_input = message.content[4:].strip()
-        if not user_input:
-            await message.channel.send("✏️ Please type your question after `!ai`.")
-            return
+    await converse(message, user_input, "ai")
+
+@router.command("!forget")
+async def forget_command(message, args):
+    await conversation_memory.forget(f"{message.channel.id}:{message.author.id}")
+    await outbound.send(message.channel, "🧹 Okay, I've forgotten our conversation in this channel.")
+
+@router.command("!task")
+@replies_with(ANSWER)
+@admitted(priority=1)
+async def task_command(message, args):
+    response = await query_huggingface("Generate a simple task.", command="task")
+    await outbound.send(message.channel, response)
+
+@router.command("!homework")
+@replies_with(ANSWER)
+@admitted(priority=0)
+async def homework_command(message, user_input):
+    if not user_input:
+        await outbound.send(message.channel, "✏️ Please type your question after `!homework`.")
+        return
 
-        thinking_lines = [
-            "🤖 Thinking really hard...",
-            "🔍 Looking that up in my brain-database...",
-            "💡 One moment while I craft a smart answer...",
-            "✨ Summoning the AI powers..."
-        ]
-        await message.channel.send(random.choice(thinking_lines))
-
-        response = query_huggingface(user_input)
-        await message.channel.send(response)
-
-    elif user_message.startswith("!task"):
-        response = query_huggingface("Generate a simple task.")
-        await message.channel.send(response)
-
-    elif user_message.startswith("!homework"):
-        user_input = message.content[10:].strip()
-        if not user_input:
-            await message.channel.send("✏️ Please type your question after `!homework`.")
-            return
+    await converse(message, user_input, "homework")
 
-        thinking_lines = [
-            "🤖 Thinking really hard...",
-            "🔍 Looking that up in my brain-database...",
-            "💡 One moment while I craft a smart answer...",
-            "✨ Summoning the AI powers..."
-        ]
-        await message.channel.send(random.choice(thinking_lines))
-
-        response = query_huggingface(user_input)
-        await message.channel.send(response)
-
-    elif user_message.startswith("!subject"):
-        subject = user_message[9:].strip()
-        if not subject:
-            await message.channel.send("Please specify a subject after '!subject'.")
-            return
-        response = query_huggingface(f"Generate a question about {subject}.")
-        await message.channel.send(response)
-
-    elif user_message.startswith("!game"):
-        game_command = user_message[6:].strip().lower()
-        is_ai_mode = "ai" in game_command
-
-        if is_ai_mode:
-            game_command = game_command.replace("ai", "").strip()
-
-        if not game_command:
-            game_help = (
-                "🎮 **Available Games:**\n\n"
-                "**AI Mode:**\n"
-                "- Add 'ai' to game command to play against AI (e.g., `!game ai chess`)\n\n"
-                "1. **Chess** ♟️\n"
-                "- Type `!game chess` to start a chess game\n"
-                "- Move pieces with `!move e2 e4` format\n"
-                "- Type `!select e2` to highlight a piece\n"
-                "- Type `!move e4` to move selected piece\n"
-                "- Type `!chess` to view the current board\n"
-                "- Type `!reset chess` to reset the game\n\n"
-                "2. **Draughts** 🔵\n"
-                "- Type `!game draughts` to start a draughts game\n"
-                "- Get tips and game scenarios\n"
-            )
-            await message.channel.send(game_help)
-            return
+@router.command("!subject", parser=str.lower)
+@replies_with(ANSWER)
+@admitted(priority=1)
+async def subject_command(message, subject):
+    if not subject:
+        await outbound.send(message.channel, "Please specify a subject after '!subject'.")
+        return
+    response = await query_huggingface(f"Generate a question about {subject}.", command="subject")
+    await outbound.send(message.channel, response)
 
-        if game_command == "chess":
-            # Create a new chess game for this channel
-            chess_games[channel_id] = new_chess_game()
-            game = chess_games[channel_id]
-            if is_ai_mode:
-                game["mode"] = "ai"
-
-            # Display the board
-            board_display = render_board(game['board'])
-
-            instructions = (
-                "**How to play:**\n"
-                "1. White pieces: ♔♕♖♗♘♙\n"
-                "2. Black pieces: ♚♛♜♝♞♟\n"
-                "3. Move with `!move e2 e4` or select with `!select e2` then `!move e4`\n"
-                "4. Type `!chess` to see the current board\n"
-                "5. Type `!reset chess` to reset the game\n"
-            )
-
-            await message.channel.send(board_display + "\n" + instructions)
-
-        elif game_command == "draughts":
-            # Create a new draughts game for this channel
-            draughts_games[channel_id] = new_draughts_game()
-            game = draughts_games[channel_id]
-            if is_ai_mode:
-                game["mode"] = "ai"
-
-            # Display the board
-            board_display = render_draughts_board(game['board'])
-
-            instructions = (
-                "**How to play Draughts:**\n"
-                "1. White pieces: ⚪(normal) ⬜(king)\n"
-                "2. Black pieces: ⚫(normal) ⬛(king)\n"
-                "3. Move with `!dmove A3 B4` or select with `!dselect A3` then `!dmove B4`\n"
-                "4. Type `!draughts` to see the current board\n"
-                "5. Type `!reset draughts` to reset the game\n"
-            )
-
-            await message.channel.send(board_display + "\n" + instructions)
-
-
-    # Chess game commands
-    elif user_message.startswith("!chess"):
-        if channel_id not in chess_games:
-            await message.channel.send("❌ No chess game in progress. Type `!game chess` to start.")
-            return
+@router.command("!game", parser=lambda raw: raw.lower().split())
+@replies_with(GAME)
+async def game_command(message, words):
+    channel_id = str(message.channel.id)
+    is_ai_mode = "ai" in words
+    game_command = " ".join(word for word in words if word != "ai")
+
+    if not game_command:
+        game_help = (
+            "🎮 **Available Games:**\n\n"
+            "**AI Mode:**\n"
+            "- Add 'ai' to game command to play against AI (e.g., `!game ai chess`)\n\n"
+            "1. **Chess** ♟️\n"
+            "- Type `!game chess` to start a chess game\n"
+            "- Move pieces with `!move e2 e4` format\n"
+            "- Type `!select e2` to highlight a piece\n"
+            "- Type `!move e4` to move selected piece\n"
+            "- Type `!chess` to view the current board\n"
+            "- Type `!reset chess` to reset the game\n"
+            "- Type `!undo chess` to take back a move, `!history chess` to list the moves\n\n"
+            "2. **Draughts** 🔵\n"
+            "- Type `!game draughts` to start a draughts game\n"
+            "- Type `!undo draughts` to take back a move, `!history draughts` to list the moves\n"
+            "- Get tips and game scenarios\n"
+        )
+        await outbound.send(message.channel, game_help)
+        return
 
-        # Display the current board
-        game = chess_games[channel_id]
-        board_display = render_board(game['board'])
-        status_message = f"\n**Status:** {game['status']}"
+    if game_command == "chess":
+        # Create a new chess game for this channel
+        game = ChessGame(mode="ai" if is_ai_mode else None)
+        chess_games.put(channel_id, game)
+
+        # Display the board
+        board_display = render_board(game)
+
+        instructions = (
+            "**How to play:**\n"
+            "1. White pieces: ♔♕♖♗♘♙\n"
+            "2. Black pieces: ♚♛♜♝♞♟\n"
+            "3. Move with `!move e2 e4` or select with `!select e2` then `!move e4`\n"
+            "4. Type `!chess` to see the current board\n"
+            "5. Type `!reset chess` to reset the game\n"
+        )
 
-        await message.channel.send(board_display + status_message)
+        await outbound.send(message.channel, board_display + "\n" + instructions)
 
-    elif user_message.startswith("!select"):
-        if channel_id not in chess_games:
-            await message.channel.send("❌ No chess game in progress. Type `!game chess` to start.")
-            return
+    elif game_command == "draughts":
+        # Create a new draughts game for this channel
+        game = DraughtsGame(mode="ai" if is_ai_mode else None)
+        draughts_games.put(channel_id, game)
 
-        game = chess_games[channel_id]
-        position = user_message[8:].strip().lower()
-        pos = parse_position(position)
+        # Display the board
+        board_display = render_draughts_board(game)
 
-        if not pos:
-            await message.channel.send("❌ Invalid position. Use format like 'e2'.")
-            return
+        instructions = (
+            "**How to play Draughts:**\n"
+            "1. White pieces: ⚪(normal) ⬜(king)\n"
+            "2. Black pieces: ⚫(normal) ⬛(king)\n"
+            "3. Move with `!dmove A3 B4` or select with `!dselect A3` then `!dmove B4`\n"
+            "4. Type `!draughts` to see the current board\n"
+            "5. Type `!reset draughts` to reset the game\n"
+        )
 
-        row, col = pos
-        piece = game['board'][row][col]
+        await outbound.send(message.channel, board_display + "\n" + instructions)
 
-        if not piece:
-            await message.channel.send("❌ No piece at that position.")
-            return
+# Chess game commands
+@router.command("!chess")
+@replies_with(GAME)
+async def chess_command(message, args):
+    channel_id = str(message.channel.id)
+    game = await chess_games.get(channel_id)
+    if game is None:
+        await outbound.send(message.channel, "❌ No chess game in progress. Type `!game chess` to start.")
+        return
 
-        if piece[0] != game['turn']:
-            await message.channel.send(f"❌ It's {'White' if game['turn'] == 'w' else 'Black'}'s turn.")
-            return
+    # Display the current board
+    board_display = render_board(game)
+    status_message = f"\n**Status:** {game.status}"
+
+    await outbound.send(message.channel, board_display + status_message)
 
-        game['selected'] = pos
-        game['status'] = f"Selected {get_piece_symbol(piece)} at {position}. Use `!move <position>` to move."
+@router.command("!select", parser=str.lower)
+@replies_with(GAME)
+async def select_command(message, position):
+    channel_id = str(message.channel.id)
+    game = await chess_games.get(channel_id)
+    if game is None:
+        await outbound.send(message.channel, "❌ No chess game in progress. Type `!game chess` to start.")
+        return
+    pos = parse_position(position)
 
-        # Display the board with selection
-        board_display = render_board(game['board'])
-        status_message = f"\n**Status:** {game['status']}"
+    if not pos:
+        await outbound.send(message.channel, "❌ Invalid position. Use format like 'e2'.")
+        return
 
-        await message.channel.send(board_display + status_message)
+    row, col = pos
+    piece = game.piece_at(pos)
 
-    elif user_message.startswith("!move"):
-        if channel_id not in chess_games:
-            await message.channel.send("❌ No chess game in progress. Type `!game chess` to start.")
-            return
+    if not piece:
+        await outbound.send(message.channel, "❌ No piece at that position.")
+        return
 
-        game = chess_games[channel_id]
-        parts = user_message[6:].strip().lower().split()
+    if piece[0] != game.turn:
+        await outbound.send(message.channel, f"❌ It's {'White' if game.turn == 'w' else 'Black'}'s turn.")
+        return
 
-        # Format can be "!move e2 e4" or "!move e4" (if a piece is selected)
-        if len(parts) == 2:
-            from_pos = parse_position(parts[0])
-            to_pos = parse_position(parts[1])
+    game.selected = pos
+    game.status = f"Selected {get_piece_symbol(piece)} at {position}. Use `!move <position>` to move."
+    chess_games.mark_dirty(channel_id)
 
-            if not from_pos or not to_pos:
-                await message.channel.send("❌ Invalid position(s). Use format like 'e2 e4'.")
-                return
+    # Display the board with selection
+    board_display = render_board(game)
+    status_message = f"\n**Status:** {game.status}"
 
-        elif len(parts) == 1 and game['selected']:
-            from_pos = game['selected']
-            to_pos = parse_position(parts[0])
+    await outbound.send(message.channel, board_display + status_message)
 
-            if not to_pos:
-                await message.channel.send("❌ Invalid position. Use format like 'e4'.")
-                return
+@router.command("!move", parser=lambda raw: raw.lower().split())
+@replies_with(GAME)
+async def move_command(message, parts):
+    channel_id = str(message.channel.id)
+    game = await chess_games.get(channel_id)
+    if game is None:
+        await outbound.send(message.channel, "❌ No chess game in progress. Type `!game chess` to start.")
+        return
+    if game.ai_to_move:
+        if channel_id in ai_thinking["chess"]:
+            await outbound.send(message.channel, "🤖 The AI is still thinking, please wait for its move.")
         else:
-            await message.channel.send("❌ Invalid move format. Use `!move e2 e4` or select a piece first with `!select e2`.")
+            # The last search failed or was cut short by a restart
+            await play_ai_move(message, "chess")
+        return
+
+    # Format can be "!move e2 e4" or "!move e4" (if a piece is selected)
+    if len(parts) == 2:
+        from_pos = parse_position(parts[0])
+        to_pos = parse_position(parts[1])
+
+        if not from_pos or not to_pos:
+            await outbound.send(message.channel, "❌ Invalid position(s). Use format like 'e2 e4'.")
             return
 
-        # Validate and make the move
-        valid, error_msg = validate_move(game, from_pos, to_pos)
+    elif len(parts) == 1 and game.selected:
+        from_pos = game.selected
+        to_pos = parse_position(parts[0])
 
-        if valid:
-            make_move(game, from_pos, to_pos)
-            board_display = render_board(game['board'])
-            status_message = f"\n**Status:** {game['status']}"
+        if not to_pos:
+            await outbound.send(message.channel, "❌ Invalid position. Use format like 'e4'.")
+            return
+    else:
+        await outbound.send(message.channel, "❌ Invalid move format. Use `!move e2 e4` or select a piece first with `!select e2`.")
+        return
 
-            await message.channel.send(board_display + status_message)
+    # Validate and make the move
+    valid, error_msg = game.validate(from_pos, to_pos)
 
-            # AI's turn
-            if "ai" in chess_games[channel_id].get("mode", ""):
-                ai_move = get_ai_chess_move(game)
-                if ai_move:
-                    make_move(game, ai_move[0], ai_move[1])
-                    board_display = render_board(game['board'])
-                    status_message = f"\n**Status:** {game['status']}"
-                    await message.channel.send("🤖 AI move:" + board_display + status_message)
-        else:
-            await message.channel.send(f"❌ Invalid move: {error_msg}")
+    if valid:
+        game.make(from_pos, to_pos)
+        chess_games.mark_dirty(channel_id)
+        board_display = render_board(game)
+        status_message = f"\n**Status:** {game.status}"
 
-    elif user_message.startswith("!reset chess"):
-        if channel_id in chess_games:
-            chess_games[channel_id] = new_chess_game()
-            game = chess_games[channel_id]
-            board_display = render_board(game['board'])
+        await outbound.send(message.channel, board_display + status_message)
 
-            await message.channel.send("♟️ **Chess game reset!**\n" + board_display)
-        else:
-            await message.channel.send("❌ No chess game to reset. Type `!game chess` to start.")
+        # AI's turn
+        if game.mode == "ai":
+            await play_ai_move(message, "chess")
+    else:
+        await outbound.send(message.channel, f"❌ Invalid move: {error_msg}")
 
-    elif user_message.startswith("!draughts"):
-        if channel_id not in draughts_games:
-            await message.channel.send("❌ No draughts game in progress. Type `!game draughts` to start.")
-            return
+@router.command("!reset", parser=str.lower)
+@replies_with(GAME)
+async def reset_command(message, target):
+    channel_id = str(message.channel.id)
+    if target == "chess":
+        if await chess_games.get(channel_id) is not None:
+            game = ChessGame()
+            chess_games.put(channel_id, game)
+            board_display = render_board(game)
 
-        # Display the current board
-        game = draughts_games[channel_id]
-        board_display = render_draughts_board(game['board'])
-        status_message = f"\n**Status:** {game['status']}"
+            await outbound.send(message.channel, "♟️ **Chess game reset!**\n" + board_display)
+        else:
+            await outbound.send(message.channel, "❌ No chess game to reset. Type `!game chess` to start.")
 
-        await message.channel.send(board_display + status_message)
+    elif target == "draughts":
+        if await draughts_games.get(channel_id) is not None:
+            game = DraughtsGame()
+            draughts_games.put(channel_id, game)
+            board_display = render_draughts_board(game)
 
-    elif user_message.startswith("!dselect"):
-        if channel_id not in draughts_games:
-            await message.channel.send("❌ No draughts game in progress. Type `!game draughts` to start.")
-            return
+            await outbound.send(message.channel, "⚫ **Draughts game reset!**\n" + board_display)
+        else:
+            await outbound.send(message.channel, "❌ No draughts game to reset. Type `!game draughts` to start.")
 
-        game = draughts_games[channel_id]
-        position = user_message[9:].strip().upper()
-        pos = parse_draughts_position(position)
+# Longest move list !history sends; older moves are cut off first
+HISTORY_LIMIT = 1900
 
-        if not pos:
-            await message.channel.send("❌ Invalid position. Use format like 'A3'.")
-            return
+@router.command("!undo", parser=str.lower)
+@replies_with(GAME)
+async def undo_command(message, target):
+    if target not in GAME_KINDS:
+        await outbound.send(message.channel, "❌ Use `!undo chess` or `!undo draughts`.")
+        return
+    store, render = GAME_KINDS[target]
+    channel_id = str(message.channel.id)
+    game = await store.get(channel_id)
+    if game is None:
+        await outbound.send(message.channel, f"❌ No {target} game in progress. Type `!game {target}` to start.")
+        return
+    # A game stuck on the AI's turn may take back the player's move instead
+    if channel_id in ai_thinking[target]:
+        await outbound.send(message.channel, "🤖 The AI is still thinking, please wait for its move.")
+        return
+    if not game.undo():
+        await outbound.send(message.channel, "❌ There is no move to take back.")
+        return
+    # Against the AI, take back its reply as well so it is the player's turn
+    if game.mode == "ai" and game.turn != 'w':
+        game.undo()
+    store.mark_dirty(channel_id)
+
+    status_message = f"\n**Status:** {game.status}"
+    await outbound.send(message.channel, "↩️ **Move taken back!**\n" + render(game) + status_message)
+
+@router.command("!history", parser=str.lower)
+@replies_with(GAME)
+async def history_command(message, target):
+    if target not in GAME_KINDS:
+        await outbound.send(message.channel, "❌ Use `!history chess` or `!history draughts`.")
+        return
+    store, _ = GAME_KINDS[target]
+    game = await store.get(str(message.channel.id))
+    if game is None:
+        await outbound.send(message.channel, f"❌ No {target} game in progress. Type `!game {target}` to start.")
+        return
+    moves = game.history()
+    if not moves:
+        await outbound.send(message.channel, "📜 No moves played yet.")
+        return
 
-        row, col = pos
-        piece = game['board'][row][col]
+    text = number_moves(moves)
+    if len(text) > HISTORY_LIMIT:
+        text = "… " + text[text.index(" ", len(text) - HISTORY_LIMIT) + 1:]
+    await outbound.send(message.channel, f"📜 **{target.title()} moves:**\n{text}")
 
-        if not piece or piece == ' ':
-            await message.channel.send("❌ No piece at that position.")
-            return
+@router.command("!draughts")
+@replies_with(GAME)
+async def draughts_command(message, args):
+    channel_id = str(message.channel.id)
+    game = await draughts_games.get(channel_id)
+    if game is None:
+        await outbound.send(message.channel, "❌ No draughts game in progress. Type `!game draughts` to start.")
+        return
 
-        if piece.lower() != game['turn']:
-            await message.channel.send(f"❌ It's {'White' if game['turn'] == 'w' else 'Black'}'s turn.")
-            return
+    # Display the current board
+    board_display = render_draughts_board(game)
+    status_message = f"\n**Status:** {game.status}"
 
-        game['selected'] = pos
-        game['status'] = f"Selected piece at {position}. Use `!dmove <position>` to move."
+    await outbound.send(message.channel, board_display + status_message)
 
-        # Display the board with selection
-        board_display = render_draughts_board(game['board'])
-        status_message = f"\n**Status:** {game['status']}"
+@router.command("!dselect", parser=str.upper)
+@replies_with(GAME)
+async def dselect_command(message, position):
+    channel_id = str(message.channel.id)
+    game = await draughts_games.get(channel_id)
+    if game is None:
+        await outbound.send(message.channel, "❌ No draughts game in progress. Type `!game draughts` to start.")
+        return
+    pos = parse_draughts_position(position)
 
-        await message.channel.send(board_display + status_message)
+    if not pos:
+        await outbound.send(message.channel, "❌ Invalid position. Use format like 'A3'.")
+        return
 
-    elif user_message.startswith("!dmove"):
-        if channel_id not in draughts_games:
-            await message.channel.send("❌ No draughts game in progress. Type `!game draughts` to start.")
-            return
+    row, col = pos
+    piece = game.piece_at(pos)
+
+    if piece == ' ':
+        await outbound.send(message.channel, "❌ No piece at that position.")
+        return
 
-        game = draughts_games[channel_id]
-        parts = user_message[7:].strip().upper().split()
+    if piece.lower() != game.turn:
+        await outbound.send(message.channel, f"❌ It's {'White' if game.turn == 'w' else 'Black'}'s turn.")
+        return
 
-        # Format can be "!dmove A3 B4" or "!dmove B4" (if a piece is selected)
-        if len(parts) == 2:
-            from_pos = parse_draughts_position(parts[0])
-            to_pos = parse_draughts_position(parts[1])
+    game.selected = pos
+    game.status = f"Selected piece at {position}. Use `!dmove <position>` to move."
+    draughts_games.mark_dirty(channel_id)
 
-            if not from_pos or not to_pos:
-                await message.channel.send("❌ Invalid position(s). Use format like 'A3 B4'.")
-                return
+    # Display the board with selection
+    board_display = render_draughts_board(game)
+    status_message = f"\n**Status:** {game.status}"
 
-        elif len(parts) == 1 and game['selected']:
-            from_pos = game['selected']
-            to_pos = parse_draughts_position(parts[0])
+    await outbound.send(message.channel, board_display + status_message)
 
-            if not to_pos:
-                await message.channel.send("❌ Invalid position. Use format like 'B4'.")
-                return
+@router.command("!dmove", parser=lambda raw: raw.upper().split())
+@replies_with(GAME)
+async def dmove_command(message, parts):
+    channel_id = str(message.channel.id)
+    game = await draughts_games.get(channel_id)
+    if game is None:
+        await outbound.send(message.channel, "❌ No draughts game in progress. Type `!game draughts` to start.")
+        return
+    if game.ai_to_move:
+        if channel_id in ai_thinking["draughts"]:
+            await outbound.send(message.channel, "🤖 The AI is still thinking, please wait for its move.")
         else:
-            await message.channel.send("❌ Invalid move format. Use `!dmove A3 B4` or select a piece first with `!dselect A3`.")
+            # The last search failed or was cut short by a restart
+            await play_ai_move(message, "draughts")
+        return
+
+    # Format can be "!dmove A3 B4" or "!dmove B4" (if a piece is selected)
+    if len(parts) == 2:
+        from_pos = parse_draughts_position(parts[0])
+        to_pos = parse_draughts_position(parts[1])
+
+        if not from_pos or not to_pos:
+            await outbound.send(message.channel, "❌ Invalid position(s). Use format like 'A3 B4'.")
             return
 
-        # Validate and make the move
-        valid, error_msg = validate_draughts_move(game, from_pos, to_pos)
+    elif len(parts) == 1 and game.selected:
+        from_pos = game.selected
+        to_pos = parse_draughts_position(parts[0])
 
-        if valid:
-            make_draughts_move(game, from_pos, to_pos)
-            board_display = render_draughts_board(game['board'])
-            status_message = f"\n**Status:** {game['status']}"
+        if not to_pos:
+            await outbound.send(message.channel, "❌ Invalid position. Use format like 'B4'.")
+            return
+    else:
+        await outbound.send(message.channel, "❌ Invalid move format. Use `!dmove A3 B4` or select a piece first with `!dselect A3`.")
+        return
 
-            await message.channel.send(board_display + status_message)
+    # Validate and make the move
+    valid, error_msg = game.validate(from_pos, to_pos)
 
-            # AI's turn
-            if "ai" in draughts_games[channel_id].get("mode", ""):
-                ai_move = get_ai_draughts_move(game)
-                if ai_move:
-                    make_draughts_move(game, ai_move[0], ai_move[1])
-                    board_display = render_draughts_board(game['board'])
-                    status_message = f"\n**Status:** {game['status']}"
-                    await message.channel.send("🤖 AI move:" + board_display + status_message)
-        else:
-            await message.channel.send(f"❌ Invalid move: {error_msg}")
+    if valid:
+        game.make(from_pos, to_pos)
+        draughts_games.mark_dirty(channel_id)
+        board_display = render_draughts_board(game)
+        status_message = f"\n**Status:** {game.status}"
 
-    elif user_message.startswith("!reset draughts"):
-        if channel_id in draughts_games:
-            draughts_games[channel_id] = new_draughts_game()
-            game = draughts_games[channel_id]
-            board_display = render_draughts_board(game['board'])
+        await outbound.send(message.channel, board_display + status_message)
 
-            await message.channel.send("⚫ **Draughts game reset!**\n" + board_display)
-        else:
-            await message.channel.send("❌ No draughts game to reset. Type `!game draughts` to start.")
+        # AI's turn (it plays Black and finishes its own jump chains)
+        if game.mode == "ai":
+            await play_ai_move(message, "draughts")
+    else:
+        await outbound.send(message.channel, f"❌ Invalid move: {error_msg}")
+
+@router.command("!book")
+async def book_command(message, args):
+    ederslik_text = (
+        "📚 **E-dərslik:**\n"
+        "E-dərslik portalına keçid: https://e-derslik.edu.az/portal/\n"
+        "Bütün fənlər üzrə elektron dərsliklər burada!"
+    )
+    await outbound.send(message.channel, ederslik_text)
+
+@router.command("!profile")
+async def profile_command(message, args):
+    """Admins only: sample the event loop and report where its time goes"""
+    if message.author.id not in ADMIN_IDS:
+        return
+    try:
+        seconds = min(max(float(args or 10), 1.0), PROFILE_MAX_SECONDS)
+    except ValueError:
+        await outbound.send(message.channel, "❌ Usage: `!profile [seconds]`")
+        return
+    if profiler.running:
+        await outbound.send(message.channel, "⏳ A profile is already being captured.")
+        return
 
-    if user_message.startswith("!book"):
-        ederslik_text = (
-            "📚 **E-dərslik:**\n"
-            "E-dərslik portalına keçid: https://e-derslik.edu.az/portal/\n"
-            "Bütün fənlər üzrə elektron dərsliklər burada!"
-        )
-        await message.channel.send(ederslik_text)
-        
-            
+    await outbound.send(message.channel, f"🔬 Profiling the event loop for {seconds:g}s...")
+    try:
+        profile = await asyncio.to_thread(profiler.capture, seconds)
+    except RuntimeError:
+        await outbound.send(message.channel, "⏳ A profile is already being captured.")
+        return
+    samples = max(profile.samples, 1)
+    lines = [
+        f"{profile.samples} samples in {profile.duration:.1f}s, "
+        f"{profile.idle_samples() * 100 / samples:.0f}% idle",
+        " self%  total%  function"
+    ]
+    for name, own, total in profile.top(12):
+        lines.append(f"{own * 100 / samples:5.1f} {total * 100 / samples:7.1f}  {name}")
+    report = "\n".join(lines)[:1900]
+    # Full stacks in collapsed format, for flame graph tools
+    stacks = discord.File(io.BytesIO(profile.collapsed().encode("utf-8")), filename="profile.txt")
+    await outbound.send(message.channel, f"```\n{report}\n```", file=stacks)
+
+
+async def start_services():
+    """Start everything but the Discord connection; also used by bench/"""
+    workers.start()
+    await inference_backend.start()
+    inference_resilience.start_keep_warm(model_router.models, KEEP_WARM_INTERVAL)
+    activity_tracker.start()
+    conversation_memory.start()
+    chess_games.start()
+    draughts_games.start()
+    loop_lag.start()
+    if METRICS_PORT:
+        await metrics_server.start()
+
+async def stop_services():
+    """Flush pending state and release what start_services acquired"""
+    await outbound.close()
+    await metrics_server.close()
+    await loop_lag.close()
+    await activity_tracker.close()
+    await conversation_memory.close()
+    await chess_games.close()
+    await draughts_games.close()
+    await inference_resilience.close()
+    await inference_backend.close()
+    if semantic_cache is not None:
+        semantic_cache.close()
+    opening_book.close()
+    state_store.close()
+    workers.shutdown()
+
+
+async def main():
+    async with client:
+        await start_services()
+        try:
+            await client.start(DISCORD_BOT_TOKEN)
+        finally:
+            await stop_services()
 
 
 # Run the bot
-client.run(DISCORD_BOT_TOKEN)
+if __name__ == "__main__":
+    discord.utils.setup_logging()
+    asyncio.run(main())
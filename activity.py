@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+
+from metrics import DB_WRITE_SECONDS
+
+
+log = logging.getLogger(__name__)
+
+
+class ActivityTracker:
+    """Write-behind user activity counters.
+
+    ``record`` only touches an in-memory dict. A background task writes the
+    accumulated counters as one upsert transaction every ``flush_interval``
+    seconds, or sooner once ``flush_every`` events have been recorded, so
+    message handling never waits on the disk. The upsert adds to the stored
+    counts, so every bot process can flush into the same file; a busy
+    timeout makes their writes wait for each other.
+    """
+
+    def __init__(self, path, flush_interval=10.0, flush_every=500, busy_timeout=5.0):
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self._pending = {}
+        self._events = 0
+        self._wake = None
+        self._task = None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS user_activity ("
+            "user_id TEXT PRIMARY KEY, username TEXT NOT NULL, "
+            "message_count INTEGER NOT NULL DEFAULT 0, "
+            "first_seen REAL NOT NULL, last_seen REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def record(self, user_id, username):
+        """Count one message from a user; O(1), never blocks"""
+        now = time.time()
+        entry = self._pending.get(user_id)
+        if entry is None:
+            self._pending[user_id] = [username, 1, now, now]
+        else:
+            entry[0] = username
+            entry[1] += 1
+            entry[3] = now
+        self._events += 1
+        if self._events >= self.flush_every and self._wake is not None:
+            self._wake.set()
+
+    def start(self):
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("Failed to flush user activity")
+
+    async def flush(self):
+        if not self._pending:
+            return
+        batch, self._pending, self._events = self._pending, {}, 0
+        rows = [
+            (user_id, name, count, first_seen, last_seen)
+            for user_id, (name, count, first_seen, last_seen) in batch.items()
+        ]
+        try:
+            with DB_WRITE_SECONDS.labels("activity").time():
+                await asyncio.to_thread(self._write, rows)
+        except Exception:
+            self._merge_back(batch)
+            raise
+
+    def _merge_back(self, batch):
+        # Keep counters from a failed flush for the next attempt
+        for user_id, (name, count, first_seen, last_seen) in batch.items():
+            entry = self._pending.get(user_id)
+            if entry is None:
+                self._pending[user_id] = [name, count, first_seen, last_seen]
+            else:
+                entry[1] += count
+                entry[2] = first_seen
+
+    def _write(self, rows):
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO user_activity "
+                    "(user_id, username, message_count, first_seen, last_seen) "
+                    "VALUES (?, ?, ?, ?, ?) ON CONFLICT(user_id) DO UPDATE SET "
+                    "username = excluded.username, "
+                    "message_count = message_count + excluded.message_count, "
+                    "last_seen = excluded.last_seen",
+                    rows
+                )
+
+    async def close(self):
+        """Stop the background task and write whatever is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,209 @@
+"""Synthetic Discord objects and traffic for driving the bot's ``on_message``.
+
+FakeUser, FakeGuild, FakeChannel and FakeMessage provide the parts of the
+discord.py models the bot touches. Sending to a channel or editing a
+message sleeps ``rest_latency`` seconds in place of the REST round trip.
+FakeGateway turns command names into messages and delivers them: chat
+commands go to random users and channels, game commands to a pool of game
+channels where every move is legal in that channel's current game.
+"""
+import asyncio
+import itertools
+import random
+import time
+
+from chess_engine import move_from, move_to, square_to_pos
+from draughts_search import generate_moves
+
+
+QUESTIONS = [
+    "What is photosynthesis?",
+    "How do vaccines work?",
+    "Explain the Pythagorean theorem",
+    "Why is the sky blue?",
+    "What caused the first world war?",
+    "How does a computer store numbers?",
+    "What is the difference between weather and climate?",
+    "How do I solve a quadratic equation?",
+    "What is an atom made of?",
+    "Why do we have seasons?",
+    "How does the heart pump blood?",
+    "What is inflation in economics?",
+    "Summarize the water cycle",
+    "What is a black hole?",
+    "How do plants grow from seeds?",
+    "What is the capital of Azerbaijan and why is it important?",
+]
+
+TOPICS = ["quantum physics", "climate change", "machine learning", "ancient rome", "genetics"]
+SUBJECTS = ["math", "physics", "chemistry", "biology", "history", "geography"]
+STYLES = ["kid", "teacher", "poet", "historian", "scientist", "chef", "detective"]
+
+CHAT_KINDS = {"ai", "homework", "style", "cite", "task", "subject", "help", "joke"}
+GAME_KINDS = {"move", "dmove"}
+
+
+class FakeUser:
+    def __init__(self, id, name=None):
+        self.id = id
+        self.name = name or f"user{id}"
+        self.bot = False
+        self.mention = f"<@{id}>"
+
+    def __str__(self):
+        return self.name
+
+
+class FakeGuild:
+    def __init__(self, id):
+        self.id = id
+
+
+class FakeChannel:
+    def __init__(self, gateway, id, guild=None):
+        self.gateway = gateway
+        self.id = id
+        self.guild = guild
+        self.lock = asyncio.Lock()
+
+    async def send(self, content=None, **kwargs):
+        await self.gateway.rest_call("sends")
+        return FakeMessage(self.gateway, content, self, self.gateway.bot_user)
+
+
+class FakeMessage:
+    _ids = itertools.count(1)
+
+    def __init__(self, gateway, content, channel, author):
+        self.gateway = gateway
+        self.id = next(self._ids)
+        self.content = content
+        self.channel = channel
+        self.author = author
+        self.guild = channel.guild
+
+    async def edit(self, content=None, **kwargs):
+        await self.gateway.rest_call("edits")
+        if content is not None:
+            self.content = content
+        return self
+
+
+def chess_square(pos):
+    row, col = pos
+    return f"{chr(ord('a') + col)}{8 - row}"
+
+
+def draughts_square(sq):
+    row, col = divmod(sq, 8)
+    return f"{chr(ord('A') + row)}{col + 1}"
+
+
+class FakeGateway:
+    """Builds messages for a command mix and feeds them to the bot.
+
+    ``deliver`` returns the command name it sent and the seconds
+    ``on_message`` took. Game channels are used by one message at a time,
+    as a player waits for the board before moving again; the wait for the
+    channel is not counted in the latency. ``on_deliver``, if set, is
+    called with each message just before it is dispatched.
+    """
+
+    def __init__(self, bot, users=200, channels=50, guilds=5, game_channels=50,
+                 rest_latency=0.05, repeat_ratio=0.5, seed=0):
+        self.bot = bot
+        self.rest_latency = rest_latency
+        self.repeat_ratio = repeat_ratio
+        self.random = random.Random(seed)
+        self.bot_user = FakeUser(0, "ChatBuddy")
+        self.stats = {"sends": 0, "edits": 0}
+        self._unique = itertools.count(1)
+        self.guilds = [FakeGuild(1000 + i) for i in range(guilds)]
+        self.users = [FakeUser(10000 + i) for i in range(users)]
+        self.channels = [FakeChannel(self, 20000 + i, self.guilds[i % guilds] if guilds else None)
+                         for i in range(channels)]
+        self.game_channels = {
+            kind: [FakeChannel(self, offset + i, self.guilds[i % guilds] if guilds else None)
+                   for i in range(game_channels)]
+            for kind, offset in (("move", 30000), ("dmove", 40000))
+        }
+        self._replay_channels = {}
+        self.on_deliver = None
+
+    async def rest_call(self, kind):
+        self.stats[kind] += 1
+        if self.rest_latency:
+            await asyncio.sleep(self.rest_latency)
+
+    def _question(self):
+        question = self.random.choice(QUESTIONS)
+        if self.random.random() >= self.repeat_ratio:
+            question += f" (case {next(self._unique)})"
+        return question
+
+    def chat_content(self, kind):
+        if kind == "ai":
+            return f"!ai {self._question()}"
+        if kind == "homework":
+            return f"!homework {self._question()}"
+        if kind == "style":
+            return f"!style {self.random.choice(STYLES)} {self._question()}"
+        if kind == "cite":
+            return f"!cite {self.random.choice(TOPICS)}"
+        if kind == "subject":
+            return f"!subject {self.random.choice(SUBJECTS)}"
+        return f"!{kind}"
+
+    async def chess_content(self, channel):
+        game = await self.bot.chess_games.get(str(channel.id))
+        moves = game.position.legal_moves() if game and game.turn == 'w' else None
+        if not moves:
+            return "game", "!game ai chess"
+        move = self.random.choice(moves)
+        frm, to = square_to_pos(move_from(move)), square_to_pos(move_to(move))
+        return "move", f"!move {chess_square(frm)} {chess_square(to)}"
+
+    async def draughts_content(self, channel):
+        game = await self.bot.draughts_games.get(str(channel.id))
+        moves = None
+        if game and game.turn == 'w':
+            only_from = None
+            if game.must_jump and game.selected:
+                only_from = game.selected[0] * 8 + game.selected[1]
+            moves = generate_moves(list(game.cells.decode('ascii')), 'w', only_from)
+        if not moves:
+            return "game", "!game ai draughts"
+        path = self.random.choice(moves)[0]
+        # One hop per message, as players enter multi-jumps
+        return "dmove", f"!dmove {draughts_square(path[0])} {draughts_square(path[1])}"
+
+    async def _dispatch(self, channel, author, content):
+        message = FakeMessage(self, content, channel, author)
+        if self.on_deliver is not None:
+            self.on_deliver(message)
+        started = time.perf_counter()
+        await self.bot.on_message(message)
+        return time.perf_counter() - started
+
+    async def deliver(self, kind):
+        """Send one message of ``kind``; returns (command, seconds)"""
+        author = self.random.choice(self.users)
+        if kind in GAME_KINDS:
+            channel = self.random.choice(self.game_channels[kind])
+            async with channel.lock:
+                if kind == "move":
+                    kind, content = await self.chess_content(channel)
+                else:
+                    kind, content = await self.draughts_content(channel)
+                return kind, await self._dispatch(channel, author, content)
+        channel = self.random.choice(self.channels)
+        return kind, await self._dispatch(channel, author, self.chat_content(kind))
+
+    async def deliver_raw(self, channel_id, user_id, guild_id, content):
+        """Send a recorded message as is; returns (command, seconds)"""
+        channel = self._replay_channels.get(channel_id)
+        if channel is None:
+            guild = FakeGuild(guild_id) if guild_id is not None else None
+            channel = self._replay_channels[channel_id] = FakeChannel(self, channel_id, guild)
+        command = content.split(maxsplit=1)[0].lstrip("!").lower() if content.strip() else ""
+        return command, await self._dispatch(channel, FakeUser(user_id), content)
@@ -0,0 +1,285 @@
+"""Offline load test: drive the bot's ``on_message`` with synthetic traffic.
+
+    python bench/load.py --rate 50 --duration 30 --mix ai=4,move=3,dmove=2,help=1
+    python bench/load.py --rate 20 --latency 1.5 --error-rate 0.05 --record traffic.jsonl
+    python bench/load.py --replay traffic.jsonl --speed 2
+
+Starts the stub inference server on a free port, points the bot at it and
+runs the bot's background services without connecting to Discord, so no
+tokens are needed. Messages arrive as a Poisson process at ``--rate`` per
+second with commands drawn from ``--mix``, or are replayed from a JSON
+lines file of ``{"t", "channel", "user", "guild", "content"}`` records (as
+written by ``--record``). Replayed moves may be illegal if the AI answered
+differently. Reports p50/p99 latency per command, throughput and event
+loop lag; ``--json`` writes the same figures to a file.
+
+The databases go to a temporary directory and rate limits are off unless
+``--rate-limits`` is given. Other bot settings come from the environment
+as usual, e.g. CHESS_AI_TIME or INFERENCE_CONCURRENCY.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import stub_server
+from fake_discord import CHAT_KINDS, GAME_KINDS, FakeGateway
+
+
+DEFAULT_MIX = "ai=4,move=3,dmove=2,help=1"
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip().lstrip("!")
+        if kind not in CHAT_KINDS | GAME_KINDS:
+            raise argparse.ArgumentTypeError(f"unknown command {kind!r}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))]
+
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p99": percentile(values, 99),
+        "max": values[-1] if values else 0.0,
+    }
+
+
+class LagSampler:
+    """Records how late a ``interval``-second sleep wakes up"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+def configure_environment(args, stub_url, data_dir):
+    """Settings the bot reads at import time; explicit environment wins"""
+    defaults = {
+        "HF_API_URL": stub_url,
+        "HuggingFace": "bench",
+        "INFERENCE_BACKEND": "hosted",
+        "HF_KEEP_WARM_INTERVAL": "0",
+        "METRICS_PORT": "0",
+        "STATE_DB": os.path.join(data_dir, "state.db"),
+        "ACTIVITY_DB": os.path.join(data_dir, "activity.db"),
+        "CHESS_AI_TIME": "0.1",
+        "DRAUGHTS_AI_TIME": "0.1",
+    }
+    if not args.rate_limits:
+        for scope in ("USER", "CHANNEL", "GUILD"):
+            defaults[f"RATE_LIMIT_{scope}"] = "1000000"
+            defaults[f"RATE_LIMIT_{scope}_BURST"] = "1000000"
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+
+
+async def synthetic_schedule(args, gateway, deliver):
+    mix = args.mix
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    rng = random.Random(args.seed)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    next_at = started
+    while True:
+        next_at += rng.expovariate(args.rate)
+        if next_at - started >= args.duration:
+            break
+        await asyncio.sleep(max(0.0, next_at - loop.time()))
+        kind = rng.choices(kinds, weights)[0]
+        deliver(gateway.deliver(kind))
+
+
+async def replay_schedule(args, gateway, deliver):
+    with open(args.replay, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    for record in records:
+        await asyncio.sleep(max(0.0, started + record["t"] / args.speed - loop.time()))
+        deliver(gateway.deliver_raw(record["channel"], record["user"], record.get("guild"),
+                                    record["content"]))
+
+
+async def run(args):
+    server = stub_server.from_arguments(args, seed=args.seed)
+    port = await server.start("127.0.0.1", 0)
+    data_dir = tempfile.mkdtemp(prefix="chatbuddy-bench-")
+    configure_environment(args, f"http://127.0.0.1:{port}/models", data_dir)
+    os.chdir(data_dir)
+
+    import AI_tapsiriq as bot
+
+    await bot.start_services()
+    gateway = FakeGateway(bot, users=args.users, channels=args.channels, guilds=args.guilds,
+                          game_channels=args.games, rest_latency=args.rest_latency,
+                          repeat_ratio=args.repeat_ratio, seed=args.seed)
+    loop = asyncio.get_running_loop()
+    record_file = open(args.record, "w", encoding="utf-8") if args.record else None
+    if record_file is not None:
+        def record(message):
+            record_file.write(json.dumps({
+                "t": round(loop.time() - started, 4),
+                "channel": message.channel.id,
+                "user": message.author.id,
+                "guild": message.guild.id if message.guild else None,
+                "content": message.content,
+            }) + "\n")
+        gateway.on_deliver = record
+
+    latencies = {}
+    errors = {}
+    tasks = set()
+    issued = 0
+
+    async def measure(delivery):
+        try:
+            command, seconds = await delivery
+        except Exception as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            return
+        latencies.setdefault(command, []).append(seconds)
+
+    def deliver(delivery):
+        nonlocal issued
+        issued += 1
+        task = asyncio.create_task(measure(delivery))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    lag = LagSampler()
+    lag.start()
+    started = loop.time()
+    try:
+        if args.replay:
+            await replay_schedule(args, gateway, deliver)
+        else:
+            await synthetic_schedule(args, gateway, deliver)
+        offered = loop.time() - started
+        unfinished = 0
+        if tasks:
+            _, pending = await asyncio.wait(set(tasks), timeout=args.drain)
+            unfinished = len(pending)
+            for task in pending:
+                task.cancel()
+        elapsed = loop.time() - started
+    finally:
+        await lag.close()
+        await bot.stop_services()
+        await server.close()
+        if record_file is not None:
+            record_file.close()
+
+    completed = sum(len(values) for values in latencies.values())
+    return {
+        "commands": {command: summarize(values) for command, values in sorted(latencies.items())},
+        "all": summarize([value for values in latencies.values() for value in values]),
+        "completed": completed,
+        "errors": errors,
+        "unfinished": unfinished,
+        "elapsed": elapsed,
+        "throughput": completed / elapsed if elapsed else 0.0,
+        "offered_rate": issued / offered if offered else 0.0,
+        "loop_lag": summarize(lag.samples),
+        "stub_server": server.stats,
+        "discord": gateway.stats,
+    }
+
+
+def print_report(result):
+    print(f"{'command':<10} {'count':>7} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    rows = list(result["commands"].items()) + [("all", result["all"])]
+    for command, stats in rows:
+        print(f"{command:<10} {stats['count']:>7} {stats['p50'] * 1000:>9.1f} "
+              f"{stats['p99'] * 1000:>9.1f} {stats['max'] * 1000:>9.1f}")
+    print(f"throughput: {result['throughput']:.1f} msg/s ({result['completed']} in "
+          f"{result['elapsed']:.1f}s), offered {result['offered_rate']:.1f} msg/s")
+    lag = result["loop_lag"]
+    print(f"event loop lag: p50 {lag['p50'] * 1000:.1f} ms, p99 {lag['p99'] * 1000:.1f} ms, "
+          f"max {lag['max'] * 1000:.1f} ms")
+    if result["errors"]:
+        print(f"handler errors: {result['errors']}")
+    if result["unfinished"]:
+        print(f"unfinished after the drain timeout: {result['unfinished']}")
+    print(f"stub server: {result['stub_server']}")
+    print(f"discord: {result['discord']['sends']} sends, {result['discord']['edits']} edits")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for ChatBuddy")
+    parser.add_argument("--rate", type=float, default=20.0, help="messages per second")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of traffic")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"command weights (default {DEFAULT_MIX})")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--channels", type=int, default=50)
+    parser.add_argument("--guilds", type=int, default=5)
+    parser.add_argument("--games", type=int, default=50, help="game channels per game")
+    parser.add_argument("--repeat-ratio", type=float, default=0.5,
+                        help="share of questions drawn from a small fixed pool")
+    parser.add_argument("--rest-latency", type=float, default=0.05,
+                        help="simulated Discord REST latency per send or edit")
+    parser.add_argument("--rate-limits", action="store_true", help="keep the bot's rate limits")
+    parser.add_argument("--drain", type=float, default=60.0,
+                        help="seconds to wait for in-flight messages at the end")
+    parser.add_argument("--replay", help="JSON lines file of messages to replay")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed factor")
+    parser.add_argument("--record", help="write the delivered messages to this file")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--seed", type=int, default=1)
+    stub_server.add_arguments(parser)
+    args = parser.parse_args()
+    if args.record:
+        args.record = os.path.abspath(args.record)
+    if args.json:
+        args.json = os.path.abspath(args.json)
+    if args.replay:
+        args.replay = os.path.abspath(args.replay)
+
+    result = asyncio.run(run(args))
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
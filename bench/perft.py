@@ -0,0 +1,152 @@
+"""Perft micro-benchmarks for the chess and draughts move generators.
+
+    python bench/perft.py
+    python bench/perft.py --save perft-baseline.json
+    python bench/perft.py --compare perft-baseline.json --tolerance 0.25
+
+Every case counts the leaves of the legal move tree to a fixed depth and
+checks the count against published values, so a move generator bug fails
+the run. Speed is reported in nodes per second, best of ``--repeat`` runs.
+With ``--compare`` the run also fails if a case got more than
+``--tolerance`` slower than the saved baseline. ``--quick`` searches one
+ply less everywhere, for a fast pre-deploy check.
+"""
+import argparse
+import functools
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from chess_engine import START_FEN, Position, perft as chess_perft
+from draughts_search import apply_move, generate_moves, undo_move
+
+
+# Standard perft positions and their node counts by depth
+CHESS_CASES = [
+    ("start", START_FEN, [20, 400, 8902, 197281]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862]),
+    ("endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238]),
+    ("promotions", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467]),
+    ("checks", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [44, 1486, 62379]),
+]
+
+# Whole-turn moves from the bot's starting board (English draughts counts)
+DRAUGHTS_START = (" b b b b" "b b b b " " b b b b" "        "
+                  "        " "w w w w " " w w w w" "w w w w ")
+DRAUGHTS_CASES = [
+    ("start", DRAUGHTS_START, 'w', [7, 49, 302, 1469, 7361, 36768, 179740]),
+]
+
+
+def draughts_perft(cells, side, depth):
+    moves = generate_moves(cells, side)
+    if depth == 1:
+        return len(moves)
+    other = 'b' if side == 'w' else 'w'
+    nodes = 0
+    for move in moves:
+        record, _ = apply_move(cells, move, 0)
+        nodes += draughts_perft(cells, other, depth - 1)
+        undo_move(cells, record)
+    return nodes
+
+
+def count_chess(fen, depth):
+    return chess_perft(Position.from_fen(fen), depth)
+
+
+def count_draughts(cells, side, depth):
+    return draughts_perft(list(cells), side, depth)
+
+
+def cases(quick):
+    """(name, depth, expected nodes, counting function) for every case"""
+    drop = 1 if quick else 0
+    for name, fen, counts in CHESS_CASES:
+        depth = len(counts) - drop
+        yield f"chess/{name}", depth, counts[depth - 1], functools.partial(count_chess, fen, depth)
+    for name, cells, side, counts in DRAUGHTS_CASES:
+        depth = len(counts) - drop
+        yield (f"draughts/{name}", depth, counts[depth - 1],
+               functools.partial(count_draughts, cells, side, depth))
+
+
+def run(quick=False, repeat=3):
+    results = {}
+    for name, depth, expected, count in cases(quick):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            nodes = count()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = {
+            "depth": depth,
+            "nodes": nodes,
+            "expected": expected,
+            "seconds": best,
+            "nps": nodes / max(best, 1e-9),
+        }
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Names of cases more than ``tolerance`` slower than the baseline"""
+    slower = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None or before["depth"] != result["depth"]:
+            continue
+        if result["nps"] < before["nps"] * (1 - tolerance):
+            slower.append(name)
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move generator perft benchmarks")
+    parser.add_argument("--quick", action="store_true", help="one ply less per case")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, best is kept")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file from an earlier --save")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown against the baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    results = run(args.quick, args.repeat)
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    failed = False
+    print(f"{'case':<22} {'depth':>5} {'nodes':>10} {'seconds':>8} {'nodes/s':>10}  vs baseline")
+    for name, result in results.items():
+        before = baseline.get(name)
+        change = ""
+        if before and before["depth"] == result["depth"]:
+            change = f"{result['nps'] / before['nps'] - 1:+.0%}"
+        mark = ""
+        if result["nodes"] != result["expected"]:
+            mark = f"  WRONG, expected {result['expected']}"
+            failed = True
+        print(f"{name:<22} {result['depth']:>5} {result['nodes']:>10} {result['seconds']:>8.3f} "
+              f"{result['nps']:>10.0f}  {change}{mark}")
+
+    slower = compare(results, baseline, args.tolerance)
+    if slower:
+        print(f"Slower than the baseline by more than {args.tolerance:.0%}: {', '.join(slower)}")
+        failed = True
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Stand-in for the Hugging Face inference API, for benchmarks and offline runs.
+
+    python bench/stub_server.py --port 8081 --latency 0.4 --jitter 0.2 --error-rate 0.02
+
+Point the bot at it with HF_API_URL=http://127.0.0.1:8081/models. Every
+model name is accepted. Single and batched ``inputs`` get the same response
+shapes as the real API, and ``"stream": true`` requests get a server-sent
+event stream, one event per word. Latency, streaming speed, "model loading"
+errors (503) and throttling (429) are tunable, and ``reject_batches`` makes
+it answer batched ``inputs`` with a 400 like endpoints that take one prompt.
+"""
+import argparse
+import asyncio
+import json
+import random
+
+from aiohttp import web
+
+
+WORDS = ("the answer depends on a few things so let us go through them one at a time "
+         "first consider what is being asked then look at the simplest case and build "
+         "from there until the whole picture is clear").split()
+
+
+class StubInferenceServer:
+    """Fake inference endpoint with configurable latency and failure rates"""
+
+    def __init__(self, latency=0.3, jitter=0.1, token_latency=0.02, words=40,
+                 error_rate=0.0, throttle_rate=0.0, seed=None, reject_batches=False):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_latency = token_latency
+        self.words = words
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.reject_batches = reject_batches
+        self.random = random.Random(seed)
+        self.stats = {"requests": 0, "prompts": 0, "batches": 0, "streams": 0,
+                      "errors": 0, "throttled": 0, "rejected": 0}
+        self._runner = None
+
+    def answer(self, prompt):
+        # Depends on the prompt so cached and fresh answers can be told apart
+        rng = random.Random(prompt)
+        return " ".join(rng.choice(WORDS) for _ in range(self.words))
+
+    def _delay(self):
+        return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    def _failure(self):
+        roll = self.random.random()
+        if roll < self.throttle_rate:
+            self.stats["throttled"] += 1
+            return web.json_response({"error": "Rate limit reached"}, status=429,
+                                     headers={"Retry-After": "1"})
+        if roll < self.throttle_rate + self.error_rate:
+            self.stats["errors"] += 1
+            return web.json_response(
+                {"error": "Model is currently loading", "estimated_time": 2.0}, status=503
+            )
+        return None
+
+    async def handle(self, request):
+        payload = await request.json()
+        inputs = payload.get("inputs", "")
+        self.stats["requests"] += 1
+        failure = self._failure()
+        if failure is not None:
+            return failure
+        if payload.get("stream"):
+            return await self._stream(request, inputs)
+
+        await asyncio.sleep(self._delay())
+        if isinstance(inputs, list) and self.reject_batches:
+            self.stats["rejected"] += 1
+            return web.json_response({"error": "inputs must be a string"}, status=400)
+        if isinstance(inputs, list):
+            self.stats["batches"] += 1
+            self.stats["prompts"] += len(inputs)
+            return web.json_response([[{"generated_text": self.answer(text)}] for text in inputs])
+        self.stats["prompts"] += 1
+        return web.json_response([{"generated_text": self.answer(inputs)}])
+
+    async def _stream(self, request, prompt):
+        self.stats["streams"] += 1
+        self.stats["prompts"] += 1
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        # Time to first token, then a steady token rate
+        await asyncio.sleep(self._delay())
+        try:
+            for word in self.answer(prompt).split():
+                event = {"token": {"text": word + " ", "special": False}}
+                await response.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                await asyncio.sleep(self.token_latency)
+            await response.write(b"data: [DONE]\n\n")
+            await response.write_eof()
+        except ConnectionResetError:
+            # The client stopped reading mid-stream
+            pass
+        return response
+
+    async def start(self, host="127.0.0.1", port=8081):
+        app = web.Application()
+        app.router.add_post("/models/{model:.+}", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        # Port 0 picks a free port; report the one actually bound
+        return self._runner.addresses[0][1]
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def add_arguments(parser):
+    parser.add_argument("--latency", type=float, default=0.3, help="mean seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.1, help="uniform +/- spread on the latency")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="seconds per streamed word")
+    parser.add_argument("--words", type=int, default=40, help="words per answer")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 503 responses")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of 429 responses")
+    parser.add_argument("--reject-batches", action="store_true", help="answer batched inputs with 400")
+
+
+def from_arguments(args, seed=None):
+    return StubInferenceServer(args.latency, args.jitter, args.token_latency, args.words,
+                               args.error_rate, args.throttle_rate, seed, args.reject_batches)
+
+
+async def serve(server, host, port):
+    port = await server.start(host, port)
+    print(f"Stub inference API on http://{host}:{port}/models")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+        print(json.dumps(server.stats))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Hugging Face inference server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(from_arguments(args), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
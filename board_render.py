@@ -0,0 +1,51 @@
+class RenderCache:
+    """Per-game rendered rows; only rows touched by a move are rebuilt"""
+
+    __slots__ = ("rows", "dirty", "text")
+
+    def __init__(self):
+        self.rows = [""] * 8
+        self.dirty = set(range(8))
+        self.text = None
+
+    def invalidate(self, rows):
+        self.dirty.update(rows)
+        self.text = None
+
+
+class BoardRenderer:
+    """Board text built from a table of pre-rendered rows.
+
+    Rows are looked up by ``(row index, row key)`` where the key is a compact
+    encoding of the row's cells. ``render_row`` fills a missing entry once,
+    ``preload`` seeds common rows up front, and the table is dropped
+    wholesale once it holds ``max_rows`` entries.
+    """
+
+    def __init__(self, header, footer, render_row, max_rows=50000):
+        self.header = header
+        self.footer = footer
+        self.render_row = render_row
+        self.max_rows = max_rows
+        self._table = {}
+
+    def preload(self, index, key):
+        self.row(index, key)
+
+    def row(self, index, key):
+        text = self._table.get((index, key))
+        if text is None:
+            if len(self._table) >= self.max_rows:
+                self._table.clear()
+            text = self._table[(index, key)] = self.render_row(index, key)
+        return text
+
+    def render(self, cache, row_key):
+        """Board text for a game, rebuilding only its dirty rows"""
+        if cache.text is None:
+            rows = cache.rows
+            for index in cache.dirty:
+                rows[index] = self.row(index, row_key(index))
+            cache.dirty.clear()
+            cache.text = self.header + "".join(rows) + self.footer
+        return cache.text
@@ -0,0 +1,466 @@
+"""0x88 chess position with a table-driven legal move generator.
+
+Squares are ``row * 16 + col`` with row 0 being rank 8, matching the row
+and column indices used by the Discord commands; any square with
+``sq & 0x88`` set is off the board. Pieces are small signed integers,
+positive for White and negative for Black, held in an ``array('b')``.
+"""
+from array import array
+import random
+import time
+
+
+EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(7)
+WHITE, BLACK = 1, -1
+
+# Move flags
+NORMAL, DOUBLE_PUSH, EN_PASSANT, CASTLE = range(4)
+
+# Castling rights bits
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+
+CODE_TO_PIECE = {
+    'wp': PAWN, 'wn': KNIGHT, 'wb': BISHOP, 'wr': ROOK, 'wq': QUEEN, 'wk': KING,
+    'bp': -PAWN, 'bn': -KNIGHT, 'bb': -BISHOP, 'br': -ROOK, 'bq': -QUEEN, 'bk': -KING
+}
+PIECE_TO_CODE = {piece: code for code, piece in CODE_TO_PIECE.items()}
+PIECE_TO_CODE[EMPTY] = ''
+
+FEN_TO_PIECE = {
+    'P': PAWN, 'N': KNIGHT, 'B': BISHOP, 'R': ROOK, 'Q': QUEEN, 'K': KING,
+    'p': -PAWN, 'n': -KNIGHT, 'b': -BISHOP, 'r': -ROOK, 'q': -QUEEN, 'k': -KING
+}
+PIECE_TO_FEN = {piece: char for char, piece in FEN_TO_PIECE.items()}
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+SQUARES = tuple(row * 16 + col for row in range(8) for col in range(8))
+
+KNIGHT_STEPS = (-33, -31, -18, -14, 14, 18, 31, 33)
+KING_STEPS = (-17, -16, -15, -1, 1, 15, 16, 17)
+DIAGONAL_STEPS = (-17, -15, 15, 17)
+STRAIGHT_STEPS = (-16, -1, 1, 16)
+
+
+def square(row, col):
+    return row * 16 + col
+
+
+def square_to_pos(sq):
+    return (sq >> 4, sq & 7)
+
+
+def _targets(steps):
+    return {sq: tuple(sq + s for s in steps if not (sq + s) & 0x88) for sq in SQUARES}
+
+
+def _rays(steps):
+    table = {}
+    for sq in SQUARES:
+        rays = []
+        for step in steps:
+            ray = []
+            to = sq + step
+            while not to & 0x88:
+                ray.append(to)
+                to += step
+            if ray:
+                rays.append(tuple(ray))
+        table[sq] = tuple(rays)
+    return table
+
+
+# Precomputed attack tables, indexed by square
+KNIGHT_TARGETS = _targets(KNIGHT_STEPS)
+KING_TARGETS = _targets(KING_STEPS)
+DIAGONAL_RAYS = _rays(DIAGONAL_STEPS)
+STRAIGHT_RAYS = _rays(STRAIGHT_STEPS)
+SLIDER_RAYS = {
+    BISHOP: DIAGONAL_RAYS,
+    ROOK: STRAIGHT_RAYS,
+    QUEEN: {sq: DIAGONAL_RAYS[sq] + STRAIGHT_RAYS[sq] for sq in SQUARES},
+}
+
+# Rights kept after a move touches a square (king or rook origins)
+CASTLE_MASK = array('b', [15] * 128)
+CASTLE_MASK[square(7, 4)] = 15 & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLE_MASK[square(7, 7)] = 15 & ~WHITE_KINGSIDE
+CASTLE_MASK[square(7, 0)] = 15 & ~WHITE_QUEENSIDE
+CASTLE_MASK[square(0, 4)] = 15 & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLE_MASK[square(0, 7)] = 15 & ~BLACK_KINGSIDE
+CASTLE_MASK[square(0, 0)] = 15 & ~BLACK_QUEENSIDE
+
+PROMOTIONS = (QUEEN, ROOK, BISHOP, KNIGHT)
+
+# Zobrist keys, fixed seed so hashes agree across worker processes
+_zobrist_random = random.Random(0x5EED)
+ZOBRIST_PIECES = [[_zobrist_random.getrandbits(64) for _ in range(128)] for _ in range(13)]
+ZOBRIST_CASTLING = [_zobrist_random.getrandbits(64) for _ in range(16)]
+ZOBRIST_EP = [_zobrist_random.getrandbits(64) for _ in range(8)]
+ZOBRIST_BLACK = _zobrist_random.getrandbits(64)
+
+
+def encode_move(frm, to, promotion=EMPTY, flag=NORMAL):
+    return frm | (to << 8) | (promotion << 16) | (flag << 20)
+
+
+def move_from(move):
+    return move & 0xFF
+
+
+def move_to(move):
+    return (move >> 8) & 0xFF
+
+
+def move_promotion(move):
+    return (move >> 16) & 0xF
+
+
+def move_flag(move):
+    return move >> 20
+
+
+class Position:
+    """Mutable chess position with make/unmake and legal move generation"""
+
+    __slots__ = ("board", "turn", "castling", "ep", "halfmove", "kings", "history", "hash")
+
+    def __init__(self):
+        self.board = array('b', [EMPTY] * 128)
+        self.turn = WHITE
+        self.castling = 0
+        self.ep = -1
+        self.halfmove = 0
+        self.kings = {WHITE: -1, BLACK: -1}
+        self.history = []
+        self.hash = 0
+
+    @classmethod
+    def from_fen(cls, fen=START_FEN):
+        position = cls()
+        fields = fen.split()
+        for row, rank in enumerate(fields[0].split('/')):
+            col = 0
+            for char in rank:
+                if char.isdigit():
+                    col += int(char)
+                else:
+                    position.put(square(row, col), FEN_TO_PIECE[char])
+                    col += 1
+        position.turn = WHITE if len(fields) < 2 or fields[1] == 'w' else BLACK
+        rights = fields[2] if len(fields) > 2 else '-'
+        for char, bit in (('K', WHITE_KINGSIDE), ('Q', WHITE_QUEENSIDE),
+                          ('k', BLACK_KINGSIDE), ('q', BLACK_QUEENSIDE)):
+            if char in rights:
+                position.castling |= bit
+        if len(fields) > 3 and fields[3] != '-':
+            position.ep = square(8 - int(fields[3][1]), ord(fields[3][0]) - ord('a'))
+        if len(fields) > 4:
+            position.halfmove = int(fields[4])
+        position.hash = position.compute_hash()
+        return position
+
+    @classmethod
+    def from_rows(cls, rows, turn='w'):
+        """Build a position from the 8x8 list of piece codes used by the bot"""
+        position = cls()
+        for row in range(8):
+            for col in range(8):
+                if rows[row][col]:
+                    position.put(square(row, col), CODE_TO_PIECE[rows[row][col]])
+        position.turn = WHITE if turn == 'w' else BLACK
+        board = position.board
+        for bit, king_sq, rook_sq, piece in (
+                (WHITE_KINGSIDE, 0x74, 0x77, WHITE), (WHITE_QUEENSIDE, 0x74, 0x70, WHITE),
+                (BLACK_KINGSIDE, 0x04, 0x07, BLACK), (BLACK_QUEENSIDE, 0x04, 0x00, BLACK)):
+            if board[king_sq] == piece * KING and board[rook_sq] == piece * ROOK:
+                position.castling |= bit
+        position.hash = position.compute_hash()
+        return position
+
+    def put(self, sq, piece):
+        self.board[sq] = piece
+        if piece == KING or piece == -KING:
+            self.kings[WHITE if piece > 0 else BLACK] = sq
+
+    def compute_hash(self):
+        """Zobrist hash from scratch; make/unmake keep ``hash`` up to date"""
+        h = 0
+        for sq in SQUARES:
+            if self.board[sq]:
+                h ^= ZOBRIST_PIECES[self.board[sq] + 6][sq]
+        h ^= ZOBRIST_CASTLING[self.castling]
+        if self.ep >= 0:
+            h ^= ZOBRIST_EP[self.ep & 7]
+        if self.turn == BLACK:
+            h ^= ZOBRIST_BLACK
+        return h
+
+    def fen(self):
+        ranks = []
+        for row in range(8):
+            rank, empty = "", 0
+            for col in range(8):
+                piece = self.board[square(row, col)]
+                if piece:
+                    if empty:
+                        rank += str(empty)
+                        empty = 0
+                    rank += PIECE_TO_FEN[piece]
+                else:
+                    empty += 1
+            ranks.append(rank + (str(empty) if empty else ""))
+        rights = "".join(char for char, bit in (('K', 1), ('Q', 2), ('k', 4), ('q', 8))
+                         if self.castling & bit) or '-'
+        ep = '-' if self.ep < 0 else f"{chr(ord('a') + (self.ep & 7))}{8 - (self.ep >> 4)}"
+        return f"{'/'.join(ranks)} {'w' if self.turn == WHITE else 'b'} {rights} {ep} {self.halfmove} 1"
+
+    def to_rows(self):
+        board = self.board
+        return [[PIECE_TO_CODE[board[row * 16 + col]] for col in range(8)] for row in range(8)]
+
+    def is_attacked(self, sq, by):
+        """True if side ``by`` attacks ``sq``"""
+        board = self.board
+        # Pawns attack towards the opponent, so look one row behind ``sq``
+        pawn_row = 16 if by == WHITE else -16
+        for s in (sq + pawn_row - 1, sq + pawn_row + 1):
+            if not s & 0x88 and board[s] == by * PAWN:
+                return True
+        knight = by * KNIGHT
+        for s in KNIGHT_TARGETS[sq]:
+            if board[s] == knight:
+                return True
+        king = by * KING
+        for s in KING_TARGETS[sq]:
+            if board[s] == king:
+                return True
+        bishop, rook, queen = by * BISHOP, by * ROOK, by * QUEEN
+        for ray in DIAGONAL_RAYS[sq]:
+            for s in ray:
+                piece = board[s]
+                if piece:
+                    if piece == bishop or piece == queen:
+                        return True
+                    break
+        for ray in STRAIGHT_RAYS[sq]:
+            for s in ray:
+                piece = board[s]
+                if piece:
+                    if piece == rook or piece == queen:
+                        return True
+                    break
+        return False
+
+    def in_check(self, side=None):
+        side = self.turn if side is None else side
+        return self.is_attacked(self.kings[side], -side)
+
+    def pseudo_legal_moves(self):
+        """All moves ignoring whether they leave the mover's king in check"""
+        board = self.board
+        us = self.turn
+        moves = []
+        append = moves.append
+        forward = -16 if us == WHITE else 16
+        start_row = 6 if us == WHITE else 1
+        promotion_row = 0 if us == WHITE else 7
+
+        for frm in SQUARES:
+            piece = board[frm]
+            if piece * us <= 0:
+                continue
+            kind = piece if piece > 0 else -piece
+
+            if kind == PAWN:
+                to = frm + forward
+                if not board[to]:
+                    if to >> 4 == promotion_row:
+                        for promotion in PROMOTIONS:
+                            append(frm | (to << 8) | (promotion << 16))
+                    else:
+                        append(frm | (to << 8))
+                        if frm >> 4 == start_row and not board[to + forward]:
+                            append(frm | ((to + forward) << 8) | (DOUBLE_PUSH << 20))
+                for to in (frm + forward - 1, frm + forward + 1):
+                    if to & 0x88:
+                        continue
+                    if board[to] * us < 0:
+                        if to >> 4 == promotion_row:
+                            for promotion in PROMOTIONS:
+                                append(frm | (to << 8) | (promotion << 16))
+                        else:
+                            append(frm | (to << 8))
+                    elif to == self.ep:
+                        append(frm | (to << 8) | (EN_PASSANT << 20))
+
+            elif kind == KNIGHT or kind == KING:
+                for to in (KNIGHT_TARGETS if kind == KNIGHT else KING_TARGETS)[frm]:
+                    if board[to] * us <= 0:
+                        append(frm | (to << 8))
+                if kind == KING:
+                    self._castling_moves(frm, append)
+
+            else:
+                for ray in SLIDER_RAYS[kind][frm]:
+                    for to in ray:
+                        target = board[to]
+                        if not target:
+                            append(frm | (to << 8))
+                            continue
+                        if target * us < 0:
+                            append(frm | (to << 8))
+                        break
+        return moves
+
+    def _castling_moves(self, frm, append):
+        us = self.turn
+        if us == WHITE:
+            kingside, queenside, home = WHITE_KINGSIDE, WHITE_QUEENSIDE, 0x74
+        else:
+            kingside, queenside, home = BLACK_KINGSIDE, BLACK_QUEENSIDE, 0x04
+        if frm != home or not self.castling & (kingside | queenside):
+            return
+        board = self.board
+        if self.is_attacked(frm, -us):
+            return
+        if (self.castling & kingside and not board[frm + 1] and not board[frm + 2]
+                and not self.is_attacked(frm + 1, -us)):
+            append(frm | ((frm + 2) << 8) | (CASTLE << 20))
+        if (self.castling & queenside and not board[frm - 1] and not board[frm - 2]
+                and not board[frm - 3] and not self.is_attacked(frm - 1, -us)):
+            append(frm | ((frm - 2) << 8) | (CASTLE << 20))
+
+    def make(self, move):
+        board = self.board
+        frm = move & 0xFF
+        to = (move >> 8) & 0xFF
+        promotion = (move >> 16) & 0xF
+        flag = move >> 20
+        piece = board[frm]
+        captured = board[to]
+        us = self.turn
+        h = self.hash
+
+        self.history.append((move, captured, self.castling, self.ep, self.halfmove, h))
+        self.halfmove = 0 if captured or piece == us * PAWN else self.halfmove + 1
+
+        placed = us * promotion if promotion else piece
+        h ^= ZOBRIST_PIECES[piece + 6][frm] ^ ZOBRIST_PIECES[placed + 6][to]
+        if captured:
+            h ^= ZOBRIST_PIECES[captured + 6][to]
+        board[to] = placed
+        board[frm] = EMPTY
+        if flag == EN_PASSANT:
+            taken = to - (-16 if us == WHITE else 16)
+            board[taken] = EMPTY
+            h ^= ZOBRIST_PIECES[-us * PAWN + 6][taken]
+        elif flag == CASTLE:
+            rook_from, rook_to = (frm + 3, frm + 1) if to > frm else (frm - 4, frm - 1)
+            rook = board[rook_from]
+            board[rook_to], board[rook_from] = rook, EMPTY
+            h ^= ZOBRIST_PIECES[rook + 6][rook_from] ^ ZOBRIST_PIECES[rook + 6][rook_to]
+        if piece == us * KING:
+            self.kings[us] = to
+
+        castling = self.castling & CASTLE_MASK[frm] & CASTLE_MASK[to]
+        h ^= ZOBRIST_CASTLING[self.castling] ^ ZOBRIST_CASTLING[castling]
+        self.castling = castling
+        if self.ep >= 0:
+            h ^= ZOBRIST_EP[self.ep & 7]
+        if flag == DOUBLE_PUSH:
+            self.ep = (frm + to) >> 1
+            h ^= ZOBRIST_EP[self.ep & 7]
+        else:
+            self.ep = -1
+        self.turn = -us
+        self.hash = h ^ ZOBRIST_BLACK
+
+    def unmake(self):
+        move, captured, castling, ep, halfmove, h = self.history.pop()
+        board = self.board
+        frm = move & 0xFF
+        to = (move >> 8) & 0xFF
+        flag = move >> 20
+        us = -self.turn
+        piece = board[to]
+        if (move >> 16) & 0xF:
+            piece = us * PAWN
+
+        board[frm] = piece
+        board[to] = captured
+        if flag == EN_PASSANT:
+            board[to - (-16 if us == WHITE else 16)] = -us * PAWN
+        elif flag == CASTLE:
+            if to > frm:
+                board[frm + 3], board[frm + 1] = board[frm + 1], EMPTY
+            else:
+                board[frm - 4], board[frm - 1] = board[frm - 1], EMPTY
+        if piece == us * KING:
+            self.kings[us] = frm
+
+        self.castling = castling
+        self.ep = ep
+        self.halfmove = halfmove
+        self.turn = us
+        self.hash = h
+
+    def legal_moves(self):
+        us = self.turn
+        kings = self.kings
+        moves = []
+        for move in self.pseudo_legal_moves():
+            self.make(move)
+            if not self.is_attacked(kings[us], -us):
+                moves.append(move)
+            self.unmake()
+        return moves
+
+    def find_move(self, frm, to, promotion=QUEEN, legal=True):
+        """Return the move from ``frm`` to ``to`` or None; pawns promote to ``promotion``"""
+        moves = self.legal_moves() if legal else self.pseudo_legal_moves()
+        for move in moves:
+            if move & 0xFF == frm and (move >> 8) & 0xFF == to:
+                if (move >> 16) & 0xF in (EMPTY, promotion):
+                    return move
+        return None
+
+    def changed_squares(self, move):
+        """Squares whose contents a move changes"""
+        frm = move & 0xFF
+        to = (move >> 8) & 0xFF
+        flag = move >> 20
+        squares = [frm, to]
+        if flag == EN_PASSANT:
+            squares.append((frm & 0x70) | (to & 7))
+        elif flag == CASTLE:
+            squares.extend((frm + 1, frm + 3) if to > frm else (frm - 1, frm - 4))
+        return squares
+
+
+def perft(position, depth):
+    """Count leaf nodes of the legal move tree; the standard move generator check"""
+    if depth == 0:
+        return 1
+    moves = position.legal_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        position.make(move)
+        nodes += perft(position, depth - 1)
+        position.unmake()
+    return nodes
+
+
+if __name__ == "__main__":
+    import sys
+
+    max_depth = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    fen = " ".join(sys.argv[2:]) or START_FEN
+    position = Position.from_fen(fen)
+    for depth in range(1, max_depth + 1):
+        started = time.perf_counter()
+        nodes = perft(position, depth)
+        elapsed = time.perf_counter() - started
+        print(f"perft({depth}) = {nodes:>10}  {elapsed:8.3f}s  {nodes / max(elapsed, 1e-9):>10.0f} nodes/s")
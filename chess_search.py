@@ -0,0 +1,334 @@
+"""Iterative-deepening alpha-beta search for the chess AI.
+
+Runs inside worker processes (see ``workers.py``); ``search_best_move`` is
+the picklable entry point. The transposition table is module level, so a
+worker keeps what it learned between the moves it is asked to search.
+"""
+import os
+import time
+
+from chess_engine import (
+    BISHOP, KING, KNIGHT, PAWN, QUEEN, ROOK, SQUARES, WHITE, Position
+)
+
+
+MATE = 100000
+MATE_BOUND = MATE - 1000
+INFINITY = MATE + 1
+
+EXACT, LOWER, UPPER = range(3)
+
+PIECE_VALUES = {PAWN: 100, KNIGHT: 320, BISHOP: 330, ROOK: 500, QUEEN: 900, KING: 20000}
+
+# Piece-square tables from White's point of view, row 0 is rank 8
+_PST_ROWS = {
+    PAWN: (
+        (0, 0, 0, 0, 0, 0, 0, 0),
+        (50, 50, 50, 50, 50, 50, 50, 50),
+        (10, 10, 20, 30, 30, 20, 10, 10),
+        (5, 5, 10, 25, 25, 10, 5, 5),
+        (0, 0, 0, 20, 20, 0, 0, 0),
+        (5, -5, -10, 0, 0, -10, -5, 5),
+        (5, 10, 10, -20, -20, 10, 10, 5),
+        (0, 0, 0, 0, 0, 0, 0, 0),
+    ),
+    KNIGHT: (
+        (-50, -40, -30, -30, -30, -30, -40, -50),
+        (-40, -20, 0, 0, 0, 0, -20, -40),
+        (-30, 0, 10, 15, 15, 10, 0, -30),
+        (-30, 5, 15, 20, 20, 15, 5, -30),
+        (-30, 0, 15, 20, 20, 15, 0, -30),
+        (-30, 5, 10, 15, 15, 10, 5, -30),
+        (-40, -20, 0, 5, 5, 0, -20, -40),
+        (-50, -40, -30, -30, -30, -30, -40, -50),
+    ),
+    BISHOP: (
+        (-20, -10, -10, -10, -10, -10, -10, -20),
+        (-10, 0, 0, 0, 0, 0, 0, -10),
+        (-10, 0, 5, 10, 10, 5, 0, -10),
+        (-10, 5, 5, 10, 10, 5, 5, -10),
+        (-10, 0, 10, 10, 10, 10, 0, -10),
+        (-10, 10, 10, 10, 10, 10, 10, -10),
+        (-10, 5, 0, 0, 0, 0, 5, -10),
+        (-20, -10, -10, -10, -10, -10, -10, -20),
+    ),
+    ROOK: (
+        (0, 0, 0, 0, 0, 0, 0, 0),
+        (5, 10, 10, 10, 10, 10, 10, 5),
+        (-5, 0, 0, 0, 0, 0, 0, -5),
+        (-5, 0, 0, 0, 0, 0, 0, -5),
+        (-5, 0, 0, 0, 0, 0, 0, -5),
+        (-5, 0, 0, 0, 0, 0, 0, -5),
+        (-5, 0, 0, 0, 0, 0, 0, -5),
+        (0, 0, 0, 5, 5, 0, 0, 0),
+    ),
+    QUEEN: (
+        (-20, -10, -10, -5, -5, -10, -10, -20),
+        (-10, 0, 0, 0, 0, 0, 0, -10),
+        (-10, 0, 5, 5, 5, 5, 0, -10),
+        (-5, 0, 5, 5, 5, 5, 0, -5),
+        (0, 0, 5, 5, 5, 5, 0, -5),
+        (-10, 5, 5, 5, 5, 5, 0, -10),
+        (-10, 0, 5, 0, 0, 0, 0, -10),
+        (-20, -10, -10, -5, -5, -10, -10, -20),
+    ),
+    KING: (
+        (-30, -40, -40, -50, -50, -40, -40, -30),
+        (-30, -40, -40, -50, -50, -40, -40, -30),
+        (-30, -40, -40, -50, -50, -40, -40, -30),
+        (-30, -40, -40, -50, -50, -40, -40, -30),
+        (-20, -30, -30, -40, -40, -30, -30, -20),
+        (-10, -20, -20, -20, -20, -20, -20, -10),
+        (20, 20, 0, 0, 0, 0, 20, 20),
+        (20, 30, 10, 0, 0, 10, 30, 20),
+    ),
+}
+
+
+def _build_pst():
+    # PST[piece + 6][sq]: material plus placement, signed for White's view
+    table = [[0] * 128 for _ in range(13)]
+    for kind, rows in _PST_ROWS.items():
+        for sq in SQUARES:
+            row, col = sq >> 4, sq & 7
+            table[kind + 6][sq] = PIECE_VALUES[kind] + rows[row][col]
+            table[-kind + 6][sq] = -(PIECE_VALUES[kind] + rows[7 - row][col])
+    return table
+
+
+PST = _build_pst()
+
+
+def evaluate(position):
+    """Static score in centipawns from the side to move's point of view"""
+    board = position.board
+    score = 0
+    for sq in SQUARES:
+        piece = board[sq]
+        if piece:
+            score += PST[piece + 6][sq]
+    return score if position.turn == WHITE else -score
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class TranspositionTable:
+    """Fixed-size, hash-indexed table; deeper results replace shallower ones"""
+
+    def __init__(self, size=1 << 18):
+        self.size = size
+        self.slots = [None] * size
+
+    def get(self, key):
+        entry = self.slots[key % self.size]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def put(self, key, depth, score, flag, move):
+        index = key % self.size
+        entry = self.slots[index]
+        if entry is None or entry[0] != key or depth >= entry[1]:
+            self.slots[index] = (key, depth, score, flag, move)
+
+    def clear(self):
+        self.slots = [None] * self.size
+
+
+_table = TranspositionTable(int(os.getenv('CHESS_TT_SIZE', str(1 << 18))))
+
+
+class Searcher:
+    def __init__(self, position, table, deadline, seen=()):
+        self.position = position
+        self.table = table
+        self.deadline = deadline
+        self.nodes = 0
+        self.killers = {}
+        self.root_history = len(position.history)
+        # Hashes of the game's earlier positions, which a FEN does not carry
+        self.seen = frozenset(seen)
+
+    def _check_time(self):
+        self.nodes += 1
+        if self.nodes & 1023 == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+    def _order(self, moves, tt_move, ply):
+        board = self.position.board
+        killers = self.killers.get(ply, ())
+
+        def score(move):
+            if move == tt_move:
+                return 1000000
+            victim = board[(move >> 8) & 0xFF]
+            if victim:
+                attacker = board[move & 0xFF]
+                return 100000 + 10 * PIECE_VALUES[abs(victim)] - PIECE_VALUES[abs(attacker)] // 100
+            if (move >> 16) & 0xF:
+                return 90000
+            if move in killers:
+                return 50000
+            return 0
+
+        moves.sort(key=score, reverse=True)
+        return moves
+
+    def _is_repetition(self):
+        position = self.position
+        if position.hash in self.seen:
+            return True
+        history = position.history
+        for entry in history[max(0, len(history) - position.halfmove):]:
+            if entry[5] == position.hash:
+                return True
+        return False
+
+    def negamax(self, depth, alpha, beta, ply):
+        self._check_time()
+        position = self.position
+        if ply and (position.halfmove >= 100 or self._is_repetition()):
+            return 0
+
+        tt_move = None
+        entry = self.table.get(position.hash)
+        if entry is not None:
+            tt_move = entry[4]
+            if ply and entry[1] >= depth:
+                score = _score_from_table(entry[2], ply)
+                if entry[3] == EXACT:
+                    return score
+                if entry[3] == LOWER and score >= beta:
+                    return score
+                if entry[3] == UPPER and score <= alpha:
+                    return score
+
+        if depth <= 0:
+            return self.quiesce(alpha, beta, ply)
+
+        us = position.turn
+        kings = position.kings
+        alpha_start = alpha
+        best_score, best_move = -INFINITY, None
+        legal = 0
+        for move in self._order(position.pseudo_legal_moves(), tt_move, ply):
+            position.make(move)
+            if position.is_attacked(kings[us], -us):
+                position.unmake()
+                continue
+            legal += 1
+            score = -self.negamax(depth - 1, -beta, -alpha, ply + 1)
+            position.unmake()
+            if score > best_score:
+                best_score, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if not position.board[(move >> 8) & 0xFF]:
+                            killers = self.killers.setdefault(ply, [])
+                            if move not in killers:
+                                killers.insert(0, move)
+                                del killers[2:]
+                        break
+
+        if not legal:
+            return -MATE + ply if position.in_check() else 0
+
+        if best_score <= alpha_start:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table.put(position.hash, depth, _score_to_table(best_score, ply), flag, best_move)
+        return best_score
+
+    def quiesce(self, alpha, beta, ply):
+        self._check_time()
+        position = self.position
+        stand_pat = evaluate(position)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        board = position.board
+        us = position.turn
+        kings = position.kings
+        captures = [move for move in position.pseudo_legal_moves()
+                    if board[(move >> 8) & 0xFF] or (move >> 16) & 0xF]
+        for move in self._order(captures, None, ply):
+            position.make(move)
+            if position.is_attacked(kings[us], -us):
+                position.unmake()
+                continue
+            score = -self.quiesce(-beta, -alpha, ply + 1)
+            position.unmake()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+
+def _score_to_table(score, ply):
+    # Mate scores are stored relative to the node, not the root
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _score_from_table(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+def search(position, time_budget=1.0, max_depth=64, table=None, seen=()):
+    """Best move for the side to move within ``time_budget`` seconds, or None.
+
+    Returning to a position in ``seen`` scores as a draw by repetition.
+    """
+    started = time.perf_counter()
+    table = _table if table is None else table
+    searcher = Searcher(position, table, started + time_budget, seen)
+
+    moves = position.legal_moves()
+    if not moves:
+        return None
+    best_move = moves[0]
+    if len(moves) == 1:
+        return best_move
+
+    for depth in range(1, max_depth + 1):
+        try:
+            score = searcher.negamax(depth, -INFINITY, INFINITY, 0)
+        except SearchTimeout:
+            # Unwind the moves the interrupted iteration left on the board
+            while len(position.history) > searcher.root_history:
+                position.unmake()
+            break
+        entry = table.get(position.hash)
+        if entry is not None and entry[4] in moves:
+            best_move = entry[4]
+        if abs(score) > MATE_BOUND:
+            break
+        # The next iteration costs several times this one; do not start it late
+        if time.perf_counter() - started > time_budget / 2:
+            break
+    return best_move
+
+
+def search_best_move(fen, time_budget=1.0, seen=(), max_depth=64):
+    """Worker entry point: search a FEN position and return the encoded move.
+
+    ``seen`` holds the hashes of the game's positions since the last capture
+    or pawn move, so the search can see repetitions the FEN cannot show.
+    """
+    return search(Position.from_fen(fen), time_budget, max_depth, seen=seen)
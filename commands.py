@@ -0,0 +1,70 @@
+import time
+
+from metrics import REGISTRY
+
+
+COMMAND_SECONDS = REGISTRY.histogram(
+    "chatbuddy_command_seconds", "Time from dispatch to handler completion", ("command",)
+)
+COMMAND_ERRORS = REGISTRY.counter(
+    "chatbuddy_command_errors_total", "Handlers that raised", ("command",)
+)
+
+
+class CommandRouter:
+    """Table-driven command dispatch.
+
+    Handlers are registered per command name (the first token of a message,
+    prefix included) and called as ``handler(message, args)``. ``args`` is
+    the rest of the message, stripped, passed through the command's optional
+    ``parser``. Anything not starting with the prefix is rejected after one
+    check, and known commands are found with a single dict lookup. Every
+    dispatched command is timed into ``chatbuddy_command_seconds``.
+    """
+
+    def __init__(self, prefix="!"):
+        self.prefix = prefix
+        self._commands = {}
+
+    def command(self, name, parser=None):
+        """Decorator registering a handler coroutine for ``name``"""
+        def decorator(handler):
+            self._commands[name.lower()] = (handler, parser)
+            return handler
+        return decorator
+
+    def __contains__(self, name):
+        return name.lower() in self._commands
+
+    def _lookup(self, content):
+        if not content.startswith(self.prefix):
+            return None
+        parts = content.split(maxsplit=1)
+        name = parts[0].lower() if parts else None
+        entry = self._commands.get(name)
+        if entry is None:
+            return None
+        handler, parser = entry
+        raw = parts[1].strip() if len(parts) > 1 else ""
+        return name, handler, parser(raw) if parser else raw
+
+    def resolve(self, content):
+        """Return (handler, args) for a message, or None if it is not a command"""
+        found = self._lookup(content)
+        return found[1:] if found else None
+
+    async def dispatch(self, message):
+        """Run the handler for a message; returns False for non-commands"""
+        found = self._lookup(message.content)
+        if found is None:
+            return False
+        name, handler, args = found
+        start = time.perf_counter()
+        try:
+            await handler(message, args)
+        except Exception:
+            COMMAND_ERRORS.labels(name).inc()
+            raise
+        finally:
+            COMMAND_SECONDS.labels(name).observe(time.perf_counter() - start)
+        return True
@@ -0,0 +1,106 @@
+import json
+import re
+from collections import deque
+
+from prompts import count_tokens, truncate, truncate_start
+from session_store import GameSessionStore
+
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def first_sentence(text):
+    return SENTENCE_END.split(text.strip(), maxsplit=1)[0]
+
+
+class Conversation:
+    """Recent turns of one user in one channel plus a summary of older ones.
+
+    ``turns`` is a ring buffer of (question, answer) pairs. A turn pushed
+    out of it is folded into ``summary`` as its first sentences, and the
+    summary keeps only its newest ``summary_budget`` tokens, so a
+    conversation's size is bounded however long it runs.
+    """
+
+    __slots__ = ("turns", "summary")
+
+    def __init__(self, max_turns, turns=(), summary=""):
+        self.turns = deque(turns, maxlen=max_turns)
+        self.summary = summary
+
+    def add(self, question, answer, summary_budget):
+        if len(self.turns) == self.turns.maxlen:
+            old_question, old_answer = self.turns[0]
+            note = f"User asked: {first_sentence(old_question)} AI answered: {first_sentence(old_answer)}"
+            summary = f"{self.summary} {note}" if self.summary else note
+            self.summary = truncate_start(summary, summary_budget)
+        self.turns.append((question, answer))
+
+    def context(self, budget, turn_budget):
+        """History text within ``budget`` tokens, newest turns kept first"""
+        lines = []
+        used = 0
+        for question, answer in reversed(self.turns):
+            line = (f"User: {truncate(question, turn_budget)[0]}\n"
+                    f"AI: {truncate(answer, turn_budget)[0]}")
+            tokens = count_tokens(line)
+            if used + tokens > budget:
+                break
+            lines.append(line)
+            used += tokens
+        if self.summary and used + count_tokens(self.summary) + 4 <= budget:
+            lines.append(f"Earlier: {self.summary}")
+        return "\n".join(reversed(lines))
+
+
+class ConversationMemory:
+    """Per-channel, per-user conversation history for the chat commands.
+
+    Conversations live in a GameSessionStore, which bounds how many stay in
+    memory, evicts idle ones, spills them to the StateStore in batches and
+    reloads them lazily on the user's next message.
+    """
+
+    def __init__(self, store, max_turns=6, summary_budget=96, context_budget=320,
+                 max_conversations=2000, idle_timeout=1800, expire_after=7 * 86400):
+        self.max_turns = max_turns
+        self.summary_budget = summary_budget
+        self.context_budget = context_budget
+        self.sessions = GameSessionStore(
+            store, "conversation", self._serialize, self._deserialize,
+            max_sessions=max_conversations, idle_timeout=idle_timeout,
+            expire_after=expire_after
+        )
+
+    def _serialize(self, conversation):
+        return json.dumps({"turns": list(conversation.turns), "summary": conversation.summary})
+
+    def _deserialize(self, state):
+        data = json.loads(state)
+        return Conversation(self.max_turns, [tuple(turn) for turn in data["turns"]], data["summary"])
+
+    async def context(self, key):
+        """History to prepend to the user's next prompt ('' if none)"""
+        conversation = await self.sessions.get(key)
+        if conversation is None:
+            return ""
+        return conversation.context(self.context_budget, self.context_budget // 3)
+
+    async def record(self, key, question, answer):
+        conversation = await self.sessions.get(key)
+        if conversation is None:
+            conversation = Conversation(self.max_turns)
+            self.sessions.put(key, conversation)
+        else:
+            self.sessions.mark_dirty(key)
+        conversation.add(question, answer, self.summary_budget)
+
+    async def forget(self, key):
+        if await self.sessions.get(key) is not None:
+            self.sessions.put(key, Conversation(self.max_turns))
+
+    def start(self):
+        self.sessions.start()
+
+    async def close(self):
+        await self.sessions.close()
@@ -0,0 +1,123 @@
+"""Draughts move generation with incrementally maintained piece lists.
+
+Boards are flat 64-byte ``bytearray``s, row-major, holding the bot's cell
+codes (``' '``, ``'w'``, ``'W'``, ``'b'``, ``'B'``) as bytes; squares are
+still passed around as (row, col). ``DraughtsTracker`` keeps the squares of
+each side's pieces and the subset of those pieces that have a capture
+available. After a move only squares within two diagonal steps of the
+changed squares can gain or lose a capture, so ``update`` rechecks those
+few pieces instead of rescanning the board.
+"""
+
+EMPTY = ord(' ')
+WHITE_MAN, WHITE_KING, BLACK_MAN, BLACK_KING = (ord(code) for code in 'wWbB')
+
+DIAGONALS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+STEP_DIRECTIONS = {
+    WHITE_MAN: ((-1, -1), (-1, 1)),
+    BLACK_MAN: ((1, -1), (1, 1)),
+    WHITE_KING: DIAGONALS,
+    BLACK_KING: DIAGONALS,
+}
+
+# Squares whose capture availability can change when a square changes
+_NEIGHBOURHOOD = {
+    (row, col): tuple(
+        (row + dr * dist, col + dc * dist)
+        for dr, dc in DIAGONALS for dist in (1, 2)
+        if 0 <= row + dr * dist < 8 and 0 <= col + dc * dist < 8
+    ) + ((row, col),)
+    for row in range(8) for col in range(8)
+}
+
+
+def side_of(piece):
+    """'w' or 'b' for a piece byte; ORing 0x20 lowercases a king"""
+    return chr(piece | 0x20)
+
+
+def piece_jumps(cells, row, col):
+    """Landing squares of the single jumps available to the piece at (row, col)"""
+    piece = cells[row * 8 + col]
+    if piece == EMPTY:
+        return []
+    side = piece | 0x20
+    jumps = []
+    for dr, dc in STEP_DIRECTIONS[piece]:
+        new_row, new_col = row + 2 * dr, col + 2 * dc
+        if not (0 <= new_row < 8 and 0 <= new_col < 8):
+            continue
+        jumped = cells[(row + dr) * 8 + col + dc]
+        if cells[new_row * 8 + new_col] == EMPTY and jumped != EMPTY and jumped | 0x20 != side:
+            jumps.append((new_row, new_col))
+    return jumps
+
+
+def piece_steps(cells, row, col):
+    """Non-capturing single-step destinations of the piece at (row, col)"""
+    piece = cells[row * 8 + col]
+    if piece == EMPTY:
+        return []
+    steps = []
+    for dr, dc in STEP_DIRECTIONS[piece]:
+        new_row, new_col = row + dr, col + dc
+        if 0 <= new_row < 8 and 0 <= new_col < 8 and cells[new_row * 8 + new_col] == EMPTY:
+            steps.append((new_row, new_col))
+    return steps
+
+
+class DraughtsTracker:
+    """Piece lists and cached capture sets for both sides of a draughts board"""
+
+    __slots__ = ("cells", "pieces", "jumpers")
+
+    def __init__(self, cells):
+        self.cells = cells
+        self.pieces = {'w': set(), 'b': set()}
+        self.jumpers = {'w': set(), 'b': set()}
+        for sq in range(64):
+            if cells[sq] != EMPTY:
+                self._refresh(divmod(sq, 8))
+
+    def _refresh(self, pos):
+        row, col = pos
+        piece = self.cells[row * 8 + col]
+        for side in ('w', 'b'):
+            self.pieces[side].discard(pos)
+            self.jumpers[side].discard(pos)
+        if piece == EMPTY:
+            return
+        side = side_of(piece)
+        self.pieces[side].add(pos)
+        if piece_jumps(self.cells, row, col):
+            self.jumpers[side].add(pos)
+
+    def update(self, changed):
+        """Re-check the pieces near squares whose contents just changed"""
+        affected = set()
+        for pos in changed:
+            affected.update(_NEIGHBOURHOOD[pos])
+        for pos in affected:
+            self._refresh(pos)
+
+    def has_captures(self, side):
+        return bool(self.jumpers[side])
+
+    def moves(self, side, only_from=None):
+        """All legal single moves for a side, honouring mandatory capture"""
+        sources = [only_from] if only_from is not None else None
+        if self.jumpers[side]:
+            moves = []
+            for pos in sources or self.jumpers[side]:
+                for target in piece_jumps(self.cells, *pos):
+                    moves.append((pos, target))
+            return moves
+        if only_from is not None:
+            # A multi-jump continuation never falls back to a plain step
+            return []
+        moves = []
+        for pos in self.pieces[side]:
+            for target in piece_steps(self.cells, *pos):
+                moves.append((pos, target))
+        return moves
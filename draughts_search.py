@@ -0,0 +1,308 @@
+"""Alpha-beta search for the draughts AI.
+
+Positions are 64-character strings of the board cells (row-major, using
+the bot's ``' '``/``'w'``/``'W'``/``'b'``/``'B'`` codes) so they pickle
+cheaply into worker processes. A move is a whole turn: the path of squares
+a piece visits, with every hop of a multi-jump included. Rules follow
+``DraughtsGame.make``: captured pieces leave the board immediately and a
+man crowned mid-chain continues as a king.
+
+Small endgames are resolved with a memoized win/loss search whose results
+are kept for the life of the worker process.
+"""
+import os
+import random
+import time
+
+from chess_search import TranspositionTable
+
+
+MATE = 10000
+MATE_BOUND = MATE - 500
+INFINITY = MATE + 1
+
+EXACT, LOWER, UPPER = range(3)
+WIN, LOSS, UNKNOWN = 1, -1, 0
+
+DIRECTIONS = {
+    'w': ((-1, -1), (-1, 1)),
+    'b': ((1, -1), (1, 1)),
+    'W': ((-1, -1), (-1, 1), (1, -1), (1, 1)),
+    'B': ((-1, -1), (-1, 1), (1, -1), (1, 1)),
+}
+
+# Endgames with at most this many pieces are looked up in / added to the cache
+ENDGAME_PIECES = int(os.getenv('DRAUGHTS_ENDGAME_PIECES', '4'))
+ENDGAME_DEPTH = int(os.getenv('DRAUGHTS_ENDGAME_DEPTH', '16'))
+ENDGAME_CACHE_SIZE = int(os.getenv('DRAUGHTS_ENDGAME_CACHE', '500000'))
+
+_zobrist_random = random.Random(0xD7A6)
+ZOBRIST = {code: [_zobrist_random.getrandbits(64) for _ in range(64)] for code in 'wWbB'}
+ZOBRIST_BLACK = _zobrist_random.getrandbits(64)
+
+_table = TranspositionTable(int(os.getenv('DRAUGHTS_TT_SIZE', str(1 << 17))))
+_endgame_cache = {}
+
+
+def position_hash(cells, side):
+    h = ZOBRIST_BLACK if side == 'b' else 0
+    for sq, code in enumerate(cells):
+        if code != ' ':
+            h ^= ZOBRIST[code][sq]
+    return h
+
+
+def _capture_chains(cells, sq, piece, path, captured, out):
+    row, col = divmod(sq, 8)
+    side = piece.lower()
+    extended = False
+    for dr, dc in DIRECTIONS[piece]:
+        land_row, land_col = row + 2 * dr, col + 2 * dc
+        if not (0 <= land_row < 8 and 0 <= land_col < 8):
+            continue
+        over = (row + dr) * 8 + col + dc
+        land = land_row * 8 + land_col
+        if cells[land] != ' ' or cells[over] == ' ' or cells[over].lower() == side:
+            continue
+        extended = True
+        taken = cells[over]
+        crowned = piece
+        if piece == 'w' and land_row == 0:
+            crowned = 'W'
+        elif piece == 'b' and land_row == 7:
+            crowned = 'B'
+        cells[sq], cells[over], cells[land] = ' ', ' ', crowned
+        _capture_chains(cells, land, crowned, path + [land], captured + [over], out)
+        cells[sq], cells[over], cells[land] = piece, taken, ' '
+    if not extended and captured:
+        out.append((tuple(path), tuple(captured)))
+
+
+def generate_moves(cells, side, only_from=None):
+    """Whole-turn moves as (path, captured) pairs; captures are mandatory"""
+    sources = [only_from] if only_from is not None else [
+        sq for sq in range(64) if cells[sq] != ' ' and cells[sq].lower() == side
+    ]
+    captures = []
+    for sq in sources:
+        _capture_chains(cells, sq, cells[sq], [sq], [], captures)
+    if captures or only_from is not None:
+        return captures
+    steps = []
+    for sq in sources:
+        row, col = divmod(sq, 8)
+        for dr, dc in DIRECTIONS[cells[sq]]:
+            new_row, new_col = row + dr, col + dc
+            if 0 <= new_row < 8 and 0 <= new_col < 8 and cells[new_row * 8 + new_col] == ' ':
+                steps.append(((sq, new_row * 8 + new_col), ()))
+    return steps
+
+
+def apply_move(cells, move, h):
+    """Play a move in place; returns the undo record and the new hash"""
+    path, captured = move
+    start, end = path[0], path[-1]
+    piece = cells[start]
+    placed = piece
+    if piece == 'w' and end < 8:
+        placed = 'W'
+    elif piece == 'b' and end >= 56:
+        placed = 'B'
+    # A man crowned mid-chain is already a king when it lands
+    if placed == piece and piece in 'wb':
+        for sq in path[1:-1]:
+            if (piece == 'w' and sq < 8) or (piece == 'b' and sq >= 56):
+                placed = piece.upper()
+                break
+    taken = [cells[sq] for sq in captured]
+    h ^= ZOBRIST[piece][start] ^ ZOBRIST[placed][end] ^ ZOBRIST_BLACK
+    for sq, code in zip(captured, taken):
+        h ^= ZOBRIST[code][sq]
+        cells[sq] = ' '
+    cells[start] = ' '
+    cells[end] = placed
+    return (move, piece, taken), h
+
+
+def undo_move(cells, record):
+    (path, captured), piece, taken = record
+    cells[path[-1]] = ' '
+    cells[path[0]] = piece
+    for sq, code in zip(captured, taken):
+        cells[sq] = code
+
+
+def evaluate(cells, side):
+    """Material and advancement from ``side``'s point of view"""
+    score = 0
+    for sq, code in enumerate(cells):
+        if code == 'w':
+            score += 100 + (7 - sq // 8) * 3
+        elif code == 'b':
+            score -= 100 + (sq // 8) * 3
+        elif code == 'W':
+            score += 160
+        elif code == 'B':
+            score -= 160
+    return score if side == 'w' else -score
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class Searcher:
+    def __init__(self, cells, deadline, table):
+        self.cells = cells
+        self.deadline = deadline
+        self.table = table
+        self.nodes = 0
+
+    def _check_time(self):
+        self.nodes += 1
+        if self.nodes & 511 == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+    def solve_endgame(self, side, h, depth, path):
+        """Memoized win/loss search; UNKNOWN when not proven within ``depth``"""
+        self._check_time()
+        cached = _endgame_cache.get(h)
+        if cached is not None and (cached[0] != UNKNOWN or cached[1] >= depth):
+            return cached[0]
+        moves = generate_moves(self.cells, side)
+        if not moves:
+            result = LOSS
+        elif depth == 0 or h in path:
+            return UNKNOWN
+        else:
+            other = 'b' if side == 'w' else 'w'
+            path.add(h)
+            all_win = True
+            result = UNKNOWN
+            for move in moves:
+                record, child = apply_move(self.cells, move, h)
+                try:
+                    outcome = self.solve_endgame(other, child, depth - 1, path)
+                finally:
+                    undo_move(self.cells, record)
+                if outcome == LOSS:
+                    result = WIN
+                    break
+                if outcome != WIN:
+                    all_win = False
+            else:
+                if all_win:
+                    result = LOSS
+            path.discard(h)
+        if len(_endgame_cache) >= ENDGAME_CACHE_SIZE:
+            _endgame_cache.clear()
+        _endgame_cache[h] = (result, depth)
+        return result
+
+    def negamax(self, side, h, depth, alpha, beta, ply):
+        self._check_time()
+        cells = self.cells
+
+        if ply and sum(code != ' ' for code in cells) <= ENDGAME_PIECES:
+            outcome = self.solve_endgame(side, h, ENDGAME_DEPTH, set())
+            if outcome == WIN:
+                return MATE - ply
+            if outcome == LOSS:
+                return -MATE + ply
+
+        tt_move = None
+        entry = self.table.get(h)
+        if entry is not None:
+            tt_move = entry[4]
+            if ply and entry[1] >= depth:
+                if entry[3] == EXACT:
+                    return entry[2]
+                if entry[3] == LOWER and entry[2] >= beta:
+                    return entry[2]
+                if entry[3] == UPPER and entry[2] <= alpha:
+                    return entry[2]
+
+        moves = generate_moves(cells, side)
+        if not moves:
+            return -MATE + ply
+        if depth <= 0 and not moves[0][1]:
+            return evaluate(cells, side)
+
+        # Longer captures first, then the previous best move
+        moves.sort(key=lambda move: (move == tt_move, len(move[1])), reverse=True)
+        other = 'b' if side == 'w' else 'w'
+        alpha_start = alpha
+        best_score, best_move = -INFINITY, None
+        for move in moves:
+            record, child = apply_move(cells, move, h)
+            try:
+                # Captures are searched past the horizon so exchanges resolve
+                score = -self.negamax(other, child, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                undo_move(cells, record)
+            if score > best_score:
+                best_score, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if best_score <= alpha_start:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        if abs(best_score) < MATE_BOUND:
+            self.table.put(h, depth, best_score, flag, best_move)
+        return best_score
+
+
+def search(cells, side, time_budget=1.0, max_depth=32, only_from=None, table=None):
+    """Best whole-turn move for ``side`` as a (path, captured) pair, or None"""
+    started = time.perf_counter()
+    cells = list(cells)
+    table = _table if table is None else table
+    moves = generate_moves(cells, side, only_from)
+    if not moves:
+        return None
+    if len(moves) == 1:
+        return moves[0]
+
+    h = position_hash(cells, side)
+    searcher = Searcher(cells, started + time_budget, table)
+    other = 'b' if side == 'w' else 'w'
+    best_move = moves[0]
+    for depth in range(1, max_depth + 1):
+        try:
+            best_score, iteration_best = -INFINITY, None
+            alpha = -INFINITY
+            for move in moves:
+                record, child = apply_move(cells, move, h)
+                try:
+                    score = -searcher.negamax(other, child, depth - 1, -INFINITY, -alpha, 1)
+                finally:
+                    undo_move(cells, record)
+                if score > best_score:
+                    best_score, iteration_best = score, move
+                    alpha = max(alpha, score)
+        except SearchTimeout:
+            break
+        best_move = iteration_best
+        # Search the best move first in the next iteration
+        moves.remove(best_move)
+        moves.insert(0, best_move)
+        if abs(best_score) > MATE_BOUND:
+            break
+        if time.perf_counter() - started > time_budget / 2:
+            break
+    return best_move
+
+
+def search_best_path(cells, side, time_budget=1.0, only_from=None):
+    """Worker entry point: the (row, col) squares of the AI's whole turn"""
+    from_sq = only_from[0] * 8 + only_from[1] if only_from is not None else None
+    move = search(cells, side, time_budget, only_from=from_sq)
+    if move is None:
+        return None
+    return [divmod(sq, 8) for sq in move[0]]
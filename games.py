@@ -0,0 +1,387 @@
+"""Per-channel game state for the chess and draughts commands.
+
+ChessGame and DraughtsGame keep a game in a handful of slots: the board
+as a flat byte array (the engine's 0x88 ``array('b')`` for chess, a
+64-byte ``bytearray`` of cell codes for draughts), the selected piece,
+the game mode and a stack of the moves played. Moves are made and taken
+back in place, so ``undo`` is O(1) per move and the move list doubles as
+the game's history. The status line is formatted only when it is shown.
+"""
+import json
+
+from board_render import RenderCache
+from chess_engine import (
+    BISHOP, KNIGHT, PIECE_TO_CODE, QUEEN, ROOK, START_FEN, WHITE, Position, move_from,
+    move_promotion, move_to, square, square_to_pos
+)
+from draughts_engine import (
+    BLACK_KING, BLACK_MAN, EMPTY, WHITE_KING, WHITE_MAN, DraughtsTracker, piece_jumps,
+    piece_steps, side_of
+)
+
+
+# Starting draughts cells, row-major from row A
+DRAUGHTS_START = (" b b b b" "b b b b " " b b b b" "        "
+                  "        " "w w w w " " w w w w" "w w w w ")
+
+PROMOTION_LETTERS = {KNIGHT: 'n', BISHOP: 'b', ROOK: 'r', QUEEN: 'q'}
+
+
+def side_name(turn):
+    return 'White' if turn == 'w' else 'Black'
+
+
+def chess_square_name(sq):
+    row, col = square_to_pos(sq)
+    return f"{chr(ord('a') + col)}{8 - row}"
+
+
+def draughts_square_name(sq):
+    row, col = divmod(sq, 8)
+    return f"{chr(ord('A') + row)}{col + 1}"
+
+
+def number_moves(texts):
+    """'1. e2e4 e7e5 2. g1f3' from a list of alternating moves"""
+    parts = []
+    for index, text in enumerate(texts):
+        if index % 2 == 0:
+            parts.append(f"{index // 2 + 1}.")
+        parts.append(text)
+    return " ".join(parts)
+
+
+class ChessGame:
+    """A channel's chess game: engine position plus the moves that led to it"""
+
+    __slots__ = ("position", "start", "moves", "selected", "mode", "render_cache", "_status")
+
+    def __init__(self, fen=START_FEN, mode=None):
+        self.position = Position.from_fen(fen)
+        self.start = fen
+        self.moves = []
+        self.selected = None
+        self.mode = mode
+        self.render_cache = RenderCache()
+        self._status = None
+
+    @property
+    def turn(self):
+        return 'w' if self.position.turn == WHITE else 'b'
+
+    @property
+    def status(self):
+        if self._status is None:
+            self._status = self._position_status()
+        return self._status
+
+    @status.setter
+    def status(self, text):
+        self._status = text
+
+    def _position_status(self):
+        position = self.position
+        side = side_name(self.turn)
+        if not position.legal_moves():
+            if position.in_check():
+                return f"Checkmate! {'Black' if side == 'White' else 'White'} wins"
+            return "Stalemate! The game is a draw"
+        if position.in_check():
+            return f"{side}'s turn to play (check!)"
+        return f"{side}'s turn to play"
+
+    @property
+    def over(self):
+        return not self.position.legal_moves()
+
+    @property
+    def key(self):
+        """Identifies the position to move from, also across reloads of the game"""
+        return self.position.hash
+
+    def recent_hashes(self):
+        """Hashes of the earlier positions the game could still repeat"""
+        position = self.position
+        history = position.history
+        return tuple(entry[5] for entry in history[max(0, len(history) - position.halfmove):])
+
+    @property
+    def ai_to_move(self):
+        return self.mode == "ai" and self.turn != 'w' and not self.over
+
+    def piece_at(self, pos):
+        """Piece code such as 'wp' at (row, col), '' if empty"""
+        return PIECE_TO_CODE[self.position.board[square(*pos)]]
+
+    def validate(self, from_pos, to_pos):
+        """Check a move against the engine's legal move list"""
+        position = self.position
+        from_sq, to_sq = square(*from_pos), square(*to_pos)
+
+        # Check if source has a piece
+        piece = position.board[from_sq]
+        if not piece:
+            return False, "No piece at source position."
+
+        # Check if it's the right player's turn
+        if (piece > 0) != (position.turn == WHITE):
+            return False, f"It's {side_name(self.turn)}'s turn."
+
+        # Check if destination has friendly piece
+        dest_piece = position.board[to_sq]
+        if dest_piece and (dest_piece > 0) == (piece > 0):
+            return False, "Cannot capture your own piece."
+
+        if position.find_move(from_sq, to_sq) is not None:
+            return True, ""
+        if not position.legal_moves():
+            return False, "The game is over. Type `!reset chess` to play again."
+        if position.find_move(from_sq, to_sq, legal=False) is not None:
+            return False, "That move would leave your king in check."
+        return False, "Invalid move for this piece."
+
+    def make(self, from_pos, to_pos):
+        """Play a legal move; pawns reaching the last rank become queens"""
+        move = self.position.find_move(square(*from_pos), square(*to_pos))
+        if move is None:
+            raise ValueError(f"Illegal chess move {from_pos} -> {to_pos}")
+        self.make_move(move)
+
+    def make_move(self, move):
+        """Play an encoded engine move, promotion piece included"""
+        position = self.position
+        if move not in position.legal_moves():
+            raise ValueError(f"Illegal chess move {move}")
+        self.render_cache.invalidate(sq >> 4 for sq in position.changed_squares(move))
+        position.make(move)
+        self.moves.append(move)
+        self.selected = None
+        self._status = None
+
+    def undo(self):
+        """Take back the last move; False if there is none"""
+        if not self.moves:
+            return False
+        move = self.moves.pop()
+        self.position.unmake()
+        self.render_cache.invalidate(sq >> 4 for sq in self.position.changed_squares(move))
+        self.selected = None
+        self._status = None
+        return True
+
+    def history(self):
+        """The moves played, in coordinate notation"""
+        texts = []
+        for move in self.moves:
+            text = chess_square_name(move_from(move)) + chess_square_name(move_to(move))
+            texts.append(text + PROMOTION_LETTERS.get(move_promotion(move), ''))
+        return texts
+
+    def to_state(self):
+        return json.dumps({
+            'start': self.start,
+            'moves': self.moves,
+            'selected': self.selected,
+            'status': self._status,
+            'mode': self.mode
+        }, separators=(',', ':'))
+
+    @classmethod
+    def from_state(cls, state):
+        data = json.loads(state)
+        # Games saved before move lists were kept only have the current FEN
+        game = cls(data.get('start') or data['fen'], data['mode'])
+        for move in data.get('moves', ()):
+            game.position.make(move)
+            game.moves.append(move)
+        game.selected = tuple(data['selected']) if data['selected'] else None
+        game._status = data['status']
+        return game
+
+
+class DraughtsGame:
+    """A channel's draughts game; each hop of a jump chain is a separate move"""
+
+    __slots__ = ("cells", "tracker", "turn", "selected", "must_jump", "mode", "hops",
+                 "render_cache", "_status")
+
+    def __init__(self, cells=DRAUGHTS_START, turn='w', mode=None):
+        self.cells = bytearray(cells, 'ascii')
+        self.tracker = DraughtsTracker(self.cells)  # piece lists and pieces able to capture
+        self.turn = turn
+        self.selected = None
+        self.must_jump = False
+        self.mode = mode
+        # (from, to, piece, jumped square or -1, jumped piece, turn, selected, must_jump)
+        self.hops = []
+        self.render_cache = RenderCache()
+        self._status = None
+
+    @property
+    def status(self):
+        if self._status is None:
+            side = side_name(self.turn)
+            if self.must_jump:
+                self._status = f"{side} must continue jumping"
+            elif not self.tracker.moves(self.turn):
+                # A side left without moves has lost
+                self._status = f"{'Black' if side == 'White' else 'White'} wins!"
+            else:
+                self._status = f"{side}'s turn to play"
+        return self._status
+
+    @status.setter
+    def status(self, text):
+        self._status = text
+
+    @property
+    def over(self):
+        return not self.must_jump and not self.tracker.moves(self.turn)
+
+    @property
+    def key(self):
+        """Identifies the position to move from, also across reloads of the game"""
+        if self.must_jump:
+            # Mid-capture only the jumping piece may move on
+            return bytes(self.cells), self.turn, self.must_jump, self.selected
+        return bytes(self.cells), self.turn, self.must_jump
+
+    @property
+    def ai_to_move(self):
+        return self.mode == "ai" and self.turn != 'w' and not self.over
+
+    def piece_at(self, pos):
+        """Cell code at (row, col), ' ' if empty"""
+        return chr(self.cells[pos[0] * 8 + pos[1]])
+
+    def validate(self, from_pos, to_pos):
+        from_row, from_col = from_pos
+        to_row, to_col = to_pos
+
+        # Basic validation
+        piece = self.cells[from_row * 8 + from_col]
+        if piece == EMPTY:
+            return False, "No piece at source position."
+        if side_of(piece) != self.turn:
+            return False, f"It's {side_name(self.turn)}'s turn."
+        if self.cells[to_row * 8 + to_col] != EMPTY:
+            return False, "Destination square is not empty."
+        if self.must_jump and from_pos != self.selected:
+            return False, "You must continue jumping with the same piece."
+
+        # If there are jumps available, only allow jump moves
+        if self.tracker.has_captures(self.turn):
+            if to_pos in piece_jumps(self.cells, from_row, from_col):
+                return True, ""
+            return False, "Must make a jump move when available."
+
+        # Regular move validation
+        if to_pos in piece_steps(self.cells, from_row, from_col):
+            return True, ""
+
+        return False, "Invalid move for this piece."
+
+    def _changed(self, changed):
+        self.tracker.update(changed)
+        self.render_cache.invalidate(row for row, _ in changed)
+        self._status = None
+
+    def make_path(self, path):
+        """Play a whole turn given as the squares the piece visits"""
+        for from_pos, to_pos in zip(path, path[1:]):
+            self.make(from_pos, to_pos)
+
+    def make(self, from_pos, to_pos):
+        """Play one validated hop; the turn passes once no jump can follow"""
+        cells = self.cells
+        from_row, from_col = from_pos
+        to_row, to_col = to_pos
+        from_sq, to_sq = from_row * 8 + from_col, to_row * 8 + to_col
+        piece = cells[from_sq]
+        changed = [from_pos, to_pos]
+
+        # Handle jumps
+        jumped_sq, jumped = -1, EMPTY
+        if abs(to_row - from_row) == 2:
+            jumped_sq = (from_row + to_row) // 2 * 8 + (from_col + to_col) // 2
+            jumped = cells[jumped_sq]
+            cells[jumped_sq] = EMPTY
+            changed.append(divmod(jumped_sq, 8))
+        self.hops.append((from_sq, to_sq, piece, jumped_sq, jumped,
+                          self.turn, self.selected, self.must_jump))
+
+        # Move the piece, crowning men that reach the far row
+        cells[from_sq] = EMPTY
+        if piece == WHITE_MAN and to_row == 0:
+            cells[to_sq] = WHITE_KING
+        elif piece == BLACK_MAN and to_row == 7:
+            cells[to_sq] = BLACK_KING
+        else:
+            cells[to_sq] = piece
+        self._changed(changed)
+
+        # Check for additional jumps
+        if jumped_sq >= 0 and piece_jumps(cells, to_row, to_col):
+            self.selected = to_pos
+            self.must_jump = True
+        else:
+            self.turn = 'b' if self.turn == 'w' else 'w'
+            self.selected = None
+            self.must_jump = False
+
+    def _undo_hop(self):
+        from_sq, to_sq, piece, jumped_sq, jumped, turn, selected, must_jump = self.hops.pop()
+        cells = self.cells
+        cells[to_sq] = EMPTY
+        cells[from_sq] = piece
+        changed = [divmod(from_sq, 8), divmod(to_sq, 8)]
+        if jumped_sq >= 0:
+            cells[jumped_sq] = jumped
+            changed.append(divmod(jumped_sq, 8))
+        self.turn, self.selected, self.must_jump = turn, selected, must_jump
+        self._changed(changed)
+
+    def undo(self):
+        """Take back the last turn, every hop of a jump chain included"""
+        if not self.hops:
+            return False
+        mover = self.hops[-1][5]
+        while self.hops and self.hops[-1][5] == mover:
+            self._undo_hop()
+        return True
+
+    def history(self):
+        """Each turn as its squares, joined by '-' for a step and 'x' for jumps"""
+        texts = []
+        mover = None
+        for from_sq, to_sq, _, jumped_sq, _, turn, _, _ in self.hops:
+            link = 'x' if jumped_sq >= 0 else '-'
+            if turn == mover:
+                texts[-1] += link + draughts_square_name(to_sq)
+            else:
+                texts.append(draughts_square_name(from_sq) + link + draughts_square_name(to_sq))
+            mover = turn
+        return texts
+
+    def to_state(self):
+        return json.dumps({
+            'cells': self.cells.decode('ascii'),
+            'turn': self.turn,
+            'selected': self.selected,
+            'must_jump': self.must_jump,
+            'status': self._status,
+            'mode': self.mode,
+            'hops': self.hops
+        }, separators=(',', ':'))
+
+    @classmethod
+    def from_state(cls, state):
+        data = json.loads(state)
+        game = cls(data['cells'], data['turn'], data['mode'])
+        game.selected = tuple(data['selected']) if data['selected'] else None
+        game.must_jump = data['must_jump']
+        game._status = data['status']
+        for hop in data.get('hops', ()):
+            selected = tuple(hop[6]) if hop[6] else None
+            game.hops.append(tuple(hop[:6]) + (selected, hop[7]))
+        return game
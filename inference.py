@@ -0,0 +1,274 @@
+import asyncio
+import json
+import time
+from collections import namedtuple
+
+import aiohttp
+
+from metrics import REGISTRY
+
+
+API_URL = "https://api-inference.huggingface.co/models"
+
+# Where an inference call spends its time. "queue": waiting in the
+# dispatcher for coalescing and batching; "connect": opening a new upstream
+# connection (0 when a pooled one is reused); "worker_wait": waiting for a
+# local inference thread; "generate": the upstream or local model producing
+# the answer.
+INFERENCE_SECONDS = REGISTRY.histogram(
+    "chatbuddy_inference_seconds", "Inference time by stage", ("model", "stage")
+)
+INFERENCE_RESPONSES = REGISTRY.counter(
+    "chatbuddy_inference_responses_total", "Inference responses by status", ("model", "status")
+)
+
+# Status code, decoded body and response headers of one upstream call
+InferenceResponse = namedtuple("InferenceResponse", ["status", "data", "headers"])
+
+
+class InferenceError(Exception):
+    """Raised when the inference endpoint cannot be reached"""
+
+
+class StreamingUnsupported(InferenceError):
+    """The endpoint answered a streaming request without an event stream"""
+
+    def __init__(self, status):
+        super().__init__(f"no event stream (status {status})")
+        self.status = status
+
+
+async def _on_connect_start(session, context, params):
+    context.connect_start = time.perf_counter()
+
+
+async def _on_connect_end(session, context, params):
+    if context.trace_request_ctx is not None:
+        context.trace_request_ctx["connect"] = time.perf_counter() - context.connect_start
+
+
+def _connect_trace():
+    trace = aiohttp.TraceConfig()
+    trace.on_connection_create_start.append(_on_connect_start)
+    trace.on_connection_create_end.append(_on_connect_end)
+    return trace
+
+
+def _observe_call(model, started, connect, status):
+    """Record one upstream call that started at ``started`` (perf_counter)"""
+    INFERENCE_SECONDS.labels(model, "connect").observe(connect)
+    INFERENCE_SECONDS.labels(model, "generate").observe(time.perf_counter() - started - connect)
+    INFERENCE_RESPONSES.labels(model, str(status)).inc()
+
+
+class InferenceClient:
+    """Asyncio client for the Hugging Face inference API.
+
+    A single keep-alive session is shared by every command, so hundreds of
+    calls can be in flight at once without ever blocking the event loop.
+    Each call's connect and generate time is recorded in
+    ``chatbuddy_inference_seconds``.
+    """
+
+    def __init__(self, token, base_url=API_URL, timeout=30, max_connections=200):
+        self.token = token
+        self.base_url = base_url.rstrip("/")
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_connections = max_connections
+        self._session = None
+
+    def _get_session(self):
+        # Created lazily: aiohttp sessions must be built inside the running loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                keepalive_timeout=60,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers={"Authorization": f"Bearer {self.token}"},
+                trace_configs=[_connect_trace()]
+            )
+        return self._session
+
+    async def start(self):
+        """Nothing to load; the session is created on first use"""
+
+    def model_url(self, model):
+        return f"{self.base_url}/{model}"
+
+    async def post(self, model, payload):
+        """POST a payload to a model endpoint and return an InferenceResponse"""
+        session = self._get_session()
+        timing = {"connect": 0.0}
+        started = time.perf_counter()
+        status = "error"
+        try:
+            async with session.post(self.model_url(model), json=payload,
+                                    trace_request_ctx=timing) as response:
+                status = response.status
+                try:
+                    data = await response.json(content_type=None)
+                except ValueError:
+                    data = await response.text()
+                return InferenceResponse(response.status, data, dict(response.headers))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise InferenceError(str(e) or e.__class__.__name__) from e
+        finally:
+            _observe_call(model, started, timing["connect"], status)
+
+    async def stream(self, model, payload):
+        """POST a streaming request and yield the decoded server-sent events.
+
+        Raises StreamingUnsupported before yielding anything if the endpoint
+        does not reply with ``text/event-stream``.
+        """
+        session = self._get_session()
+        timing = {"connect": 0.0}
+        started = time.perf_counter()
+        status = "error"
+        try:
+            async with session.post(self.model_url(model), json={**payload, "stream": True},
+                                    trace_request_ctx=timing) as response:
+                status = response.status
+                content_type = response.headers.get("Content-Type", "")
+                if response.status != 200 or not content_type.startswith("text/event-stream"):
+                    raise StreamingUnsupported(response.status)
+                async for line in response.content:
+                    line = line.strip()
+                    if not line.startswith(b"data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == b"[DONE]":
+                        break
+                    try:
+                        yield json.loads(data)
+                    except ValueError:
+                        continue
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise InferenceError(str(e) or e.__class__.__name__) from e
+        finally:
+            _observe_call(model, started, timing["connect"], status)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+def _request_key(model, inputs, parameters):
+    # Whitespace-only differences map to the same upstream request
+    return (model, " ".join(inputs.split()), tuple(sorted(parameters.items())))
+
+
+class InferenceDispatcher:
+    """Front door for inference calls.
+
+    Identical prompts that are already in flight share one upstream call and
+    every waiter receives its result. Distinct prompts for the same model and
+    parameters arriving within ``batch_window`` seconds are sent together as
+    one batched ``inputs`` array of at most ``max_batch_size`` entries. Models
+    whose endpoint rejects a batch with a client error, or does not answer it
+    with one result per input, are remembered and served one prompt per
+    request from then on. Transient errors (429, 5xx) go to every waiter.
+    """
+
+    def __init__(self, send, batch_window=0.02, max_batch_size=8):
+        self.send = send
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.coalesced = 0
+        self.batches_sent = 0
+        self._inflight = {}
+        self._pending = {}
+        self._timers = {}
+        self._unbatchable = set()
+        self._tasks = set()
+
+    async def submit(self, model, inputs, parameters):
+        """Queue one prompt and wait for its InferenceResponse"""
+        key = _request_key(model, inputs, parameters)
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self._enqueue(model, inputs, parameters, future)
+        else:
+            self.coalesced += 1
+        # Shielded so one cancelled waiter does not cancel the shared call
+        return await asyncio.shield(future)
+
+    def _spawn(self, coro):
+        # Keep a reference so running batches are not garbage collected
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _enqueue(self, model, inputs, parameters, future):
+        if self.max_batch_size <= 1 or model in self._unbatchable:
+            self._spawn(self._run([(inputs, future, time.perf_counter())], model, parameters))
+            return
+
+        group = (model, tuple(sorted(parameters.items())))
+        batch = self._pending.setdefault(group, [])
+        batch.append((inputs, future, time.perf_counter()))
+        if len(batch) >= self.max_batch_size:
+            self._flush(group, parameters)
+        elif group not in self._timers:
+            loop = asyncio.get_running_loop()
+            self._timers[group] = loop.call_later(
+                self.batch_window, self._flush, group, parameters
+            )
+
+    def _flush(self, group, parameters):
+        timer = self._timers.pop(group, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(group, None)
+        if batch:
+            self._spawn(self._run(batch, group[0], parameters))
+
+    async def _run(self, batch, model, parameters):
+        now = time.perf_counter()
+        queue = INFERENCE_SECONDS.labels(model, "queue")
+        for _, _, queued_at in batch:
+            queue.observe(now - queued_at)
+        try:
+            if len(batch) == 1:
+                inputs, future, _ = batch[0]
+                response = await self.send(model, {"inputs": inputs, "parameters": parameters})
+                _resolve(future, response)
+                return
+
+            self.batches_sent += 1
+            response = await self.send(
+                model,
+                {"inputs": [inputs for inputs, _, _ in batch], "parameters": parameters}
+            )
+            results = response.data
+            if response.status == 200 and isinstance(results, list) and len(results) == len(batch):
+                for (_, future, _), item in zip(batch, results):
+                    # Give each waiter the shape of a single-prompt response
+                    data = item if isinstance(item, list) else [item]
+                    _resolve(future, InferenceResponse(response.status, data, response.headers))
+            elif response.status == 200 or (400 <= response.status < 500 and response.status != 429):
+                # Endpoint rejected the array or did not return one result per
+                # input; stop batching it
+                self._unbatchable.add(model)
+                for entry in batch:
+                    self._spawn(self._run([entry], model, parameters))
+            else:
+                for _, future, _ in batch:
+                    _resolve(future, response)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+
+def _resolve(future, response):
+    if not future.done():
+        future.set_result(response)
@@ -0,0 +1,104 @@
+"""Run the bot as several processes, each owning a slice of the gateway shards.
+
+    python launcher.py --shards 8 --processes 4
+    python launcher.py --shards 16 --processes 4 --hosts 2 --host-index 1
+
+Every process gets SHARD_COUNT and its own SHARD_IDS; with several hosts
+each host runs every ``--hosts``-th shard starting at ``--host-index``. All
+processes on a host share the STATE_DB file for games, conversations, cached
+answers and rate limits, and the ACTIVITY_DB file for user activity; each
+keeps its own semantic cache vectors. Crashed processes are restarted;
+SIGINT/SIGTERM stop them all.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "AI_tapsiriq.py")
+
+# Files a process must not share, with the bot's defaults: the semantic
+# cache's memory-mapped vectors and slot table are written by one process
+PROCESS_FILES = {'SEMANTIC_CACHE_PATH': None}
+
+
+def shard_slices(shard_count, processes, hosts=1, host_index=0):
+    """Shard ids for each process on this host"""
+    shards = list(range(host_index, shard_count, hosts))
+    return [shards[i::processes] for i in range(processes) if shards[i::processes]]
+
+
+def process_path(path, index):
+    """``path`` for the first process, ``name.<index>.ext`` for the others"""
+    if not index:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{index}{ext}"
+
+
+def spawn(index, shard_count, shard_ids, search_workers):
+    env = dict(os.environ, SHARD_COUNT=str(shard_count), SHARD_IDS=",".join(map(str, shard_ids)))
+    # Split the game AI's worker processes between the bot processes
+    env.setdefault('SEARCH_WORKERS', str(search_workers))
+    # One metrics port per process, counting up from METRICS_PORT
+    metrics_port = int(os.getenv('METRICS_PORT', '9108'))
+    if metrics_port:
+        env['METRICS_PORT'] = str(metrics_port + index)
+    # Each process keeps its own slot table for these files
+    for name, default in PROCESS_FILES.items():
+        path = os.getenv(name, default)
+        if path:
+            env[name] = process_path(path, index)
+    return subprocess.Popen([sys.executable, BOT_SCRIPT], env=env)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run sharded ChatBuddy processes")
+    parser.add_argument("--shards", type=int, required=True, help="total gateway shards")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--hosts", type=int, default=1)
+    parser.add_argument("--host-index", type=int, default=0)
+    parser.add_argument("--stagger", type=float, default=5.0,
+                        help="seconds between process starts, for Discord's identify limit")
+    args = parser.parse_args()
+
+    slices = shard_slices(args.shards, args.processes, args.hosts, args.host_index)
+    search_workers = max(1, (os.cpu_count() or 2) // len(slices))
+    children = {}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for child in children.values():
+            child.send_signal(signal.SIGINT)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for index, shard_ids in enumerate(slices):
+        if stopping:
+            break
+        if index:
+            time.sleep(args.stagger * len(slices[index - 1]))
+        children[index] = spawn(index, args.shards, shard_ids, search_workers)
+        print(f"Started process {children[index].pid} for shards {shard_ids}")
+
+    while children:
+        time.sleep(1)
+        for index, child in list(children.items()):
+            code = child.poll()
+            if code is None:
+                continue
+            del children[index]
+            if not stopping and code != 0:
+                print(f"Process for shards {slices[index]} exited with {code}, restarting")
+                time.sleep(args.stagger)
+                children[index] = spawn(index, args.shards, slices[index], search_workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from inference import INFERENCE_RESPONSES, INFERENCE_SECONDS, InferenceResponse, StreamingUnsupported
+
+
+log = logging.getLogger(__name__)
+
+
+class LocalBackend:
+    """In-process CPU inference with the same interface as InferenceClient.
+
+    The model is loaded once by ``start`` and generation runs on a small
+    dedicated thread pool (torch releases the GIL while it computes), so
+    the event loop stays responsive. Batched payloads from the
+    InferenceDispatcher become a single padded ``generate`` call, which is
+    where concurrent requests share the work. With ``quantize`` the model's
+    linear layers are converted to dynamic int8.
+
+    Needs ``transformers`` and ``torch``; they are imported on ``start`` so
+    the hosted backend works without them.
+    """
+
+    def __init__(self, model, quantize=False, threads=1, max_input_tokens=512):
+        self.model_name = model
+        self.quantize = quantize
+        self.max_input_tokens = max_input_tokens
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="local-inference")
+        self._model = None
+        self._tokenizer = None
+        self._torch = None
+
+    async def start(self):
+        """Load the model off the event loop; call once before serving"""
+        if self._model is None:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._executor, self._load)
+
+    def _load(self):
+        import torch
+        from transformers import AutoConfig, AutoModelForCausalLM, AutoModelForSeq2SeqLM, AutoTokenizer
+
+        config = AutoConfig.from_pretrained(self.model_name)
+        model_class = AutoModelForSeq2SeqLM if config.is_encoder_decoder else AutoModelForCausalLM
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        # Decoder-only models continue from the end of the prompt
+        tokenizer.padding_side = "right" if config.is_encoder_decoder else "left"
+        model = model_class.from_pretrained(self.model_name)
+        model.eval()
+        if self.quantize:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self._torch = torch
+        self._tokenizer = tokenizer
+        self._model = model
+        self._encoder_decoder = config.is_encoder_decoder
+        log.info("Loaded %s for local inference (quantized: %s)", self.model_name, self.quantize)
+
+    def _generate(self, prompts, parameters):
+        inputs = self._tokenizer(
+            prompts, return_tensors="pt", padding=True,
+            truncation=True, max_length=self.max_input_tokens
+        )
+        temperature = parameters.get("temperature", 1.0)
+        with self._torch.inference_mode():
+            output = self._model.generate(
+                **inputs,
+                max_new_tokens=parameters.get("max_new_tokens", 150),
+                do_sample=temperature > 0,
+                temperature=temperature or 1.0,
+                top_p=parameters.get("top_p", 1.0),
+                repetition_penalty=parameters.get("repetition_penalty", 1.0),
+                pad_token_id=self._tokenizer.pad_token_id
+            )
+        if not self._encoder_decoder:
+            # Drop the echoed prompt, as the hosted API does for streamed text
+            output = output[:, inputs["input_ids"].shape[1]:]
+        return self._tokenizer.batch_decode(output, skip_special_tokens=True)
+
+    async def post(self, model, payload):
+        """Generate for a single or batched payload; returns an InferenceResponse"""
+        if model != self.model_name:
+            return InferenceResponse(404, {"error": f"Model {model} is not loaded locally"}, {})
+        if self._model is None:
+            return InferenceResponse(503, {"error": "Model is loading"}, {})
+
+        inputs = payload["inputs"]
+        batched = isinstance(inputs, list)
+        prompts = inputs if batched else [inputs]
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        started = []
+
+        def generate():
+            started.append(time.perf_counter())
+            return self._generate(prompts, payload.get("parameters", {}))
+
+        try:
+            texts = await loop.run_in_executor(self._executor, generate)
+        except Exception as e:
+            log.exception("Local generation failed")
+            INFERENCE_RESPONSES.labels(model, "500").inc()
+            return InferenceResponse(500, {"error": str(e)}, {})
+        INFERENCE_SECONDS.labels(model, "worker_wait").observe(started[0] - submitted)
+        INFERENCE_SECONDS.labels(model, "generate").observe(time.perf_counter() - started[0])
+        INFERENCE_RESPONSES.labels(model, "200").inc()
+
+        # Same shapes as the hosted API for single and batched inputs
+        results = [[{"generated_text": text}] for text in texts]
+        return InferenceResponse(200, results if batched else results[0], {})
+
+    async def stream(self, model, payload):
+        """Local answers are produced whole; callers fall back to ``post``"""
+        raise StreamingUnsupported(200)
+        yield
+
+    async def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
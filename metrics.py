@@ -0,0 +1,309 @@
+"""Low-overhead metrics exposed in the Prometheus text format.
+
+Metrics are declared once, at module level next to the code they measure,
+on the process-wide ``REGISTRY``. Updating one is plain arithmetic: a
+counter increment is one addition, a histogram observation one bisect and
+two additions. Nothing is formatted until the endpoint is scraped.
+Collectors registered with ``Registry.collector`` run on each scrape to
+copy figures that already exist elsewhere (cache stats, queue lengths).
+"""
+import asyncio
+import bisect
+import logging
+import time
+
+from aiohttp import web
+
+
+log = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from a cache hit to a slow model
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format(value):
+    if value == float("inf"):
+        return "+Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def set(self, value):
+        """Mirror a total that is already counted elsewhere"""
+        self.value = value
+
+
+class GaugeValue(CounterValue):
+    __slots__ = ()
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+
+class HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self):
+        """Context manager observing the seconds its block takes"""
+        return _Timer(self)
+
+
+class Metric:
+    """A named metric with one value per combination of label values.
+
+    Hot paths should keep the child returned by ``labels`` instead of
+    looking it up on every update. Metrics without labels can be updated
+    directly.
+    """
+
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._children = {}
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield self.name, _labels(self.label_names, values), child.value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {_format(value)}" for name, labels, value in self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return CounterValue()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return GaugeValue()
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def samples(self):
+        bounds = self.buckets + (float("inf"),)
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, child.counts):
+                cumulative += count
+                labels = _labels(self.label_names, values, f'le="{_format(bound)}"')
+                yield self.name + "_bucket", labels, cumulative
+            labels = _labels(self.label_names, values)
+            yield self.name + "_sum", labels, child.sum
+            yield self.name + "_count", labels, child.count
+
+
+class Registry:
+    """The set of metrics served by one MetricsServer"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+
+    def _add(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            if type(existing) is not type(metric) or existing.label_names != metric.label_names:
+                raise ValueError(f"metric {metric.name} is already registered differently")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def collector(self, callback):
+        """Run ``callback()`` before every scrape; usable as a decorator"""
+        self._collectors.append(callback)
+        return callback
+
+    def render(self):
+        for callback in self._collectors:
+            try:
+                callback()
+            except Exception:
+                log.exception("Metrics collector %s failed", getattr(callback, "__name__", callback))
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+# Shared by every component that writes batches to SQLite
+DB_WRITE_SECONDS = REGISTRY.histogram(
+    "chatbuddy_db_write_seconds", "Time to write one batch to the database", ("store",)
+)
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a task sleeping ``interval``.
+
+    Any delay beyond the interval is time the loop spent running something
+    else, such as a blocking call or a long stretch of CPU work.
+    """
+
+    def __init__(self, registry=REGISTRY, interval=0.25):
+        self.interval = interval
+        self.histogram = registry.histogram(
+            "chatbuddy_event_loop_lag_seconds", "Delay of event loop wake-ups"
+        )
+        self.gauge = registry.gauge(
+            "chatbuddy_event_loop_lag_max_seconds", "Largest event loop delay since the last scrape"
+        )
+        self._max = 0.0
+        self._task = None
+        registry.collector(self._collect)
+
+    def _collect(self):
+        self.gauge.set(self._max)
+        self._max = 0.0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            self.histogram.observe(lag)
+            if lag > self._max:
+                self._max = lag
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class MetricsServer:
+    """Serves ``GET /metrics`` for a registry on a local port"""
+
+    def __init__(self, registry=REGISTRY, host="127.0.0.1", port=9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, self.host, self.port).start()
+        except OSError as e:
+            # Metrics are optional; never keep the bot from starting
+            log.error("Cannot serve metrics on %s:%d: %s", self.host, self.port, e)
+            await self.close()
+            return
+        log.info("Serving metrics on http://%s:%d/metrics", self.host, self.port)
+
+    async def _handle(self, request):
+        body = self.registry.render().encode("utf-8")
+        return web.Response(body=body, headers={"Content-Type": CONTENT_TYPE})
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,93 @@
+import logging
+import time
+
+
+log = logging.getLogger(__name__)
+
+
+class ModelStats:
+    """Exponentially weighted latency and error rate of one model"""
+
+    __slots__ = ("latency", "error_rate", "samples", "avoid_until")
+
+    def __init__(self):
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self.samples = 0
+        self.avoid_until = 0.0
+
+    def reset(self):
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self.samples = 0
+
+
+class ModelRouter:
+    """Chooses a model per command and prompt length.
+
+    ``tiers`` maps a tier name to its models in order of preference and
+    ``routes`` maps commands to a tier (``default_tier`` otherwise). Prompts
+    longer than ``long_prompt`` characters escalate from ``small_tier`` to
+    ``large_tier``. Each call's latency and outcome feed per-model moving
+    averages; a model whose error rate or latency crosses the limits is
+    skipped for ``cooldown`` seconds and then re-evaluated from scratch.
+    When every model of a tier is being avoided the other tiers are tried,
+    and as a last resort the tier's first model is used anyway.
+    """
+
+    def __init__(self, tiers, routes, default_tier="large", small_tier="small",
+                 large_tier="large", long_prompt=300, alpha=0.2, min_samples=3,
+                 max_error_rate=0.5, max_latency=20.0, cooldown=120.0):
+        self.tiers = tiers
+        self.routes = routes
+        self.default_tier = default_tier
+        self.small_tier = small_tier
+        self.large_tier = large_tier
+        self.long_prompt = long_prompt
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.max_latency = max_latency
+        self.cooldown = cooldown
+        self.stats = {
+            model: ModelStats() for models in tiers.values() for model in models
+        }
+
+    @property
+    def models(self):
+        return list(self.stats)
+
+    def tier_for(self, command, prompt):
+        tier = self.routes.get(command, self.default_tier)
+        if tier == self.small_tier and len(prompt) > self.long_prompt:
+            tier = self.large_tier
+        return tier
+
+    def choose(self, command, prompt):
+        """The model to send this prompt to"""
+        tier = self.tier_for(command, prompt)
+        now = time.monotonic()
+        for name in [tier] + [other for other in self.tiers if other != tier]:
+            for model in self.tiers[name]:
+                if self.stats[model].avoid_until <= now:
+                    return model
+        return self.tiers[tier][0]
+
+    def record(self, model, latency, ok):
+        """Feed one call's latency (seconds) and success into the averages"""
+        stats = self.stats.get(model)
+        if stats is None:
+            return
+        alpha = self.alpha if stats.samples else 1.0
+        stats.latency += alpha * (latency - stats.latency)
+        stats.error_rate += alpha * ((0.0 if ok else 1.0) - stats.error_rate)
+        stats.samples += 1
+        if stats.samples < self.min_samples:
+            return
+        if stats.error_rate > self.max_error_rate or stats.latency > self.max_latency:
+            log.warning(
+                "Routing away from %s for %.0fs (error rate %.2f, latency %.1fs)",
+                model, self.cooldown, stats.error_rate, stats.latency
+            )
+            stats.avoid_until = time.monotonic() + self.cooldown
+            stats.reset()
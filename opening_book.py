@@ -0,0 +1,179 @@
+"""Chess opening book in a memory-mapped binary file.
+
+The file follows the Polyglot layout: 16-byte big-endian entries of
+(position key, move, weight, learn), sorted by key, so a lookup is a
+binary search over the mapped file and nothing is read into memory up
+front. Keys are the engine's own Zobrist hashes (``Position.hash``)
+rather than the Polyglot random table, so a book has to be built with
+this module:
+
+    python opening_book.py openings.txt opening_book.bin
+
+The source lists one line of play per row in coordinate notation
+(``e2e4 e7e5 g1f3``); a move's weight is the number of lines that play
+it from that position.
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+
+from chess_engine import (
+    BISHOP, CASTLE, EMPTY, KING, KNIGHT, QUEEN, ROOK, Position, move_flag, move_from,
+    move_promotion, move_to
+)
+
+
+ENTRY = struct.Struct(">QHHI")
+KEY = struct.Struct(">Q")
+
+# Promotion pieces in the order of Polyglot's 3-bit promotion field
+BOOK_PROMOTIONS = (EMPTY, KNIGHT, BISHOP, ROOK, QUEEN)
+
+
+def _file_rank(sq):
+    return sq & 7, 7 - (sq >> 4)
+
+
+def _square(file, rank):
+    return (7 - rank) * 16 + file
+
+
+def encode_book_move(move):
+    """Engine move to a 16-bit book move; castling is king takes own rook"""
+    frm, to = move_from(move), move_to(move)
+    if move_flag(move) == CASTLE:
+        to = (to & 0x70) | (7 if to > frm else 0)
+    to_file, to_rank = _file_rank(to)
+    from_file, from_rank = _file_rank(frm)
+    promotion = BOOK_PROMOTIONS.index(move_promotion(move))
+    return to_file | (to_rank << 3) | (from_file << 6) | (from_rank << 9) | (promotion << 12)
+
+
+def decode_book_move(position, book_move):
+    """The legal engine move for a book move in ``position``, or None"""
+    frm = _square((book_move >> 6) & 7, (book_move >> 9) & 7)
+    to = _square(book_move & 7, (book_move >> 3) & 7)
+    promotion_index = (book_move >> 12) & 7
+    promotion = BOOK_PROMOTIONS[promotion_index] if promotion_index < len(BOOK_PROMOTIONS) else EMPTY
+    if abs(position.board[frm]) == KING and position.board[to] == position.board[frm] // KING * ROOK:
+        to = frm + 2 if to > frm else frm - 2
+    for move in position.legal_moves():
+        if move_from(move) == frm and move_to(move) == to and move_promotion(move) == promotion:
+            return move
+    return None
+
+
+class OpeningBook:
+    """Read-only view of a book file; a missing or empty file is an empty book"""
+
+    def __init__(self, path):
+        self.path = path
+        self.stats = {"hits": 0, "misses": 0}
+        self._file = None
+        self._map = None
+        self._count = 0
+        try:
+            self._file = open(path, "rb")
+        except FileNotFoundError:
+            return
+        size = os.fstat(self._file.fileno()).st_size
+        if size >= ENTRY.size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._count = size // ENTRY.size
+
+    def __len__(self):
+        return self._count
+
+    def _first(self, key):
+        """Index of the first entry whose key is not below ``key``"""
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if KEY.unpack_from(self._map, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def entries(self, key):
+        """(book move, weight) pairs stored for a position key"""
+        found = []
+        index = self._first(key) if self._count else 0
+        while index < self._count:
+            entry_key, book_move, weight, _ = ENTRY.unpack_from(self._map, index * ENTRY.size)
+            if entry_key != key:
+                break
+            found.append((book_move, weight))
+            index += 1
+        return found
+
+    def choose(self, position, rng=random):
+        """A weighted random book move for ``position`` or None"""
+        candidates = []
+        for book_move, weight in self.entries(position.hash):
+            move = decode_book_move(position, book_move)
+            if move is not None and weight:
+                candidates.append((move, weight))
+        if not candidates:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        moves, weights = zip(*candidates)
+        return rng.choices(moves, weights)[0]
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._count = 0
+
+
+def parse_move(position, text):
+    frm = _square(ord(text[0]) - ord('a'), int(text[1]) - 1)
+    to = _square(ord(text[2]) - ord('a'), int(text[3]) - 1)
+    promotion = {'n': KNIGHT, 'b': BISHOP, 'r': ROOK}.get(text[4:5], QUEEN)
+    return position.find_move(frm, to, promotion)
+
+
+def build_book(lines, max_plies=20):
+    """Sorted (key, book move, weight) entries from lines of coordinate moves"""
+    weights = {}
+    for number, line in enumerate(lines, 1):
+        line = line.split('#', 1)[0].split()
+        position = Position.from_fen()
+        for text in line[:max_plies]:
+            move = parse_move(position, text.lower())
+            if move is None:
+                raise ValueError(f"line {number}: illegal move {text!r}")
+            entry = (position.hash, encode_book_move(move))
+            weights[entry] = weights.get(entry, 0) + 1
+            position.make(move)
+    return sorted((key, book_move, min(weight, 0xFFFF))
+                  for (key, book_move), weight in weights.items())
+
+
+def write_book(path, entries):
+    with open(path, "wb") as f:
+        for key, book_move, weight in entries:
+            f.write(ENTRY.pack(key, book_move, weight, 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a chess opening book")
+    parser.add_argument("source", help="text file, one line of coordinate moves per row")
+    parser.add_argument("output", help="book file to write")
+    parser.add_argument("--max-plies", type=int, default=20, help="moves kept from each line")
+    args = parser.parse_args()
+    with open(args.source, encoding="utf-8") as f:
+        entries = build_book(f, args.max_plies)
+    write_book(args.output, entries)
+    print(f"{len(entries)} entries written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
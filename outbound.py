@@ -0,0 +1,305 @@
+import asyncio
+import contextvars
+import functools
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict
+
+from rate_limit import AdmissionController
+
+
+log = logging.getLogger(__name__)
+
+# Send priorities, most urgent first
+GAME, NORMAL, ANSWER = 0, 1, 2
+
+MESSAGE_LIMIT = 2000
+
+_priority = contextvars.ContextVar("outbound_priority", default=NORMAL)
+
+
+def replies_with(priority):
+    """Give the sends and edits a handler makes a default priority"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(message, args):
+            token = _priority.set(priority)
+            try:
+                await handler(message, args)
+            finally:
+                _priority.reset(token)
+        return wrapper
+    return decorator
+
+
+class _Op:
+    __slots__ = ("kind", "priority", "seq", "content", "kwargs", "target", "merge", "future")
+
+    def __init__(self, kind, priority, seq, content, kwargs, target, merge, future):
+        self.kind = kind
+        self.priority = priority
+        self.seq = seq
+        self.content = content
+        self.kwargs = kwargs
+        self.target = target
+        self.merge = merge
+        self.future = future
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _Channel:
+    __slots__ = ("channel", "ops", "edits", "task", "last", "paused")
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.ops = []
+        self.edits = {}
+        self.task = None
+        # (message, content, sent at) of our newest message if it may be
+        # extended, None once anything else was posted after it
+        self.last = None
+        self.paused = {"send": 0.0, "edit": 0.0}
+
+
+class OutboundScheduler:
+    """Per-channel outbound queues in front of ``channel.send`` and ``message.edit``.
+
+    Each channel's sends and edits go out one at a time, most urgent
+    priority first, and a shared AdmissionController caps the REST calls in
+    flight across channels, again by priority. Work that piles up while a
+    channel waits is combined:
+
+    - queued sends become one message while they fit in MESSAGE_LIMIT;
+    - a send right after our own newest message in the channel (nothing
+      else posted since, within ``merge_window`` seconds) is appended to
+      that message with an edit instead;
+    - queued edits of the same message collapse into the newest one.
+
+    Only sends without attachments that the caller will not edit
+    (``merge=True``) are combined. Rate limit headers fed to ``observe``
+    pause a channel's sends or edits until its bucket refills, so bursts
+    wait (and merge) here instead of inside the library.
+    """
+
+    def __init__(self, max_in_flight=16, merge_window=10.0, max_channels=10000):
+        self.merge_window = merge_window
+        self.max_channels = max_channels
+        self.gate = AdmissionController({}, max_concurrent=max_in_flight, max_queue=1 << 30)
+        self.stats = {"sends": 0, "edits": 0, "merged": 0, "extended": 0, "collapsed": 0, "paced": 0}
+        self._channels = OrderedDict()
+        self._order = itertools.count()
+        self._global_until = 0.0
+
+    @property
+    def queued(self):
+        return sum(len(state.ops) for state in self._channels.values())
+
+    def _state(self, channel):
+        state = self._channels.get(channel.id)
+        if state is None:
+            state = self._channels[channel.id] = _Channel(channel)
+            if len(self._channels) > self.max_channels:
+                self._prune()
+        else:
+            self._channels.move_to_end(channel.id)
+        return state
+
+    def _prune(self):
+        now = time.monotonic()
+        for channel_id, state in list(self._channels.items()):
+            if len(self._channels) <= self.max_channels:
+                break
+            if not state.ops and state.task is None and max(state.paused.values()) <= now:
+                del self._channels[channel_id]
+
+    def _queue(self, channel, kind, content, priority, kwargs, target=None, merge=False):
+        state = self._state(channel)
+        future = asyncio.get_running_loop().create_future()
+        op = _Op(kind, _priority.get() if priority is None else priority, next(self._order),
+                 content, kwargs, target, merge, future)
+        heapq.heappush(state.ops, op)
+        if state.task is None:
+            state.task = asyncio.create_task(self._drain(state))
+        return op
+
+    async def send(self, channel, content=None, priority=None, merge=True, **kwargs):
+        """Send a message to ``channel`` and return it.
+
+        Pass ``merge=False`` for a message you are going to edit; with the
+        default it may be combined with other sends, so several callers can
+        get the same message back.
+        """
+        merge = merge and not kwargs and content is not None and len(content) <= MESSAGE_LIMIT
+        op = self._queue(channel, "send", content, priority, kwargs, merge=merge)
+        return await asyncio.shield(op.future)
+
+    def _queue_edit(self, message, content, priority, kwargs):
+        state = self._state(message.channel)
+        pending = state.edits.get(message.id)
+        if pending is not None and not pending.future.done():
+            # Only the newest content matters
+            pending.content = content
+            pending.kwargs = kwargs
+            self.stats["collapsed"] += 1
+            if priority is not None and priority < pending.priority:
+                pending.priority = priority
+                heapq.heapify(state.ops)
+            return pending
+        op = self._queue(message.channel, "edit", content, priority, kwargs, target=message)
+        state.edits[message.id] = op
+        return op
+
+    async def edit(self, message, content, priority=None, **kwargs):
+        """Replace a message's content once the channel's turn comes"""
+        op = self._queue_edit(message, content, priority, kwargs)
+        return await asyncio.shield(op.future)
+
+    def edit_nowait(self, message, content, priority=None, **kwargs):
+        """Queue a progress edit without waiting; a later edit supersedes it"""
+        op = self._queue_edit(message, content, priority, kwargs)
+        op.future.add_done_callback(_log_failure)
+
+    def note_message(self, channel_id):
+        """Someone else posted in the channel; stop extending our last message"""
+        state = self._channels.get(channel_id)
+        if state is not None:
+            state.last = None
+
+    def observe(self, method, path, status, headers):
+        """Learn from a Discord REST response's rate limit headers"""
+        now = time.monotonic()
+        if status == 429:
+            retry_after = float(headers.get("Retry-After", 1))
+            if headers.get("X-RateLimit-Global") or headers.get("X-RateLimit-Scope") == "global":
+                self._global_until = max(self._global_until, now + retry_after)
+                self.stats["paced"] += 1
+                return
+            until = now + retry_after
+        elif headers.get("X-RateLimit-Remaining") == "0":
+            until = now + float(headers.get("X-RateLimit-Reset-After", 0))
+        else:
+            return
+
+        parts = path.strip("/").split("/")
+        try:
+            channel_id = int(parts[parts.index("channels") + 1])
+        except (ValueError, IndexError):
+            return
+        state = self._channels.get(channel_id)
+        if state is None or parts[-1] == "typing":
+            return
+        kind = "send" if method == "POST" else "edit" if method == "PATCH" else None
+        if kind is not None and until > state.paused[kind]:
+            state.paused[kind] = until
+            self.stats["paced"] += 1
+
+    async def _drain(self, state):
+        try:
+            while state.ops:
+                # The best op can change while we wait, so check again after
+                while True:
+                    kind = state.ops[0].kind
+                    delay = max(state.paused[kind], self._global_until) - time.monotonic()
+                    if delay <= 0:
+                        break
+                    await asyncio.sleep(delay)
+                await self.gate.acquire(state.ops[0].priority)
+                try:
+                    await self._run_next(state)
+                finally:
+                    self.gate.release()
+        finally:
+            state.task = None
+
+    async def _run_next(self, state):
+        op = heapq.heappop(state.ops)
+        if op.kind == "edit":
+            state.edits.pop(op.target.id, None)
+            self.stats["edits"] += 1
+            await _complete([op], op.target.edit(content=op.content, **op.kwargs))
+            return
+
+        batch = [op]
+        content = op.content
+        if op.merge:
+            while state.ops and state.ops[0].kind == "send" and state.ops[0].merge:
+                extra = state.ops[0].content
+                if len(content) + 1 + len(extra) > MESSAGE_LIMIT:
+                    break
+                batch.append(heapq.heappop(state.ops))
+                content += "\n" + extra
+            self.stats["merged"] += len(batch) - 1
+            if await self._extend(state, batch, content):
+                return
+
+        self.stats["sends"] += 1
+        message = await _complete(batch, state.channel.send(content, **op.kwargs))
+        if message is not None and op.merge:
+            state.last = (message, content, time.monotonic())
+        else:
+            state.last = None
+
+    async def _extend(self, state, batch, content):
+        """Append to our last message instead of sending a new one"""
+        if state.last is None:
+            return False
+        message, previous, sent_at = state.last
+        combined = previous + "\n" + content
+        if time.monotonic() - sent_at > self.merge_window or len(combined) > MESSAGE_LIMIT:
+            return False
+        self.stats["edits"] += 1
+        try:
+            edited = await message.edit(content=combined)
+        except Exception:
+            # Deleted or no longer editable; send a new message instead
+            log.debug("Could not extend message %s", message.id, exc_info=True)
+            state.last = None
+            return False
+        self.stats["extended"] += 1
+        state.last = (edited or message, combined, sent_at)
+        for op in batch:
+            if not op.future.done():
+                op.future.set_result(message)
+        return True
+
+    async def close(self, timeout=5.0):
+        """Give queued messages ``timeout`` seconds to go out, then drop them"""
+        tasks = [state.task for state in self._channels.values() if state.task is not None]
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            for task in pending:
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        for state in self._channels.values():
+            for op in state.ops:
+                if not op.future.done():
+                    op.future.cancel()
+            state.ops.clear()
+            state.edits.clear()
+
+
+async def _complete(batch, call):
+    try:
+        result = await call
+    except Exception as e:
+        for op in batch:
+            if not op.future.done():
+                op.future.set_exception(e)
+        return None
+    for op in batch:
+        if not op.future.done():
+            op.future.set_result(result)
+    return result
+
+
+def _log_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        log.warning("Outbound edit failed: %s", future.exception())
@@ -0,0 +1,96 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+# Frames the event loop sits in while it waits for I/O
+IDLE_FUNCTIONS = {"select", "poll", "epoll", "kqueue", "_run_once"}
+
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profile:
+    """Stack samples from one capture, outermost frame first"""
+
+    def __init__(self, stacks, duration):
+        self.stacks = stacks
+        self.duration = duration
+        self.samples = sum(stacks.values())
+
+    @staticmethod
+    def _idle(stack):
+        return not stack or stack[-1].split(" ", 1)[0] in IDLE_FUNCTIONS
+
+    def idle_samples(self):
+        return sum(count for stack, count in self.stacks.items() if self._idle(stack))
+
+    def top(self, count=15):
+        """``(function, self samples, total samples)`` for the busiest functions.
+
+        Ordered by self samples, the time a function was the innermost
+        Python frame; samples of the idle loop are left out.
+        """
+        own = Counter()
+        total = Counter()
+        for stack, samples in self.stacks.items():
+            if self._idle(stack):
+                continue
+            own[stack[-1]] += samples
+            for name in set(stack):
+                total[name] += samples
+        return [(name, samples, total[name]) for name, samples in own.most_common(count)]
+
+    def collapsed(self):
+        """One ``frame;frame;frame count`` line per stack, for flame graph tools"""
+        return "\n".join(f"{';'.join(stack)} {count}"
+                         for stack, count in self.stacks.most_common()) + "\n"
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack every ``interval`` seconds.
+
+    The samples are taken from a helper thread through
+    ``sys._current_frames()``, so the profiled code runs unmodified and
+    nothing is paid between captures. ``capture`` blocks for the whole
+    duration; run it in a worker thread to profile the event loop.
+    """
+
+    def __init__(self, thread_id=None, interval=0.005, max_depth=64):
+        self.thread_id = thread_id if thread_id is not None else threading.main_thread().ident
+        self.interval = interval
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._lock.locked()
+
+    def capture(self, duration):
+        """Sample for ``duration`` seconds and return a Profile"""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("a capture is already running")
+        try:
+            stacks = Counter()
+            started = time.monotonic()
+            deadline = started + duration
+            while time.monotonic() < deadline:
+                frame = sys._current_frames().get(self.thread_id)
+                if frame is not None:
+                    stacks[self._stack(frame)] += 1
+                del frame
+                time.sleep(self.interval)
+            return Profile(stacks, time.monotonic() - started)
+        finally:
+            self._lock.release()
+
+    def _stack(self, frame):
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            names.append(_frame_name(frame.f_code))
+            frame = frame.f_back
+        names.reverse()
+        return tuple(names)
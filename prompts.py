@@ -0,0 +1,112 @@
+import re
+
+
+# Rough subword split: short word pieces and single punctuation marks.
+# Close enough to SentencePiece/BPE counts to keep prompts inside a budget.
+TOKEN_PATTERN = re.compile(r"\w{1,4}|[^\w\s]")
+
+# Prompt layouts: (prefix before the persona, separator before any history,
+# between persona/history and message, suffix)
+TEMPLATES = {
+    "plain": ("", "\n", "\nUser: ", "\nAI:"),
+    "instruct": ("[INST] ", "\n\n", "\n\n", " [/INST]"),
+}
+
+
+def count_tokens(text):
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def truncate(text, max_tokens):
+    """Cut ``text`` to about ``max_tokens``, keeping its start and its end.
+
+    Returns ``(text, truncated)``. The middle of an over-long message is
+    replaced by an ellipsis, which keeps both the context a user pasted and
+    the question usually asked at the end.
+    """
+    # Every token is at least one character
+    if len(text) <= max_tokens:
+        return text, False
+    starts = [match.start() for match in TOKEN_PATTERN.finditer(text)]
+    if len(starts) <= max_tokens:
+        return text, False
+    if max_tokens <= 1:
+        return "…", True
+    head = (max_tokens - 1) * 2 // 3
+    tail = max_tokens - 1 - head
+    end = text[starts[-tail]:].lstrip() if tail else ""
+    return text[:starts[head]].rstrip() + " … " + end, True
+
+
+def truncate_start(text, max_tokens):
+    """Keep only the last ``max_tokens`` tokens of ``text``"""
+    if len(text) <= max_tokens:
+        return text
+    starts = [match.start() for match in TOKEN_PATTERN.finditer(text)]
+    if len(starts) <= max_tokens:
+        return text
+    return "…" + text[starts[-max_tokens]:] if max_tokens > 0 else ""
+
+
+class PromptCompiler:
+    """Builds model inputs from a persona and a user message.
+
+    Each (persona, template) pair is compiled once into its fixed prefix,
+    suffix and their token count; ``preload`` does this for the known
+    personas at startup. A prompt then costs one lookup, a token count of
+    the message and a join. Messages are truncated so the whole prompt fits
+    the model's input budget from ``budgets`` (``default_budget`` for
+    models not listed). Conversation history, when given, goes between the
+    persona and the message and may use at most half the budget; its oldest
+    part is dropped first. Models in ``instruct_models`` use the ``[INST]``
+    layout, all others the plain ``User:``/``AI:`` one.
+    """
+
+    def __init__(self, budgets=None, default_budget=512, instruct_models=()):
+        self.budgets = budgets or {}
+        self.default_budget = default_budget
+        self.instruct_models = set(instruct_models)
+        self.truncated = 0
+        self._compiled = {}
+
+    def template_for(self, model):
+        return "instruct" if model in self.instruct_models else "plain"
+
+    def _compile(self, persona, template):
+        key = (persona, template)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            start, _, middle, end = TEMPLATES[template]
+            prefix = start + persona + middle
+            compiled = self._compiled[key] = (prefix, end, count_tokens(prefix + end))
+        return compiled
+
+    def preload(self, personas):
+        for persona in personas:
+            for template in TEMPLATES:
+                self._compile(persona, template)
+
+    def build(self, model, persona, message, history=""):
+        """The model input for ``message`` asked under ``persona``"""
+        template = self.template_for(model)
+        prefix, suffix, fixed_tokens = self._compile(persona, template)
+        available = max(self.budgets.get(model, self.default_budget) - fixed_tokens, 1)
+        if history:
+            history = truncate_start(history, available // 2)
+            available -= count_tokens(history)
+            start, separator, middle, _ = TEMPLATES[template]
+            prefix = start + persona + separator + history + middle
+        message, truncated = truncate(message, max(available, 1))
+        if truncated:
+            self.truncated += 1
+        return prefix + message + suffix
+
+    @staticmethod
+    def clean_output(generated, inputs):
+        """Strip an echoed prompt and a leading answer marker from a generation"""
+        if generated.startswith(inputs):
+            generated = generated[len(inputs):]
+        generated = generated.lstrip()
+        if generated.startswith("AI:"):
+            generated = generated[3:]
+        return generated.strip()
@@ -0,0 +1,215 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+
+from metrics import REGISTRY
+
+
+ADMISSION_WAIT = REGISTRY.histogram(
+    "chatbuddy_admission_wait_seconds", "Time queued requests waited for a slot", ("priority",)
+)
+
+
+class RateLimited(Exception):
+    """A token bucket is empty; ``retry_after`` is the wait in seconds"""
+
+    def __init__(self, scope, retry_after):
+        super().__init__(f"{scope} rate limit exceeded")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class QueueFull(Exception):
+    """Every slot is busy and the admission queue is at capacity"""
+
+
+class BucketTable:
+    """Token buckets keyed by id, refilled lazily when they are checked.
+
+    Each bucket is a ``[tokens, updated]`` pair kept in access order, so the
+    least recently used bucket is always at the front. Past ``max_buckets``
+    that bucket is dropped; an idle bucket has refilled to ``burst`` anyway,
+    so forgetting it changes nothing.
+    """
+
+    def __init__(self, rate, burst, max_buckets=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def _refill(self, key, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now]
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        return bucket
+
+    def retry_after(self, key, now):
+        """Seconds until ``key`` has a token, 0.0 if it has one now"""
+        tokens = self._refill(key, now)[0]
+        if tokens >= 1:
+            return 0.0
+        return (1 - tokens) / self.rate
+
+    def take(self, key, now):
+        self._refill(key, now)[0] -= 1
+
+
+class SharedBucketTable:
+    """Token buckets kept in a StateStore, shared by every bot process.
+
+    Same interface as BucketTable. Checking and spending are separate
+    calls, so two processes racing for a user's last token can both get it;
+    the bucket then goes negative and the user waits correspondingly
+    longer. Buckets idle for ``idle_after`` seconds are pruned now and then.
+    """
+
+    def __init__(self, store, namespace, rate, burst, idle_after=3600, prune_every=1000):
+        self.store = store
+        self.namespace = namespace
+        self.rate = rate
+        self.burst = burst
+        self.idle_after = idle_after
+        self.prune_every = prune_every
+        self._takes = 0
+
+    def retry_after(self, key, now):
+        bucket = self.store.read_bucket(self.namespace, str(key))
+        if bucket is None:
+            return 0.0
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        if tokens >= 1:
+            return 0.0
+        return (1 - tokens) / self.rate
+
+    def take(self, key, now):
+        self.store.take_token(self.namespace, str(key), self.rate, self.burst, now)
+        self._takes += 1
+        if self._takes % self.prune_every == 0:
+            self.store.expire(self.namespace, now - self.idle_after)
+
+
+class AdmissionController:
+    """Admission control for commands that call the inference API.
+
+    A request must find a token in its user, channel and guild buckets
+    (tokens are only spent once all three have one), then a free slot under
+    the global concurrency cap. Without a free slot it waits in a bounded
+    priority queue, lower ``priority`` values first and FIFO within a
+    priority. A full queue rejects immediately instead of growing.
+
+    ``limits`` maps each scope ("user", "channel", "guild") to a
+    ``(tokens per second, burst)`` pair; scopes left out are not limited.
+    With a ``store`` the buckets are shared through it by all processes;
+    the concurrency cap and queue always belong to this process. Shared
+    buckets are checked in a thread, as the store may have to wait for other
+    processes' writes; in-memory ones are checked on the loop.
+    """
+
+    def __init__(self, limits, max_concurrent=16, max_queue=64, max_buckets=10000, store=None):
+        if store is not None:
+            self.tables = {
+                scope: SharedBucketTable(store, f"rate:{scope}", rate, burst)
+                for scope, (rate, burst) in limits.items()
+            }
+            self.shared = True
+        else:
+            self.shared = False
+            self.tables = {
+                scope: BucketTable(rate, burst, max_buckets)
+                for scope, (rate, burst) in limits.items()
+            }
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.active = 0
+        self._waiters = []
+        self._order = itertools.count()
+        self.stats = {"admitted": 0, "queued": 0, "rate_limited": 0, "rejected": 0}
+
+    @property
+    def queued(self):
+        return len(self._waiters)
+
+    def check(self, keys):
+        """Spend one token from each scope's bucket or raise RateLimited.
+
+        ``keys`` maps scopes to ids; a None id skips that scope (e.g. the
+        guild bucket for direct messages).
+        """
+        now = time.time()
+        buckets = [
+            (scope, self.tables[scope], key)
+            for scope, key in keys.items()
+            if key is not None and scope in self.tables
+        ]
+        for scope, table, key in buckets:
+            wait = table.retry_after(key, now)
+            if wait:
+                self.stats["rate_limited"] += 1
+                raise RateLimited(scope, wait)
+        for scope, table, key in buckets:
+            table.take(key, now)
+
+    async def acquire(self, priority=0, on_queued=None):
+        """Wait for a concurrency slot; raises QueueFull when it cannot queue"""
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            self.stats["admitted"] += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise QueueFull()
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        self.stats["queued"] += 1
+        queued_at = time.perf_counter()
+        try:
+            if on_queued is not None:
+                await on_queued(len(self._waiters))
+            await future
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled
+                self.release()
+            else:
+                self._discard(future)
+            raise
+        ADMISSION_WAIT.labels(str(priority)).observe(time.perf_counter() - queued_at)
+        self.stats["admitted"] += 1
+
+    def _discard(self, future):
+        for index, entry in enumerate(self._waiters):
+            if entry[2] is future:
+                self._waiters[index] = self._waiters[-1]
+                self._waiters.pop()
+                heapq.heapify(self._waiters)
+                return
+
+    def release(self):
+        """Free a slot, handing it straight to the best queued waiter if any"""
+        while self._waiters:
+            future = heapq.heappop(self._waiters)[2]
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    async def admit(self, keys, priority=0, on_queued=None):
+        """Rate-limit check plus slot acquisition; pair with ``release``"""
+        if self.shared:
+            await asyncio.to_thread(self.check, keys)
+        else:
+            self.check(keys)
+        await self.acquire(priority, on_queued)
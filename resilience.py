@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import random
+import time
+
+from inference import InferenceError
+
+
+log = logging.getLogger(__name__)
+
+# Statuses worth retrying: rate limited, model loading, upstream hiccups
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpen(InferenceError):
+    """The endpoint is failing; calls are refused until ``retry_after`` passes"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"circuit open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Classic closed / open / half-open breaker.
+
+    ``failure_threshold`` consecutive failures open the circuit and every
+    call is refused for ``reset_timeout`` seconds. After that one probe call
+    is let through (half-open): success closes the circuit, failure opens it
+    again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def closed(self):
+        return self.state == self.CLOSED
+
+    def retry_after(self):
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self):
+        """Whether a call may go out now; claims the probe when half-open"""
+        if self.state == self.OPEN:
+            if self.retry_after() > 0:
+                return False
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                log.warning("Circuit opened after %d failures", self.failures)
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+
+def _retry_delay(response, attempt, base_delay, max_delay):
+    """Seconds to wait before retrying a response, or None if it is final"""
+    data = response.data
+    if isinstance(data, dict) and "estimated_time" in data:
+        # Model is loading; the API says roughly how long it will take
+        return min(float(data["estimated_time"]), max_delay) * random.uniform(1.0, 1.1)
+    if response.status not in RETRYABLE_STATUSES:
+        return None
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), max_delay) * random.uniform(1.0, 1.1)
+        except ValueError:
+            pass
+    return _backoff(attempt, base_delay, max_delay)
+
+
+def _backoff(attempt, base_delay, max_delay):
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class ResilientSender:
+    """Retries, shared backoff and per-model circuit breakers around ``post``.
+
+    Retryable answers (model loading, 429, 5xx) are retried after the delay
+    the endpoint asks for via ``estimated_time`` or ``Retry-After``, or after
+    a jittered exponential backoff. The delay is recorded per model, and new
+    requests for that model wait it out too instead of each hitting a cold
+    endpoint; when they resume together the dispatcher batches them.
+    Connection errors and 5xx answers other than "loading" count against the
+    model's circuit breaker; while it is open calls fail fast with CircuitOpen.
+    """
+
+    def __init__(self, send, failure_threshold=5, reset_timeout=30.0, max_attempts=4,
+                 base_delay=1.0, max_delay=20.0, max_wait=60.0):
+        self.send = send
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers = {}
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait
+        self.retries = 0
+        self.last_success = {}
+        self._retry_at = {}
+        self._tasks = []
+
+    def breaker(self, model):
+        breaker = self.breakers.get(model)
+        if breaker is None:
+            breaker = self.breakers[model] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return breaker
+
+    async def _wait_for(self, model):
+        delay = self._retry_at.get(model, 0.0) - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def post(self, model, payload):
+        """Send with retries; raises CircuitOpen or InferenceError on failure"""
+        breaker = self.breaker(model)
+        deadline = time.monotonic() + self.max_wait
+        attempt = 0
+        while True:
+            await self._wait_for(model)
+            if not breaker.allow():
+                raise CircuitOpen(breaker.retry_after())
+
+            error = None
+            try:
+                response = await self.send(model, payload)
+            except InferenceError as e:
+                error, response = e, None
+                breaker.record_failure()
+                delay = _backoff(attempt, self.base_delay, self.max_delay)
+            else:
+                delay = _retry_delay(response, attempt, self.base_delay, self.max_delay)
+                loading = isinstance(response.data, dict) and "estimated_time" in response.data
+                if response.status >= 500 and not loading:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if delay is None:
+                    if response.status == 200:
+                        self.last_success[model] = time.monotonic()
+                    return response
+
+            attempt += 1
+            if attempt >= self.max_attempts or time.monotonic() + delay > deadline:
+                if error is not None:
+                    raise error
+                return response
+            self.retries += 1
+            retry_at = time.monotonic() + delay
+            self._retry_at[model] = max(self._retry_at.get(model, 0.0), retry_at)
+
+    async def warm_up(self, model):
+        """Send a one-token request so a cold model starts loading now"""
+        payload = {
+            "inputs": "Hello",
+            "parameters": {"max_new_tokens": 1},
+            "options": {"wait_for_model": True}
+        }
+        try:
+            response = await self.post(model, payload)
+        except InferenceError as e:
+            log.warning("Warmup of %s failed: %s", model, e)
+            return False
+        if response.status != 200:
+            log.warning("Warmup of %s answered %s", model, response.status)
+        return response.status == 200
+
+    def start_keep_warm(self, models, interval):
+        """Ping each model whenever it has been idle for ``interval`` seconds"""
+        if interval > 0:
+            self._tasks = [asyncio.create_task(self._keep_warm(model, interval)) for model in models]
+
+    async def _keep_warm(self, model, interval):
+        while True:
+            idle = time.monotonic() - self.last_success.get(model, 0.0)
+            if idle < interval:
+                await asyncio.sleep(interval - idle)
+                continue
+            await self.warm_up(model)
+            await asyncio.sleep(interval)
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+from metrics import DB_WRITE_SECONDS
+
+
+def cache_key(model, persona, prompt):
+    """Stable key for a generation: model, persona text and normalized prompt"""
+    normalized = " ".join(prompt.lower().split())
+    raw = f"{model}\0{persona}\0{normalized}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("answers", "expires_at", "stores", "cursor")
+
+    def __init__(self, answers, expires_at, stores=1, cursor=0):
+        self.answers = answers
+        self.expires_at = expires_at
+        self.stores = stores  # answers put for the key, repeats included
+        self.cursor = cursor
+
+
+class ResponseCache:
+    """Two-tier cache of model answers.
+
+    Tier one is an in-process LRU of ``max_entries`` keys, tier two the
+    shared StateStore, so every process serves the answers any of them
+    generated. The store keeps about ``disk_max_entries`` keys: every
+    ``trim_every`` puts the least recently used ones beyond that are
+    dropped. Every command may have its own TTL in ``ttls``. Commands
+    listed in ``variants`` are generated that many times for the same key
+    before the cache starts serving the distinct answers round robin, so
+    creative commands like ``!task`` do not repeat one answer forever; a
+    model that keeps giving the same answer gets it cached all the same.
+
+    Expired answers are kept for another ``stale_grace`` seconds so
+    ``get_stale`` can still serve them while the model is unavailable.
+    """
+
+    def __init__(self, store, max_entries=1000, disk_max_entries=20000,
+                 default_ttl=86400, ttls=None, variants=None, stale_grace=7 * 86400,
+                 namespace="response_cache", trim_every=100):
+        self.store = store
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.disk_max_entries = disk_max_entries
+        self.trim_every = trim_every
+        self.default_ttl = default_ttl
+        self.ttls = ttls or {}
+        self.variants = variants or {}
+        self.stale_grace = stale_grace
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stale_hits": 0, "evictions": 0}
+        self._memory = OrderedDict()
+        self._puts = 0
+
+    def ttl_for(self, command):
+        return self.ttls.get(command, self.default_ttl)
+
+    async def _lookup(self, key, now):
+        # Returns (entry, from_disk); the entry may be expired but within grace
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry.expires_at + self.stale_grace > now:
+                self._memory.move_to_end(key)
+                return entry, False
+            del self._memory[key]
+        entry = await asyncio.to_thread(self._load, key, now)
+        if entry is not None:
+            self._remember(key, entry)
+        return entry, entry is not None
+
+    async def get(self, model, persona, prompt, command=None):
+        """Return a cached answer, or None when a fresh generation is needed"""
+        return await self.get_by_key(cache_key(model, persona, prompt), command)
+
+    async def get_by_key(self, key, command=None):
+        now = time.time()
+        entry, from_disk = await self._lookup(key, now)
+
+        if (entry is None or entry.expires_at <= now
+                or entry.stores < self.variants.get(command, 1)):
+            self.stats["misses"] += 1
+            return None
+
+        self.stats["disk_hits" if from_disk else "hits"] += 1
+        answer = entry.answers[entry.cursor % len(entry.answers)]
+        entry.cursor += 1
+        return answer
+
+    async def get_stale(self, model, persona, prompt):
+        """Any stored answer, expired or not; a fallback when generation fails"""
+        key = cache_key(model, persona, prompt)
+        entry, _ = await self._lookup(key, time.time())
+        if entry is None:
+            return None
+        self.stats["stale_hits"] += 1
+        answer = entry.answers[entry.cursor % len(entry.answers)]
+        entry.cursor += 1
+        return answer
+
+    async def put(self, model, persona, prompt, answer, command=None):
+        key = cache_key(model, persona, prompt)
+        now = time.time()
+        # Merge into the variants already stored, on disk if evicted from memory
+        entry, _ = await self._lookup(key, now)
+        if entry is not None and entry.expires_at > now:
+            entry.stores += 1
+            if answer not in entry.answers and len(entry.answers) < self.variants.get(command, 1):
+                entry.answers.append(answer)
+        else:
+            entry = _Entry([answer], now + self.ttl_for(command))
+            self._remember(key, entry)
+        self._puts += 1
+        trim = self._puts % self.trim_every == 0
+        with DB_WRITE_SECONDS.labels("response_cache").time():
+            evicted = await asyncio.to_thread(self._store, key, list(entry.answers),
+                                              entry.stores, entry.expires_at, now, trim)
+        self.stats["evictions"] += evicted
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _load(self, key, now):
+        value = self.store.get(self.namespace, key)
+        if value is None:
+            return None
+        stored = json.loads(value)
+        if stored["expires_at"] + self.stale_grace <= now:
+            self.store.delete(self.namespace, key)
+            return None
+        self.store.touch(self.namespace, key, now)
+        return _Entry(stored["answers"], stored["expires_at"], stored["stores"])
+
+    def _store(self, key, answers, stores, expires_at, now, trim):
+        value = json.dumps({"answers": answers, "stores": stores, "expires_at": expires_at})
+        self.store.put_many(self.namespace, [(key, value)], now)
+        # Returns how many keys the trim dropped from the store
+        return self.store.evict_lru(self.namespace, self.disk_max_entries) if trim else 0
+
+    def hit_rate(self):
+        hits = self.stats["hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
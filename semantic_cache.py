@@ -0,0 +1,229 @@
+"""Near-duplicate prompt lookup for the response cache.
+
+Prompts are embedded into unit vectors and indexed with random-hyperplane
+LSH: each of ``bands`` bands hashes a vector to ``bits`` sign bits, and
+prompts sharing any band bucket are candidates. Candidates are scored by
+cosine similarity and the best one above ``threshold`` is a hit. The index
+stores response cache keys, not answers, so answers keep living (and
+expiring) in ResponseCache.
+
+numpy is optional. With it scoring is vectorized and the vectors can live
+in a memory-mapped file that survives restarts; without it the index runs
+in pure Python, in memory only.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+from array import array
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+log = logging.getLogger(__name__)
+
+
+class SentenceEmbedder:
+    """Embeddings from a small sentence-transformers model on the CPU"""
+
+    blocking = True
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, text):
+        return self.model.encode(text, normalize_embeddings=True).tolist()
+
+
+class SemanticCache:
+    """Bounded LSH index from prompt embeddings to response cache keys.
+
+    Entries are grouped by a namespace (e.g. command and persona) so a
+    match never crosses into a different kind of question. Past
+    ``capacity`` entries the least recently matched one is evicted and its
+    slot reused. ``path`` (numpy only) keeps the vectors in a memory-mapped
+    file with a JSON sidecar for the slot table. The last ``recent`` prompts
+    embedded are remembered, so storing an answer after a missed lookup
+    does not embed the prompt a second time.
+    """
+
+    def __init__(self, embedder, capacity=10000, threshold=0.9, bands=8, bits=12,
+                 path=None, seed=0x5E3A, recent=1024):
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self.capacity = capacity
+        self.threshold = threshold
+        self.bands = bands
+        self.bits = bits
+        self.path = path if np is not None else None
+        if path and np is None:
+            log.warning("numpy is not installed; semantic cache kept in memory only")
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self.recent = recent
+        self._embedded = OrderedDict()  # prompt -> vector, LRU order
+
+        rng = random.Random(seed)
+        planes = [[rng.gauss(0, 1) for _ in range(self.dim)] for _ in range(bands * bits)]
+        self._slots = OrderedDict()  # slot -> (namespace, key, band hashes), LRU order
+        self._keys = {}
+        self._free = list(range(capacity - 1, -1, -1))
+        self._buckets = [{} for _ in range(bands)]
+        if np is not None:
+            self._planes = np.array(planes, dtype=np.float32)
+            self._weights = (1 << np.arange(bits)).astype(np.int64)
+            self._vectors = self._open_vectors()
+        else:
+            self._planes = planes
+            self._vectors = array("f", bytes(4 * capacity * self.dim))
+        if self.path:
+            self._load_slots()
+
+    def _open_vectors(self):
+        if not self.path:
+            return np.zeros((self.capacity, self.dim), dtype=np.float32)
+        size = self.capacity * self.dim * 4
+        exists = os.path.exists(self.path) and os.path.getsize(self.path) == size
+        return np.memmap(self.path, dtype=np.float32, mode="r+" if exists else "w+",
+                         shape=(self.capacity, self.dim))
+
+    def _load_slots(self):
+        try:
+            with open(self.path + ".json", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("dim") != self.dim or data.get("capacity") != self.capacity:
+            return
+        for slot, namespace, key in data["slots"]:
+            self._index(slot, namespace, key, self._signature(self._vectors[slot]))
+        self._free = [slot for slot in range(self.capacity - 1, -1, -1) if slot not in self._slots]
+
+    def __len__(self):
+        return len(self._slots)
+
+    def hit_rate(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    async def embed(self, text):
+        vector = self._embedded.get(text)
+        if vector is not None:
+            self._embedded.move_to_end(text)
+            return vector
+        if self.embedder.blocking:
+            vector = await asyncio.to_thread(self.embedder.embed, text)
+        else:
+            vector = self.embedder.embed(text)
+        if np is not None:
+            vector = np.asarray(vector, dtype=np.float32)
+        self._embedded[text] = vector
+        if len(self._embedded) > self.recent:
+            self._embedded.popitem(last=False)
+        return vector
+
+    def _signature(self, vector):
+        """One bucket hash per band"""
+        if np is not None:
+            signs = (self._planes @ vector > 0).reshape(self.bands, self.bits)
+            return [int(h) for h in signs @ self._weights]
+        nonzero = [(i, value) for i, value in enumerate(vector) if value]
+        hashes = []
+        for band in range(self.bands):
+            h = 0
+            for bit in range(self.bits):
+                plane = self._planes[band * self.bits + bit]
+                if sum(plane[i] * value for i, value in nonzero) > 0:
+                    h |= 1 << bit
+            hashes.append(h)
+        return hashes
+
+    def _scores(self, slots, vector):
+        if np is not None:
+            return (self._vectors[slots] @ vector).tolist()
+        nonzero = [(i, value) for i, value in enumerate(vector) if value]
+        vectors = self._vectors
+        dim = self.dim
+        return [sum(vectors[slot * dim + i] * value for i, value in nonzero) for slot in slots]
+
+    async def lookup(self, namespace, vector, fetch):
+        """The answer for the most similar stored prompt above the threshold, or None.
+
+        ``fetch`` is awaited with the matched key and returns its answer or
+        None. A key whose answer is gone is dropped from the index and the
+        lookup counts as a miss.
+        """
+        candidates = set()
+        for band, h in enumerate(self._signature(vector)):
+            candidates.update(self._buckets[band].get((namespace, h), ()))
+        if candidates:
+            slots = list(candidates)
+            best_score, best_slot = max(zip(self._scores(slots, vector), slots))
+            if best_score >= self.threshold:
+                self._slots.move_to_end(best_slot)
+                key = self._slots[best_slot][1]
+                answer = await fetch(key)
+                if answer is not None:
+                    self.stats["hits"] += 1
+                    return answer
+                self.discard(key)
+        self.stats["misses"] += 1
+        return None
+
+    def add(self, namespace, vector, key):
+        if key in self._keys:
+            return
+        if not self._free:
+            self._evict(next(iter(self._slots)))
+        slot = self._free.pop()
+        if np is not None:
+            self._vectors[slot] = vector
+        else:
+            self._vectors[slot * self.dim:(slot + 1) * self.dim] = array("f", vector)
+        self._index(slot, namespace, key, self._signature(vector))
+
+    def _index(self, slot, namespace, key, hashes):
+        self._slots[slot] = (namespace, key, hashes)
+        self._keys[key] = slot
+        for band, h in enumerate(hashes):
+            self._buckets[band].setdefault((namespace, h), set()).add(slot)
+
+    def discard(self, key):
+        """Drop ``key`` from the index if it is there"""
+        slot = self._keys.get(key)
+        if slot is not None:
+            self._unindex(slot)
+
+    def _evict(self, slot):
+        self._unindex(slot)
+        self.stats["evictions"] += 1
+
+    def _unindex(self, slot):
+        namespace, key, hashes = self._slots.pop(slot)
+        del self._keys[key]
+        for band, h in enumerate(hashes):
+            bucket = self._buckets[band][(namespace, h)]
+            bucket.discard(slot)
+            if not bucket:
+                del self._buckets[band][(namespace, h)]
+        self._free.append(slot)
+
+    def close(self):
+        """Persist the slot table next to the memory-mapped vectors"""
+        if not self.path:
+            return
+        self._vectors.flush()
+        data = {
+            "dim": self.dim,
+            "capacity": self.capacity,
+            "slots": [[slot, namespace, key] for slot, (namespace, key, _) in self._slots.items()]
+        }
+        with open(self.path + ".json", "w", encoding="utf-8") as f:
+            json.dump(data, f)
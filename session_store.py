@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from metrics import DB_WRITE_SECONDS
+
+
+log = logging.getLogger(__name__)
+
+
+class GameSessionStore:
+    """Bounded, persistent store of per-channel state such as games.
+
+    At most ``max_sessions`` games stay in memory. The least recently used
+    game is evicted past that limit, and any game untouched for
+    ``idle_timeout`` seconds is evicted too. Evicted and modified games are
+    written to the shared StateStore in batches by a background task, so
+    memory stays bounded and games survive restarts. A channel's game is
+    loaded lazily the first time it is asked for. Entries untouched for
+    ``expire_after`` seconds are deleted as abandoned.
+
+    Handlers must call ``mark_dirty`` after changing a game in place.
+    """
+
+    def __init__(self, store, kind, serialize, deserialize, max_sessions=1000,
+                 idle_timeout=3600, expire_after=7 * 86400, flush_interval=5.0):
+        self.store = store
+        self.kind = kind
+        self.serialize = serialize
+        self.deserialize = deserialize
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.expire_after = expire_after
+        self.flush_interval = flush_interval
+        self._sessions = OrderedDict()
+        self._last_access = {}
+        self._dirty = set()
+        self._pending = {}
+        self._writing = {}
+        self._task = None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    async def get(self, channel_id):
+        """The channel's game, loading it from disk on first access; None if absent"""
+        game = self._sessions.get(channel_id)
+        if game is not None:
+            self._touch(channel_id)
+            return game
+
+        if channel_id in self._pending:
+            data = self._pending[channel_id]
+        elif channel_id in self._writing:
+            data = self._writing[channel_id]
+        else:
+            data = await asyncio.to_thread(self.store.get, self.kind, channel_id)
+        if data is None:
+            return None
+        # Another handler may have loaded it while we were reading
+        if channel_id in self._sessions:
+            self._touch(channel_id)
+            return self._sessions[channel_id]
+        game = self.deserialize(data)
+        self._remember(channel_id, game)
+        return game
+
+    def put(self, channel_id, game):
+        self._remember(channel_id, game)
+        self._dirty.add(channel_id)
+
+    def mark_dirty(self, channel_id):
+        if channel_id in self._sessions:
+            self._dirty.add(channel_id)
+
+    def _touch(self, channel_id):
+        self._sessions.move_to_end(channel_id)
+        self._last_access[channel_id] = time.monotonic()
+
+    def _remember(self, channel_id, game):
+        self._sessions[channel_id] = game
+        self._touch(channel_id)
+        while len(self._sessions) > self.max_sessions:
+            self._evict(next(iter(self._sessions)))
+
+    def _evict(self, channel_id):
+        game = self._sessions.pop(channel_id)
+        self._last_access.pop(channel_id, None)
+        if channel_id in self._dirty:
+            self._dirty.discard(channel_id)
+            self._pending[channel_id] = self.serialize(game)
+
+    def evict_idle(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        # Sessions are in access order, so idle ones are at the front
+        for channel_id in list(self._sessions):
+            if self._last_access[channel_id] > cutoff:
+                break
+            self._evict(channel_id)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                self.evict_idle()
+                await self.flush()
+            except Exception:
+                log.exception("Failed to flush %s sessions", self.kind)
+
+    async def flush(self):
+        for channel_id in self._dirty:
+            self._pending[channel_id] = self.serialize(self._sessions[channel_id])
+        self._dirty.clear()
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        # Readers see states that are still being written
+        self._writing = batch
+        try:
+            with DB_WRITE_SECONDS.labels(self.kind).time():
+                await asyncio.to_thread(self._write, batch)
+        except Exception:
+            # Keep the states for the next attempt unless they changed since
+            for channel_id, state in batch.items():
+                self._pending.setdefault(channel_id, state)
+            raise
+        finally:
+            self._writing = {}
+
+    def _write(self, batch):
+        now = time.time()
+        self.store.put_many(self.kind, batch.items(), now)
+        self.store.expire(self.kind, now - self.expire_after)
+
+    async def close(self):
+        """Stop the background task and persist every modified game.
+
+        The StateStore is shared, so closing it is left to its owner.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
@@ -0,0 +1,154 @@
+import sqlite3
+import threading
+
+
+class StateStore:
+    """Shared key/value state for every process of the bot.
+
+    Values are strings grouped by namespace (e.g. "chess", "conversation").
+    The session stores, the response cache and shared rate limits are
+    written against this interface only, so the SQLite file below can be
+    swapped for a networked store when shards run on several hosts. Calls
+    are blocking; async code runs them through ``asyncio.to_thread``.
+    """
+
+    def get(self, namespace, key):
+        raise NotImplementedError
+
+    def put_many(self, namespace, items, now):
+        """Store ``(key, value)`` pairs stamped with ``now``"""
+        raise NotImplementedError
+
+    def delete(self, namespace, key):
+        raise NotImplementedError
+
+    def touch(self, namespace, key, now):
+        """Mark an entry as used at ``now`` without rewriting it"""
+        raise NotImplementedError
+
+    def expire(self, namespace, before):
+        """Drop entries not written or touched since ``before``"""
+        raise NotImplementedError
+
+    def evict_lru(self, namespace, keep):
+        """Drop all but the ``keep`` most recently written or touched entries.
+
+        Returns the number of entries dropped.
+        """
+        raise NotImplementedError
+
+    def read_bucket(self, namespace, key):
+        """A token bucket's ``(tokens, updated)``, or None if it has none"""
+        raise NotImplementedError
+
+    def take_token(self, namespace, key, rate, burst, now):
+        """Atomically refill a token bucket and spend one token from it"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteStateStore(StateStore):
+    """StateStore in one SQLite file, shareable by processes on the same host.
+
+    WAL mode lets readers in other processes proceed during a write, and a
+    busy timeout makes concurrent writers wait for each other instead of
+    failing.
+    """
+
+    def __init__(self, path, busy_timeout=5.0):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "updated_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS state_updated ON state (namespace, updated_at)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS token_buckets ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, tokens REAL NOT NULL, "
+            "updated_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        self._conn.commit()
+
+    def get(self, namespace, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM state WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_many(self, namespace, items, now):
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO state (namespace, key, value, updated_at) "
+                    "VALUES (?, ?, ?, ?) ON CONFLICT(namespace, key) DO UPDATE SET "
+                    "value = excluded.value, updated_at = excluded.updated_at",
+                    [(namespace, key, value, now) for key, value in items]
+                )
+
+    def delete(self, namespace, key):
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key)
+                )
+
+    def touch(self, namespace, key, now):
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE state SET updated_at = ? WHERE namespace = ? AND key = ?",
+                    (now, namespace, key)
+                )
+
+    def expire(self, namespace, before):
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM state WHERE namespace = ? AND updated_at < ?", (namespace, before)
+                )
+                self._conn.execute(
+                    "DELETE FROM token_buckets WHERE namespace = ? AND updated_at < ?",
+                    (namespace, before)
+                )
+
+    def evict_lru(self, namespace, keep):
+        with self._lock:
+            with self._conn:
+                return self._conn.execute(
+                    "DELETE FROM state WHERE namespace = ? AND key IN ("
+                    "SELECT key FROM state WHERE namespace = ? "
+                    "ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                    (namespace, namespace, keep)
+                ).rowcount
+
+    def read_bucket(self, namespace, key):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT tokens, updated_at FROM token_buckets WHERE namespace = ? AND key = ?",
+                (namespace, key)
+            ).fetchone()
+
+    def take_token(self, namespace, key, rate, burst, now):
+        # One statement, so concurrent processes cannot lose an update
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO token_buckets (namespace, key, tokens, updated_at) "
+                    "VALUES (?, ?, ?, ?) ON CONFLICT(namespace, key) DO UPDATE SET "
+                    "tokens = MIN(?, tokens + (excluded.updated_at - updated_at) * ?) - 1, "
+                    "updated_at = excluded.updated_at",
+                    (namespace, key, burst - 1, now, burst, rate)
+                )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
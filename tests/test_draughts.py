@@ -0,0 +1,85 @@
+import pytest
+
+from draughts_search import (
+    apply_move, generate_moves, position_hash, search, search_best_path, undo_move
+)
+
+
+START = (" b b b b" "b b b b " " b b b b" "        "
+         "        " "w w w w " " w w w w" "w w w w ")
+
+
+def board(pieces):
+    """Cells with ``pieces`` mapping (row, col) to a piece code"""
+    cells = [' '] * 64
+    for (row, col), code in pieces.items():
+        cells[row * 8 + col] = code
+    return "".join(cells)
+
+
+def perft(cells, side, depth):
+    moves = generate_moves(cells, side)
+    if depth == 1:
+        return len(moves)
+    other = 'b' if side == 'w' else 'w'
+    nodes = 0
+    for move in moves:
+        record, _ = apply_move(cells, move, 0)
+        nodes += perft(cells, other, depth - 1)
+        undo_move(cells, record)
+    return nodes
+
+
+def test_perft_from_the_start():
+    cells = list(START)
+    for depth, expected in enumerate([7, 49, 302, 1469, 7361], 1):
+        assert perft(cells, 'w', depth) == expected
+    assert "".join(cells) == START
+
+
+def test_captures_are_mandatory():
+    cells = list(board({(5, 0): 'w', (4, 1): 'b', (7, 6): 'w', (0, 1): 'b'}))
+    assert generate_moves(cells, 'w') == [((40, 26), (33,))]
+
+
+def test_multi_jump_is_one_move():
+    cells = list(board({(5, 0): 'w', (4, 1): 'b', (2, 3): 'b', (0, 7): 'b'}))
+    (path, captured), = generate_moves(cells, 'w')
+    assert path == (40, 26, 12)
+    assert captured == (33, 19)
+
+
+def test_man_crowned_mid_chain_lands_as_king():
+    cells = list(board({(2, 1): 'w', (1, 2): 'b', (1, 4): 'b', (7, 0): 'b'}))
+    move = max(generate_moves(cells, 'w'), key=lambda move: len(move[1]))
+    assert move[0] == (17, 3, 21)
+    record, h = apply_move(cells, move, position_hash(cells, 'w'))
+    assert cells[21] == 'W'
+    assert h == position_hash(cells, 'b')
+    undo_move(cells, record)
+    assert "".join(cells) == board({(2, 1): 'w', (1, 2): 'b', (1, 4): 'b', (7, 0): 'b'})
+
+
+def test_search_takes_the_longer_capture():
+    # One piece can take one man, another can take two
+    cells = board({(5, 0): 'w', (4, 1): 'b', (2, 3): 'b', (5, 6): 'w', (4, 5): 'b', (0, 7): 'b'})
+    path, captured = search(cells, 'w', time_budget=0.5, max_depth=4)
+    assert captured == (33, 19)
+
+
+def test_search_best_path_continues_from_the_jumping_piece():
+    cells = board({(3, 2): 'w', (2, 3): 'b', (5, 0): 'w', (4, 1): 'b', (0, 7): 'b'})
+    path = search_best_path(cells, 'w', 0.2, only_from=(3, 2))
+    assert path == [(3, 2), (1, 4)]
+
+
+def test_search_without_moves():
+    cells = board({(7, 0): 'w', (6, 1): 'b', (5, 2): 'b'})
+    assert search(cells, 'w', 0.1) is None
+    assert search_best_path(cells, 'w', 0.1) is None
+
+
+@pytest.mark.parametrize("side", ['w', 'b'])
+def test_search_returns_a_legal_move(side):
+    move = search(START, side, time_budget=0.2, max_depth=3)
+    assert move in generate_moves(list(START), side)
@@ -0,0 +1,238 @@
+import json
+import random
+
+import pytest
+
+from chess_engine import KNIGHT, START_FEN, move_from, move_to, square, square_to_pos
+from draughts_engine import WHITE_KING, piece_jumps, piece_steps
+from games import DRAUGHTS_START, ChessGame, DraughtsGame
+
+
+def play_chess(game, rng, plies):
+    for _ in range(plies):
+        moves = game.position.legal_moves()
+        if not moves:
+            break
+        move = rng.choice(moves)
+        game.make(square_to_pos(move_from(move)), square_to_pos(move_to(move)))
+
+
+def draughts_moves(game):
+    """(from, to) pairs the game accepts for the side to move"""
+    moves = []
+    for sq in range(64):
+        pos = divmod(sq, 8)
+        if game.piece_at(pos) == ' ':
+            continue
+        for to in piece_jumps(game.cells, *pos) + piece_steps(game.cells, *pos):
+            if game.validate(pos, tuple(to))[0]:
+                moves.append((pos, tuple(to)))
+    return moves
+
+
+def play_draughts(game, rng, hops):
+    for _ in range(hops):
+        moves = draughts_moves(game)
+        if not moves:
+            break
+        game.make(*rng.choice(moves))
+
+
+def test_chess_make_and_undo():
+    game = ChessGame()
+    game.make((6, 4), (4, 4))
+    game.make((1, 4), (3, 4))
+    game.make((7, 6), (5, 5))
+    assert game.history() == ["e2e4", "e7e5", "g1f3"]
+    assert game.turn == 'b'
+
+    assert game.undo()
+    assert game.history() == ["e2e4", "e7e5"]
+    assert game.piece_at((7, 6)) == 'wn'
+    assert game.undo() and game.undo()
+    assert not game.undo()
+    assert game.position.fen() == START_FEN
+
+
+def test_chess_undo_random_games():
+    rng = random.Random(7)
+    for _ in range(10):
+        game = ChessGame()
+        play_chess(game, rng, 60)
+        while game.undo():
+            pass
+        assert game.position.fen() == START_FEN
+        assert game.position.hash == game.position.compute_hash()
+
+
+def test_chess_make_move_keeps_underpromotion():
+    game = ChessGame("7k/8/8/8/8/8/p7/7K b - - 0 1", mode="ai")
+    move = game.position.find_move(square(6, 0), square(7, 0), KNIGHT)
+    game.make_move(move)
+    assert game.piece_at((7, 0)) == 'bn'
+    assert game.history() == ["a2a1n"]
+    with pytest.raises(ValueError):
+        game.make_move(move)
+
+
+def test_chess_validate():
+    game = ChessGame()
+    assert game.validate((6, 4), (4, 4)) == (True, "")
+    assert not game.validate((1, 4), (3, 4))[0]  # Black's pawn on White's turn
+    assert not game.validate((7, 0), (6, 0))[0]  # own piece
+    assert not game.validate((4, 4), (3, 4))[0]  # empty square
+
+
+def test_chess_status_and_mate():
+    game = ChessGame()
+    for from_pos, to_pos in [((6, 5), (5, 5)), ((1, 4), (3, 4)), ((6, 6), (4, 6)), ((0, 3), (4, 7))]:
+        game.make(from_pos, to_pos)
+    assert game.over
+    assert game.status == "Checkmate! Black wins"
+    game.undo()
+    assert not game.over
+    assert game.status == "Black's turn to play"
+
+
+def test_chess_state_round_trip():
+    rng = random.Random(3)
+    game = ChessGame(mode="ai")
+    play_chess(game, rng, 25)
+    game.selected = (6, 0)
+    game.status = "Selected"
+
+    loaded = ChessGame.from_state(game.to_state())
+    assert loaded.position.fen() == game.position.fen()
+    assert loaded.history() == game.history()
+    assert loaded.recent_hashes() == game.recent_hashes()
+    assert (loaded.selected, loaded.status, loaded.mode) == ((6, 0), "Selected", "ai")
+    # The saved moves can be taken back
+    while loaded.undo():
+        pass
+    assert loaded.position.fen() == START_FEN
+
+
+def test_chess_loads_fen_only_state():
+    fen = "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq e6 0 1"
+    state = json.dumps({"fen": fen, "selected": [6, 3], "status": "White's turn to play", "mode": None})
+    game = ChessGame.from_state(state)
+    assert game.position.fen() == fen
+    assert game.selected == (6, 3)
+    assert game.history() == []
+    assert not game.undo()
+
+
+def test_draughts_make_and_undo():
+    game = DraughtsGame()
+    game.make((5, 2), (4, 3))
+    game.make((2, 5), (3, 4))
+    assert game.validate((4, 3), (2, 5)) == (True, "")
+    game.make((4, 3), (2, 5))  # jumps D5
+    assert game.piece_at((3, 4)) == ' '
+    assert game.history() == ["F3-E4", "C6-D5", "E4xC6"]
+
+    assert game.undo()
+    assert game.piece_at((3, 4)) == 'b'
+    assert game.turn == 'w'
+    assert game.undo() and game.undo()
+    assert not game.undo()
+    assert bytes(game.cells) == DRAUGHTS_START.encode('ascii')
+
+
+def test_draughts_undo_takes_back_whole_jump_chain():
+    cells = list(" " * 64)
+    cells[5 * 8 + 0] = 'w'
+    cells[4 * 8 + 1] = 'b'
+    cells[2 * 8 + 3] = 'b'
+    cells[0] = 'b'
+    game = DraughtsGame("".join(cells))
+    game.make((5, 0), (3, 2))
+    assert game.must_jump and game.selected == (3, 2) and game.turn == 'w'
+    game.make((3, 2), (1, 4))
+    assert game.turn == 'b'
+    assert game.history() == ["F1xD3xB5"]
+
+    assert game.undo()
+    assert game.cells.decode('ascii') == "".join(cells)
+    assert (game.turn, game.selected, game.must_jump) == ('w', None, False)
+
+
+def test_draughts_key_ignores_selection_outside_jumps():
+    game = DraughtsGame()
+    key = game.key
+    game.selected = (5, 0)
+    assert game.key == key
+
+    cells = list(" " * 64)
+    cells[5 * 8 + 0] = 'w'
+    cells[4 * 8 + 1] = 'b'
+    cells[2 * 8 + 3] = 'b'
+    game = DraughtsGame("".join(cells))
+    game.make((5, 0), (3, 2))
+    assert game.key[-1] == (3, 2)
+
+
+def test_draughts_make_path_plays_whole_chain():
+    cells = list(" " * 64)
+    cells[5 * 8 + 0] = 'w'
+    cells[4 * 8 + 1] = 'b'
+    cells[2 * 8 + 3] = 'b'
+    cells[0] = 'b'
+    game = DraughtsGame("".join(cells))
+    game.make_path([(5, 0), (3, 2), (1, 4)])
+    assert game.turn == 'b'
+    assert game.history() == ["F1xD3xB5"]
+
+
+def test_draughts_crowning_is_undone():
+    cells = list(" " * 64)
+    cells[1 * 8 + 2] = 'w'
+    cells[7 * 8 + 0] = 'b'
+    game = DraughtsGame("".join(cells))
+    game.make((1, 2), (0, 3))
+    assert game.cells[3] == WHITE_KING
+    game.undo()
+    assert game.piece_at((1, 2)) == 'w'
+    assert game.piece_at((0, 3)) == ' '
+
+
+def test_draughts_undo_random_games():
+    rng = random.Random(11)
+    for _ in range(20):
+        game = DraughtsGame()
+        play_draughts(game, rng, 80)
+        while game.undo():
+            pass
+        assert bytes(game.cells) == DRAUGHTS_START.encode('ascii')
+        assert game.turn == 'w' and not game.must_jump
+        assert sorted(game.tracker.moves('w')) == sorted(DraughtsGame().tracker.moves('w'))
+
+
+def test_draughts_state_round_trip():
+    rng = random.Random(5)
+    game = DraughtsGame(mode="ai")
+    play_draughts(game, rng, 30)
+
+    loaded = DraughtsGame.from_state(game.to_state())
+    assert loaded.cells == game.cells
+    assert loaded.key == game.key
+    assert loaded.hops == game.hops
+    assert loaded.history() == game.history()
+    assert loaded.mode == "ai"
+    while loaded.undo():
+        pass
+    assert bytes(loaded.cells) == DRAUGHTS_START.encode('ascii')
+
+
+def test_draughts_loads_state_without_hops():
+    cells = DRAUGHTS_START[:40] + "   w    " + DRAUGHTS_START[48:]
+    state = json.dumps({
+        "cells": cells, "turn": "b", "selected": None, "must_jump": False,
+        "status": "Black's turn to play", "mode": "ai"
+    })
+    game = DraughtsGame.from_state(state)
+    assert game.cells.decode('ascii') == cells
+    assert (game.turn, game.mode) == ('b', "ai")
+    assert game.ai_to_move
+    assert game.history() == []
+    assert not game.undo()
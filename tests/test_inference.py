@@ -0,0 +1,123 @@
+import asyncio
+import contextlib
+
+import pytest
+
+from bench.stub_server import StubInferenceServer
+from inference import InferenceClient, InferenceDispatcher, InferenceResponse, StreamingUnsupported
+
+
+PARAMETERS = {"max_new_tokens": 20}
+
+
+async def ask_all(server, prompts, **options):
+    """Submit ``prompts`` at once through a dispatcher in front of ``server``"""
+    port = await server.start(port=0)
+    client = InferenceClient("token", base_url=f"http://127.0.0.1:{port}/models")
+    dispatcher = InferenceDispatcher(client.post, **options)
+    try:
+        responses = await asyncio.gather(
+            *(dispatcher.submit("m", prompt, PARAMETERS) for prompt in prompts)
+        )
+    finally:
+        await client.close()
+        await server.close()
+    return dispatcher, responses
+
+
+def test_distinct_prompts_batch_and_identical_ones_coalesce():
+    server = StubInferenceServer(latency=0.0, jitter=0.0, words=5)
+    prompts = ["one", "two", "three", "two", " two  "]
+    dispatcher, responses = asyncio.run(ask_all(server, prompts, batch_window=0.05))
+
+    for prompt, response in zip(prompts, responses):
+        assert response.status == 200
+        assert response.data == [{"generated_text": server.answer(" ".join(prompt.split()))}]
+    assert dispatcher.coalesced == 2
+    assert dispatcher.batches_sent == 1
+    assert server.stats["requests"] == 1 and server.stats["prompts"] == 3
+
+
+def test_rejected_batch_is_retried_one_prompt_at_a_time():
+    server = StubInferenceServer(latency=0.0, jitter=0.0, words=5, reject_batches=True)
+    prompts = ["one", "two", "three"]
+    dispatcher, responses = asyncio.run(ask_all(server, prompts, batch_window=0.05))
+
+    for prompt, response in zip(prompts, responses):
+        assert response.status == 200
+        assert response.data == [{"generated_text": server.answer(prompt)}]
+    assert "m" in dispatcher._unbatchable
+    assert server.stats["rejected"] == 1
+    assert server.stats["prompts"] == 3
+
+
+def test_transient_batch_error_goes_to_every_waiter():
+    sent = []
+
+    async def send(model, payload):
+        sent.append(payload["inputs"])
+        return InferenceResponse(503, {"error": "Model is currently loading"}, {})
+
+    async def main():
+        dispatcher = InferenceDispatcher(send, batch_window=0.01)
+        responses = await asyncio.gather(
+            dispatcher.submit("m", "one", PARAMETERS), dispatcher.submit("m", "two", PARAMETERS)
+        )
+        return dispatcher, responses
+
+    dispatcher, responses = asyncio.run(main())
+    assert [response.status for response in responses] == [503, 503]
+    assert sent == [["one", "two"]]
+    assert not dispatcher._unbatchable
+
+
+def test_stream_yields_tokens_until_done():
+    async def run():
+        server = StubInferenceServer(latency=0.0, jitter=0.0, token_latency=0.0, words=6)
+        port = await server.start(port=0)
+        client = InferenceClient("token", base_url=f"http://127.0.0.1:{port}/models")
+        try:
+            events = [event async for event in client.stream("m", {"inputs": "hello"})]
+        finally:
+            await client.close()
+            await server.close()
+        text = "".join(event["token"]["text"] for event in events)
+        assert text.split() == server.answer("hello").split()
+
+    asyncio.run(run())
+
+
+def test_stream_without_event_stream_raises_before_yielding():
+    async def run():
+        server = StubInferenceServer(latency=0.0, jitter=0.0, error_rate=1.0)
+        port = await server.start(port=0)
+        client = InferenceClient("token", base_url=f"http://127.0.0.1:{port}/models")
+        try:
+            with pytest.raises(StreamingUnsupported) as error:
+                async for _ in client.stream("m", {"inputs": "hello"}):
+                    raise AssertionError("no event expected")
+            assert error.value.status == 503
+        finally:
+            await client.close()
+            await server.close()
+
+    asyncio.run(run())
+
+
+def test_closing_a_stream_early_releases_the_connection():
+    async def run():
+        server = StubInferenceServer(latency=0.0, jitter=0.0, token_latency=0.01, words=50)
+        port = await server.start(port=0)
+        client = InferenceClient("token", base_url=f"http://127.0.0.1:{port}/models")
+        try:
+            events = client.stream("m", {"inputs": "hello"})
+            async with contextlib.aclosing(events):
+                async for _ in events:
+                    break
+            connector = client._get_session().connector
+            assert not connector._acquired
+        finally:
+            await client.close()
+            await server.close()
+
+    asyncio.run(run())
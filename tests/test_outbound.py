@@ -0,0 +1,96 @@
+import asyncio
+import itertools
+
+from outbound import ANSWER, GAME, MESSAGE_LIMIT, OutboundScheduler
+
+
+_ids = itertools.count(1)
+
+
+class FakeMessage:
+    def __init__(self, channel, content):
+        self.id = next(_ids)
+        self.channel = channel
+        self.content = content
+
+    async def edit(self, content):
+        self.channel.log.append(("edit", self.id, content))
+        self.content = content
+        return self
+
+
+class FakeChannel:
+    def __init__(self):
+        self.id = next(_ids)
+        self.log = []
+
+    async def send(self, content):
+        message = FakeMessage(self, content)
+        self.log.append(("send", message.id, content))
+        return message
+
+
+def test_queued_sends_merge_and_later_ones_extend():
+    async def run():
+        outbound = OutboundScheduler()
+        channel = FakeChannel()
+        first, second, third = await asyncio.gather(
+            outbound.send(channel, "a"), outbound.send(channel, "b"), outbound.send(channel, "c")
+        )
+        assert first is second is third
+        assert channel.log == [("send", first.id, "a\nb\nc")]
+
+        extended = await outbound.send(channel, "d")
+        assert extended is first
+        assert channel.log[-1] == ("edit", first.id, "a\nb\nc\nd")
+
+        # Someone else spoke: the next send is a new message
+        outbound.note_message(channel.id)
+        fresh = await outbound.send(channel, "e")
+        assert fresh is not first
+        assert outbound.stats["merged"] == 2 and outbound.stats["extended"] == 1
+
+    asyncio.run(run())
+
+
+def test_messages_to_edit_and_long_ones_are_not_merged():
+    async def run():
+        outbound = OutboundScheduler()
+        channel = FakeChannel()
+        long_text = "x" * (MESSAGE_LIMIT - 1)
+        messages = await asyncio.gather(
+            outbound.send(channel, "thinking", merge=False),
+            outbound.send(channel, long_text),
+            outbound.send(channel, "tail")
+        )
+        assert [entry[2] for entry in channel.log] == ["thinking", long_text, "tail"]
+        assert len({message.id for message in messages}) == 3
+
+    asyncio.run(run())
+
+
+def test_pending_edits_collapse_to_the_newest():
+    async def run():
+        outbound = OutboundScheduler()
+        channel = FakeChannel()
+        message = await outbound.send(channel, "…", merge=False)
+        for text in ["one", "one two", "one two three"]:
+            outbound.edit_nowait(message, text)
+        await outbound.edit(message, "done")
+        assert channel.log[1:] == [("edit", message.id, "done")]
+        assert outbound.stats["collapsed"] == 3
+
+    asyncio.run(run())
+
+
+def test_urgent_sends_go_first():
+    async def run():
+        outbound = OutboundScheduler()
+        channel = FakeChannel()
+        await asyncio.gather(
+            outbound.send(channel, "answer", priority=ANSWER, merge=False),
+            outbound.send(channel, "board", priority=GAME, merge=False)
+        )
+        assert [entry[2] for entry in channel.log] == ["board", "answer"]
+
+    asyncio.run(run())
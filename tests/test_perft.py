@@ -0,0 +1,30 @@
+import pytest
+
+from chess_engine import START_FEN, Position, perft
+
+
+# Published node counts, cut to depths that run in a few seconds
+CHESS_CASES = [
+    (START_FEN, [20, 400, 8902]),
+    ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2039]),
+    ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812]),
+    ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6, 264]),
+    ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [44, 1486]),
+]
+
+
+@pytest.mark.parametrize("fen,counts", CHESS_CASES)
+def test_chess_perft(fen, counts):
+    position = Position.from_fen(fen)
+    for depth, expected in enumerate(counts, 1):
+        assert perft(position, depth) == expected
+    # make/unmake left the position as it was
+    assert position.fen() == Position.from_fen(fen).fen()
+    assert position.hash == position.compute_hash()
+
+
+
+@pytest.mark.parametrize("fen", [fen for fen, _ in CHESS_CASES])
+def test_fen_round_trip(fen):
+    # The engine does not keep the fullmove number
+    assert Position.from_fen(fen).fen().split()[:5] == fen.split()[:5]
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from rate_limit import AdmissionController, BucketTable, QueueFull, RateLimited, SharedBucketTable
+from state_store import SQLiteStateStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteStateStore(str(tmp_path / "state.db"))
+    yield store
+    store.close()
+
+
+def test_bucket_burst_then_retry_after():
+    table = BucketTable(rate=0.5, burst=2)
+    for _ in range(2):
+        assert table.retry_after("u", 100.0) == 0.0
+        table.take("u", 100.0)
+    assert table.retry_after("u", 100.0) == pytest.approx(2.0)
+    assert table.retry_after("u", 101.0) == pytest.approx(1.0)
+
+
+def test_bucket_refills_up_to_burst():
+    table = BucketTable(rate=1.0, burst=3)
+    for _ in range(3):
+        table.take("u", 0.0)
+    assert table.retry_after("u", 2.5) == 0.0
+    table.take("u", 2.5)
+    table.take("u", 2.5)
+    assert table.retry_after("u", 2.5) == pytest.approx(0.5)
+    # A long idle spell refills no further than the burst
+    for _ in range(3):
+        table.take("u", 1000.0)
+    assert table.retry_after("u", 1000.0) == pytest.approx(1.0)
+
+
+def test_bucket_table_drops_least_recently_used():
+    table = BucketTable(rate=1.0, burst=1, max_buckets=2)
+    table.take("a", 0.0)
+    table.take("b", 0.0)
+    table.retry_after("a", 0.0)
+    table.take("c", 0.0)
+    assert len(table) == 2
+    assert table.retry_after("a", 0.0) == pytest.approx(1.0)
+    # "b" was forgotten, so it starts over with a full bucket
+    assert table.retry_after("b", 0.0) == 0.0
+
+
+def test_check_spends_only_when_every_scope_has_a_token():
+    admission = AdmissionController({"user": (1.0, 1), "channel": (1.0, 2)})
+    admission.check({"user": 1, "channel": 9})
+    with pytest.raises(RateLimited) as error:
+        admission.check({"user": 1, "channel": 9})
+    assert error.value.scope == "user"
+    assert 0 < error.value.retry_after <= 1.0
+    # The refused request did not spend the channel's second token
+    admission.check({"user": 2, "channel": 9, "guild": None})
+    assert admission.stats["rate_limited"] == 1
+
+
+def test_shared_bucket_matches_local(store):
+    shared = SharedBucketTable(store, "rate:user", rate=0.5, burst=2)
+    assert shared.retry_after("u", 100.0) == 0.0
+    shared.take("u", 100.0)
+    shared.take("u", 100.0)
+    assert shared.retry_after("u", 100.0) == pytest.approx(2.0)
+    assert shared.retry_after("u", 103.0) == 0.0
+    # Another process's table over the same store sees the same bucket
+    other = SharedBucketTable(store, "rate:user", rate=0.5, burst=2)
+    assert other.retry_after("u", 101.0) == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_admit_and_release(store, shared):
+    async def run():
+        admission = AdmissionController({"user": (1.0, 2)}, max_concurrent=1, max_queue=1,
+                                        store=store if shared else None)
+        await admission.admit({"user": 1})
+        waiter = asyncio.create_task(admission.admit({"user": 2}, priority=1))
+        await asyncio.sleep(0.05)
+        assert admission.queued == 1
+        with pytest.raises(QueueFull):
+            await admission.admit({"user": 3})
+        admission.release()
+        await waiter
+        assert admission.active == 1
+        admission.release()
+        assert admission.active == 0
+
+        await admission.admit({"user": 1})
+        admission.release()
+        with pytest.raises(RateLimited):
+            await admission.admit({"user": 1})
+
+    asyncio.run(run())
+
+
+def test_queue_serves_lower_priority_first():
+    async def run():
+        admission = AdmissionController({}, max_concurrent=1, max_queue=8)
+        await admission.acquire()
+        order = []
+
+        async def wait(name, priority):
+            await admission.acquire(priority)
+            order.append(name)
+            admission.release()
+
+        tasks = [asyncio.create_task(wait(name, priority))
+                 for name, priority in [("late", 1), ("first", 0), ("later", 1)]]
+        await asyncio.sleep(0.01)
+        admission.release()
+        await asyncio.gather(*tasks)
+        assert order == ["first", "late", "later"]
+        assert admission.active == 0
+
+    asyncio.run(run())
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from response_cache import ResponseCache, cache_key
+from state_store import SQLiteStateStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteStateStore(str(tmp_path / "state.db"))
+    yield store
+    store.close()
+
+
+def test_processes_share_answers_through_the_store(store):
+    async def run():
+        first = ResponseCache(store)
+        second = ResponseCache(store)
+        await first.put("m", "p", "What is rain?", "Water", "ai")
+        assert await second.get("m", "p", "what is  rain?", "ai") == "Water"
+        assert second.stats["disk_hits"] == 1
+        assert await second.get("m", "p", "What is snow?", "ai") is None
+
+    asyncio.run(run())
+
+
+def test_store_keeps_the_most_recently_used_keys(store):
+    async def run():
+        cache = ResponseCache(store, max_entries=1, disk_max_entries=2, trim_every=1)
+        await cache.put("m", "p", "one", "1")
+        await cache.put("m", "p", "two", "2")
+        # Reading "one" back from the store makes "two" the oldest
+        assert await cache.get("m", "p", "one") == "1"
+        await cache.put("m", "p", "three", "3")
+        assert store.get("response_cache", cache_key("m", "p", "two")) is None
+        assert await ResponseCache(store).get("m", "p", "one") == "1"
+        assert cache.stats["evictions"] >= 1
+
+    asyncio.run(run())
+
+
+def test_variants_are_collected_then_served_round_robin(store):
+    async def run():
+        cache = ResponseCache(store, variants={"task": 3})
+        for answer in ["sing", "draw", "sing"]:
+            assert await cache.get("m", "p", "give me a task", "task") is None
+            await cache.put("m", "p", "give me a task", answer, "task")
+        served = [await cache.get("m", "p", "give me a task", "task") for _ in range(4)]
+        assert served == ["sing", "draw", "sing", "draw"]
+
+        # Variants and put counts survive a trip through the store
+        fresh = ResponseCache(store, variants={"task": 3})
+        assert await fresh.get("m", "p", "give me a task", "task") in ("sing", "draw")
+
+    asyncio.run(run())
+
+
+def test_expired_answer_is_only_served_stale(store, monkeypatch):
+    async def run():
+        now = [1000.0]
+        monkeypatch.setattr("response_cache.time.time", lambda: now[0])
+        cache = ResponseCache(store, ttls={"cite": 60}, stale_grace=600)
+        await cache.put("m", "p", "cite this", "Smith 2001", "cite")
+
+        now[0] += 120
+        assert await cache.get("m", "p", "cite this", "cite") is None
+        assert await cache.get_stale("m", "p", "cite this") == "Smith 2001"
+        assert await ResponseCache(store).get_stale("m", "p", "cite this") == "Smith 2001"
+        assert cache.stats["stale_hits"] == 1
+
+        # Past the grace period the answer is gone for good
+        now[0] += 600
+        assert await ResponseCache(store, stale_grace=600).get_stale("m", "p", "cite this") is None
+        assert store.get("response_cache", cache_key("m", "p", "cite this")) is None
+
+    asyncio.run(run())
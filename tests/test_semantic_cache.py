@@ -0,0 +1,75 @@
+import asyncio
+
+from semantic_cache import SemanticCache
+
+
+class FakeEmbedder:
+    """Fixed unit vectors by prompt, counting the prompts it embeds"""
+
+    blocking = False
+    dim = 4
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.calls = 0
+
+    def embed(self, text):
+        self.calls += 1
+        return self.vectors[text]
+
+
+def make_cache(**options):
+    embedder = FakeEmbedder({
+        "what is rain": [1.0, 0.0, 0.0, 0.0],
+        "what's rain": [0.99, 0.141, 0.0, 0.0],
+        "who won": [0.0, 0.0, 1.0, 0.0],
+    })
+    return SemanticCache(embedder, capacity=4, bands=4, bits=2, **options), embedder
+
+
+def test_embeds_each_prompt_once():
+    async def main():
+        cache, embedder = make_cache()
+        first = await cache.embed("what is rain")
+        second = await cache.embed("what is rain")
+        assert embedder.calls == 1
+        assert list(first) == list(second)
+
+    asyncio.run(main())
+
+
+def test_lookup_counts_hits_only_with_an_answer():
+    async def main():
+        cache, _ = make_cache()
+        answers = {"rain-key": "Water falling from clouds"}
+
+        async def fetch(key):
+            return answers.get(key)
+
+        cache.add("ai", await cache.embed("what is rain"), "rain-key")
+        vector = await cache.embed("what's rain")
+        assert await cache.lookup("ai", vector, fetch) == "Water falling from clouds"
+        assert await cache.lookup("style", vector, fetch) is None
+        assert await cache.lookup("ai", await cache.embed("who won"), fetch) is None
+        assert cache.stats["hits"] == 1 and cache.stats["misses"] == 2
+
+        # The answer expired: the lookup misses and the key leaves the index
+        answers.clear()
+        assert await cache.lookup("ai", vector, fetch) is None
+        assert cache.stats["hits"] == 1 and cache.stats["misses"] == 3
+        assert len(cache) == 0
+        assert cache.stats["evictions"] == 0
+
+    asyncio.run(main())
+
+
+def test_full_index_evicts_least_recently_matched():
+    async def main():
+        cache, _ = make_cache()
+        for i in range(5):
+            cache.add("ai", await cache.embed("who won"), f"key-{i}")
+        assert len(cache) == 4
+        assert cache.stats["evictions"] == 1
+        assert "key-0" not in cache._keys
+
+    asyncio.run(main())
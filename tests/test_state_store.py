@@ -0,0 +1,26 @@
+from state_store import SQLiteStateStore
+
+
+def test_evict_lru_keeps_most_recently_used(tmp_path):
+    store = SQLiteStateStore(str(tmp_path / "state.db"))
+    store.put_many("cache", [("a", "1"), ("b", "2")], 1.0)
+    store.put_many("cache", [("c", "3")], 2.0)
+    store.put_many("other", [("x", "9")], 0.0)
+    store.touch("cache", "a", 3.0)
+
+    assert store.evict_lru("cache", 2) == 1
+    assert store.get("cache", "b") is None
+    assert (store.get("cache", "a"), store.get("cache", "c")) == ("1", "3")
+    assert store.get("other", "x") == "9"
+    assert store.evict_lru("cache", 2) == 0
+    store.close()
+
+
+def test_expire_drops_entries_not_touched(tmp_path):
+    store = SQLiteStateStore(str(tmp_path / "state.db"))
+    store.put_many("cache", [("a", "1"), ("b", "2")], 1.0)
+    store.touch("cache", "a", 5.0)
+    store.expire("cache", 4.0)
+    assert store.get("cache", "a") == "1"
+    assert store.get("cache", "b") is None
+    store.close()
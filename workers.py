@@ -0,0 +1,84 @@
+import asyncio
+import functools
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+
+# CPU-heavy game AI runs here so a deep search never stalls the Discord loop
+SEARCH_WORKERS = int(os.getenv('SEARCH_WORKERS', str(os.cpu_count() or 2)))
+
+_pool = None
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=SEARCH_WORKERS)
+    return _pool
+
+
+def start():
+    """Launch the workers up front, before the bot starts any threads"""
+    get_pool().submit(int).result()
+
+
+async def run_in_worker(func, *args):
+    """Run a picklable function in the shared process pool and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_pool(), func, *args)
+
+
+class MemoizedSearch:
+    """Worker results remembered by key, shared by every game in the process.
+
+    The ``max_entries`` most recently used results are kept. A call whose
+    key is already being searched waits for that search instead of
+    starting another, so a position reached in many channels at once
+    costs one worker run.
+    """
+
+    def __init__(self, func, max_entries=4096):
+        self.func = func
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0}
+        self._results = OrderedDict()
+        self._inflight = {}
+
+    def __len__(self):
+        return len(self._results)
+
+    async def run(self, key, *args):
+        """``func(*args)`` in a worker, or its remembered result for ``key``"""
+        if key in self._results:
+            self._results.move_to_end(key)
+            self.stats["hits"] += 1
+            return self._results[key]
+        future = self._inflight.get(key)
+        if future is None:
+            self.stats["misses"] += 1
+            future = asyncio.ensure_future(run_in_worker(self.func, *args))
+            self._inflight[key] = future
+            future.add_done_callback(functools.partial(self._finish, key))
+        else:
+            self.stats["coalesced"] += 1
+        # Shielded so one cancelled waiter does not cancel the shared search
+        return await asyncio.shield(future)
+
+    def _finish(self, key, future):
+        self._inflight.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        self._results[key] = future.result()
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    def clear(self):
+        self._results.clear()
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None